@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import pandas as pd
+import sklearn
+
+# Fitted models live here across sessions (mount a volume to share them)
+ARTIFACT_DIR = Path(os.environ.get("ARTIFACT_DIR", Path(__file__).parent / "artifacts"))
+
+# Session models exported for the inference server
+EXPORT_DIR = ARTIFACT_DIR / "exports"
+
+# Working files that are loaded back with pickle (job results, checkpoints,
+# caches) live here rather than in the shared, world-writable temp directory
+STATE_DIR = Path(os.environ.get("STATE_DIR", ARTIFACT_DIR.parent / "state"))
+
+# Outputs of a training run stored with the fitted model
+_STORED_FIELDS = ("model", "predictions", "test_scores", "oof_predictions", "oof_scores",
+                  "best_params", "trials", "costs")
+
+
+def artifact_key(dataset, features, target, model_name, estimator, config):
+    """Hash of everything that determines a trained model's outputs.
+
+    `dataset` is the full content digest of the training data
+    (dataset_version.dataset_digest), so a stored model is never served for
+    a dataset that differs in any row. `config` holds the run settings (split, folds, preprocessing, search
+    budget). The scikit-learn version is included because pickled models
+    are not portable across versions.
+    """
+    payload = json.dumps({
+        "dataset": dataset,
+        "features": list(features),
+        "target": target,
+        "model": model_name,
+        "estimator": type(estimator).__name__,
+        "params": estimator.get_params(),
+        "config": config,
+        "sklearn": sklearn.__version__,
+    }, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:20]
+
+
+def private_dir(name):
+    """STATE_DIR/<name>, created if needed and accessible by this user only.
+
+    Raises PermissionError if the directory exists but belongs to another
+    user (chmod is refused).
+    """
+    path = STATE_DIR / name
+    for directory in (STATE_DIR, path):
+        directory.mkdir(mode=0o700, exist_ok=True)
+        os.chmod(directory, 0o700)
+    return path
+
+
+def _paths(key):
+    return ARTIFACT_DIR / f"{key}.joblib", ARTIFACT_DIR / f"{key}.json"
+
+
+def load_artifact(key):
+    """Stored training outputs for `key` (train_models result fields plus 'created'), or None."""
+    blob, _ = _paths(key)
+    if not blob.exists():
+        return None
+    try:
+        return joblib.load(blob)
+    except Exception:
+        # Unreadable (partial write, incompatible library): treat as missing
+        return None
+
+
+def save_artifact(key, trained, info):
+    """Store a train_models result and its registry entry.
+
+    `info` is JSON metadata shown in the registry (dataset, target,
+    features, metrics...). The model is written first and the registry entry
+    last, so an interrupted save never shows up as a run.
+    """
+    ARTIFACT_DIR.mkdir(parents=True, exist_ok=True)
+    blob, meta = _paths(key)
+    created = datetime.now().isoformat(timespec="seconds")
+    tmp = blob.with_suffix(f".{os.getpid()}.tmp")
+    joblib.dump({**{field: trained.get(field) for field in _STORED_FIELDS}, "created": created},
+                tmp, compress=3)
+    tmp.replace(blob)
+    entry = {"key": key, "created": created, "size_kb": round(blob.stat().st_size / 1024, 1), **info}
+    meta.write_text(json.dumps(entry, default=str), encoding="utf-8")
+
+
+def registry(**match):
+    """Registry of stored runs (newest first), filtered to entries whose fields equal `match`."""
+    if not ARTIFACT_DIR.is_dir():
+        return pd.DataFrame()
+    entries = []
+    for meta in ARTIFACT_DIR.glob("*.json"):
+        try:
+            entry = json.loads(meta.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if all(entry.get(k) == v for k, v in match.items()):
+            entries.append(entry)
+    if not entries:
+        return pd.DataFrame()
+    runs = pd.DataFrame(entries).sort_values("created", ascending=False, ignore_index=True)
+    metrics = pd.json_normalize(runs.pop("metrics").tolist()) if "metrics" in runs else None
+    if metrics is not None:
+        runs = pd.concat([runs, metrics], axis=1)
+    return runs
+
+
+def delete_artifacts(keys=None):
+    """Remove the given runs (all runs when `keys` is None); returns how many were removed."""
+    if not ARTIFACT_DIR.is_dir():
+        return 0
+    if keys is None:
+        keys = [meta.stem for meta in ARTIFACT_DIR.glob("*.json")]
+    removed = 0
+    for key in keys:
+        for path in _paths(key):
+            if path.exists():
+                path.unlink()
+        removed += 1
+    return removed
+
+
+def export_bundle(path, model, feature_dtypes, classes=None, name="model"):
+    """Write a self-contained model file (pipeline + what scoring needs) for the inference server."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump({"name": name, "model": model, "feature_dtypes": feature_dtypes, "classes": classes},
+                path, compress=3)
+    return path
+
+
+def load_bundle(key=None, path=None):
+    """Model bundle (name, model, feature_dtypes, classes) from the store or an exported file."""
+    if path is not None:
+        return joblib.load(path)
+    _, meta = _paths(key)
+    artifact = load_artifact(key)
+    if artifact is None or not meta.exists():
+        raise KeyError(f"No stored model with key {key}")
+    entry = json.loads(meta.read_text(encoding="utf-8"))
+    if not entry.get("feature_dtypes"):
+        raise ValueError(f"Stored run {key} predates scoring metadata; retrain it to serve it")
+    return {"name": f"{entry['model']} ({key})", "model": artifact["model"],
+            "feature_dtypes": entry["feature_dtypes"], "classes": entry.get("classes")}
@@ -0,0 +1,144 @@
+import io
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# Per-row prediction latency is measured at these batch sizes (1 = a single
+# real-time request, larger = batch scoring); each is timed for at least
+# LATENCY_MIN_SECONDS or LATENCY_MAX_CALLS calls, whichever comes first
+LATENCY_BATCH_SIZES = (1, 100, 10_000)
+LATENCY_MIN_SECONDS = 0.2
+LATENCY_MAX_CALLS = 1000
+
+FIT_TIME = "Fit Time (s)"
+PEAK_MEMORY = "Peak Memory (MB)"
+MODEL_SIZE = "Model Size (MB)"
+
+
+def latency_column(batch_size):
+    return f"Latency @{batch_size:,} (µs/row)"
+
+
+# Cost columns of the results table, in display order
+COST_COLUMNS = [FIT_TIME, PEAK_MEMORY, MODEL_SIZE] + [latency_column(b) for b in LATENCY_BATCH_SIZES]
+
+
+def _reset_peak_rss():
+    # Linux only: restarts the kernel's high-water mark (VmHWM) at the current RSS
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_mb():
+    """High-water mark of this process's resident memory, in MB (None if unknown)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def timed_fit(estimator, X, y):
+    """Fit `estimator`; returns {FIT_TIME, PEAK_MEMORY}.
+
+    The fit runs untraced. Peak memory is how far the process's peak
+    resident set size rose during the fit, so it includes buffers of native
+    libraries (libsvm, OpenMP, XGBoost). It is only meaningful in a process
+    running one fit at a time, such as a training pool worker. Where the
+    peak cannot be reset (outside Linux), a fit that stays below an earlier
+    peak of the process reports 0.
+    """
+    _reset_peak_rss()
+    before = _peak_rss_mb()
+    started = time.perf_counter()
+    estimator.fit(X, y)
+    seconds = time.perf_counter() - started
+    after = _peak_rss_mb()
+    peak = max(after - before, 0.0) if before is not None and after is not None else np.nan
+    return {FIT_TIME: seconds, PEAK_MEMORY: peak}
+
+
+def model_size(model):
+    """Size in MB of `model` serialized as the artifact store writes it."""
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer, compress=3)
+    return buffer.tell() / 1024 ** 2
+
+
+def inference_latency(model, X, batch_sizes=LATENCY_BATCH_SIZES):
+    """Microseconds per row of model.predict at each batch size, on rows of `X`.
+
+    Batches larger than `X` repeat its rows. One warm-up call per batch size
+    is not timed.
+    """
+    latency = {}
+    for batch_size in batch_sizes:
+        rows = np.resize(np.arange(len(X)), batch_size)
+        batch = X.iloc[rows] if hasattr(X, "iloc") else X[rows]
+        model.predict(batch)
+        calls = 0
+        started = time.perf_counter()
+        while calls < LATENCY_MAX_CALLS and (calls == 0 or time.perf_counter() - started < LATENCY_MIN_SECONDS):
+            model.predict(batch)
+            calls += 1
+        latency[latency_column(batch_size)] = (time.perf_counter() - started) / calls / batch_size * 1e6
+    return latency
+
+
+def extrapolate(rows, values, target_rows, min_exponent=1.0, max_exponent=3.0):
+    """Power-law projection value ~ rows ** b of sampled costs to `target_rows`.
+
+    The exponent comes from the two largest samples (small fits are
+    dominated by fixed overheads) and is clipped to [min_exponent,
+    max_exponent], so a noisy curve never projects less than linear growth.
+    Returns (projected_value, exponent).
+    """
+    rows, values = np.asarray(rows, dtype=float), np.maximum(np.asarray(values, dtype=float), 1e-9)
+    exponent = min_exponent
+    if len(rows) >= 2 and rows[-1] > rows[-2]:
+        exponent = np.log(values[-1] / values[-2]) / np.log(rows[-1] / rows[-2])
+    exponent = float(np.clip(exponent, min_exponent, max_exponent))
+    return float(values[-1] * (target_rows / rows[-1]) ** exponent), exponent
+
+
+def project_costs(curve, n_rows, cv_folds=None):
+    """Per-model projections of a pre-flight `curve` (see training.preflight) to `n_rows`.
+
+    Returns a DataFrame indexed by model with the largest sampled size, the
+    fit-time exponent, projected fit time on `n_rows` (and including
+    `cv_folds` fold fits on (k-1)/k of the rows) and projected peak memory
+    growth.
+    """
+    estimates = {}
+    for name, samples in curve.groupby("model", sort=False):
+        samples = samples.sort_values("rows")
+        fit_seconds, exponent = extrapolate(samples["rows"], samples["fit_seconds"], n_rows)
+        with_cv = fit_seconds
+        if cv_folds:
+            fold_seconds, _ = extrapolate(samples["rows"], samples["fit_seconds"], n_rows * (cv_folds - 1) / cv_folds)
+            with_cv += cv_folds * fold_seconds
+        # Working memory grows at most linearly with the rows (kernel caches are bounded)
+        peak_mb, _ = extrapolate(samples["rows"], samples["peak_mb"], n_rows, min_exponent=0.0, max_exponent=1.0)
+        estimates[name] = {
+            "Sampled Rows": int(samples["rows"].max()),
+            "Fit Exponent": exponent,
+            "Projected Fit (s)": fit_seconds,
+            "Projected Fit + CV (s)": with_cv,
+            "Projected Memory (MB)": peak_mb,
+        }
+    return pd.DataFrame.from_dict(estimates, orient="index")
@@ -0,0 +1,71 @@
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingClassifier, HistGradientBoostingRegressor
+from sklearn.model_selection import train_test_split
+
+try:
+    from xgboost import XGBClassifier, XGBRegressor
+    XGBOOST_AVAILABLE = True
+except ImportError:
+    XGBOOST_AVAILABLE = False
+
+# Models trained on the native preprocessor instead of the one-hot pipeline
+NATIVE_MODELS = ("Histogram Boosting", "XGBoost")
+
+# Boosting stops once the validation loss has not improved for
+# EARLY_STOPPING_ROUNDS rounds; MAX_BOOSTING_ROUNDS is only a ceiling.
+# The validation rows are carved out of each fit's own training rows.
+MAX_BOOSTING_ROUNDS = 1000
+EARLY_STOPPING_ROUNDS = 20
+VALIDATION_FRACTION = 0.1
+
+
+def _categorical_mask(n_numeric, n_categorical):
+    return [False] * n_numeric + [True] * n_categorical
+
+
+def hist_boosting(problem_type, n_numeric, n_categorical, random_state=None):
+    """scikit-learn HistGradientBoosting with native categoricals and early stopping."""
+    params = dict(
+        max_iter=MAX_BOOSTING_ROUNDS, early_stopping=True, n_iter_no_change=EARLY_STOPPING_ROUNDS,
+        validation_fraction=VALIDATION_FRACTION, random_state=random_state,
+        categorical_features=_categorical_mask(n_numeric, n_categorical) if n_categorical else None,
+    )
+    if problem_type == "classification":
+        return HistGradientBoostingClassifier(**params)
+    return HistGradientBoostingRegressor(**params)
+
+
+def _validation_split(X, y, classifier, random_state):
+    stratify = None
+    if classifier and np.unique(y, return_counts=True)[1].min() >= 2:
+        stratify = y
+    return train_test_split(X, y, test_size=VALIDATION_FRACTION, random_state=random_state,
+                            stratify=stratify)
+
+
+if XGBOOST_AVAILABLE:
+    class EarlyStoppingXGBClassifier(XGBClassifier):
+        """XGBClassifier that early-stops on VALIDATION_FRACTION of the rows it is fitted on."""
+
+        def fit(self, X, y, **kwargs):
+            X_fit, X_val, y_fit, y_val = _validation_split(X, y, True, self.random_state)
+            return super().fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False, **kwargs)
+
+    class EarlyStoppingXGBRegressor(XGBRegressor):
+        """XGBRegressor that early-stops on VALIDATION_FRACTION of the rows it is fitted on."""
+
+        def fit(self, X, y, **kwargs):
+            X_fit, X_val, y_fit, y_val = _validation_split(X, y, False, self.random_state)
+            return super().fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False, **kwargs)
+
+
+def hist_xgboost(problem_type, n_numeric, n_categorical, random_state=None):
+    """XGBoost with tree_method="hist", native categoricals and early stopping."""
+    params = dict(
+        tree_method="hist", n_estimators=MAX_BOOSTING_ROUNDS, early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+        enable_categorical=n_categorical > 0, random_state=random_state,
+        feature_types=["c" if categorical else "q" for categorical in _categorical_mask(n_numeric, n_categorical)],
+    )
+    if problem_type == "classification":
+        return EarlyStoppingXGBClassifier(eval_metric="logloss", **params)
+    return EarlyStoppingXGBRegressor(**params)
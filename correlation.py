@@ -0,0 +1,270 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+from plotly.subplots import make_subplots
+from scipy.cluster.hierarchy import dendrogram, leaves_list, linkage
+from scipy.spatial.distance import squareform
+
+from dataset_version import dataset_fingerprint
+
+# Columns per block. Peak memory is about 2 * rows * BLOCK_SIZE * 4 bytes
+# (two float32 blocks) plus the float32 p x p result.
+BLOCK_SIZE = 128
+
+# Kendall's tau has no matrix-product form, so it is computed on a
+# reproducible row sample of at most this size.
+KENDALL_MAX_ROWS = 5_000
+
+CORRELATION_METHODS = ["pearson", "spearman", "kendall"]
+
+# Variable names are hidden on clustered heatmaps larger than this
+MAX_TICK_LABELS = 60
+
+
+def _column_block(df, columns, method):
+    """Float32 block of (optionally ranked) values with NaN for missing."""
+    block = df[columns]
+    if method == "spearman":
+        block = block.rank()
+    return block.to_numpy(dtype=np.float32, na_value=np.nan)
+
+
+def _standardize(block):
+    """Center and scale each column; returns (values with NaN->0, mask)."""
+    mask = ~np.isnan(block)
+    with warnings.catch_warnings():
+        # All-missing columns: their correlations are NaN anyway
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(block, axis=0)
+        std = np.nanstd(block, axis=0)
+    # Constant columns become NaN so only their own row/column is undefined
+    std[~(std > 0)] = np.nan
+    z = (block - mean) / std
+    z[~mask] = 0.0
+    return z, mask.astype(np.float32)
+
+
+def _block_corr(zi, mi, zj, mj, complete):
+    """Pairwise-complete Pearson correlation between two standardized blocks."""
+    if complete:
+        n = zi.shape[0]
+        return (zi.T @ zj) / n
+
+    # Sums restricted to rows where both columns are observed
+    n = mi.T @ mj
+    sx = zi.T @ mj
+    sy = mi.T @ zj
+    sxx = (zi * zi).T @ mj
+    syy = mi.T @ (zj * zj)
+    sxy = zi.T @ zj
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        r = cov / np.sqrt(var_x * var_y)
+    r[n < 2] = np.nan
+    return r
+
+
+def correlation_matrix(df, columns, method="pearson", block_size=BLOCK_SIZE):
+    """Correlation matrix computed blockwise in float32.
+
+    Pearson uses pairwise-complete observations like DataFrame.corr.
+    Spearman ranks each column over its own observed values, which matches
+    pandas exactly when there are no missing values.
+    """
+    columns = list(columns)
+    if method not in CORRELATION_METHODS:
+        raise ValueError(f"Unknown correlation method: {method}")
+
+    if method == "kendall":
+        sample = df[columns]
+        if len(sample) > KENDALL_MAX_ROWS:
+            sample = sample.sample(KENDALL_MAX_ROWS, random_state=0)
+        return sample.corr(method="kendall").astype(np.float32)
+
+    p = len(columns)
+    result = np.empty((p, p), dtype=np.float32)
+    starts = list(range(0, p, block_size))
+
+    for i in starts:
+        cols_i = columns[i:i + block_size]
+        zi, mi = _standardize(_column_block(df, cols_i, method))
+        complete_i = mi.all()
+
+        for j in starts:
+            if j < i:
+                continue
+            if j == i:
+                zj, mj, complete_j = zi, mi, complete_i
+            else:
+                cols_j = columns[j:j + block_size]
+                zj, mj = _standardize(_column_block(df, cols_j, method))
+                complete_j = mj.all()
+
+            r = _block_corr(zi, mi, zj, mj, complete_i and complete_j)
+            result[i:i + len(cols_i), j:j + r.shape[1]] = r
+            result[j:j + r.shape[1], i:i + len(cols_i)] = r.T
+
+    np.clip(result, -1.0, 1.0, out=result)
+    # Constant columns have undefined correlation, except with themselves
+    diag = np.diag_indices(p)
+    result[diag] = np.where(np.isnan(result[diag]), np.nan, 1.0)
+
+    return pd.DataFrame(result, index=columns, columns=columns)
+
+
+def top_k_pairs(corr_matrix, k=10):
+    """Strongest off-diagonal pairs by absolute correlation.
+
+    Selects from the upper triangle with argpartition instead of stacking the
+    whole matrix into a long table.
+    """
+    values = corr_matrix.to_numpy()
+    p = values.shape[0]
+
+    strength = np.abs(values).astype(np.float64)
+    strength[np.tril_indices(p)] = -1.0
+    strength[np.isnan(strength)] = -1.0
+
+    flat = strength.ravel()
+    k = min(k, p * (p - 1) // 2)
+    if k <= 0:
+        return pd.DataFrame(columns=['Variable 1', 'Variable 2', 'Correlation'])
+
+    top = np.argpartition(flat, -k)[-k:]
+    top = top[np.argsort(flat[top])[::-1]]
+    top = top[flat[top] >= 0]
+    rows, cols = np.unravel_index(top, (p, p))
+
+    return pd.DataFrame({
+        'Variable 1': corr_matrix.index[rows],
+        'Variable 2': corr_matrix.columns[cols],
+        'Correlation': values[rows, cols],
+    })
+
+
+def _cramers_v(codes_a, levels_a, codes_b, levels_b):
+    valid = (codes_a >= 0) & (codes_b >= 0)
+    n = valid.sum()
+    if n == 0:
+        return np.nan
+
+    counts = np.bincount(codes_a[valid] * levels_b + codes_b[valid],
+                         minlength=levels_a * levels_b).reshape(levels_a, levels_b)
+    counts = counts[counts.sum(axis=1) > 0][:, counts.sum(axis=0) > 0]
+    r, c = counts.shape
+    if min(r, c) < 2:
+        return np.nan
+
+    expected = np.outer(counts.sum(axis=1), counts.sum(axis=0)) / n
+    chi2 = ((counts - expected) ** 2 / expected).sum()
+    return np.sqrt(chi2 / n / (min(r, c) - 1))
+
+
+def cramers_v_matrix(df, columns):
+    """Cramér's V association matrix for categorical columns.
+
+    Each column is integer-coded once; every pair's contingency table is a
+    single bincount over combined codes.
+    """
+    columns = list(columns)
+    codes = {}
+    for col in columns:
+        col_codes, uniques = pd.factorize(df[col])
+        codes[col] = (col_codes.astype(np.int64), len(uniques))
+
+    p = len(columns)
+    result = np.eye(p, dtype=np.float32)
+    for i in range(p):
+        for j in range(i + 1, p):
+            v = _cramers_v(*codes[columns[i]], *codes[columns[j]])
+            result[i, j] = result[j, i] = v
+
+    return pd.DataFrame(result, index=columns, columns=columns)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _cached_matrix(fingerprint, columns, method, _df):
+    if method == "cramers_v":
+        return cramers_v_matrix(_df, columns)
+    return correlation_matrix(_df, columns, method)
+
+
+def cached_correlation(df, columns, method="pearson"):
+    """Correlation matrix computed once per (dataset version, columns, method).
+
+    `method` is one of CORRELATION_METHODS or "cramers_v" for categorical
+    columns. The DataFrame itself is not hashed; the cache key uses its
+    fingerprint instead.
+    """
+    return _cached_matrix(dataset_fingerprint(df), tuple(columns), method, df)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def cluster_linkage(corr_matrix, method="average"):
+    """Hierarchical clustering of variables on distance 1 - |r|.
+
+    Cached per correlation matrix, so switching between heatmap views or
+    toggling annotations does not recluster. Returns (linkage, leaf order).
+    """
+    values = np.nan_to_num(corr_matrix.to_numpy(dtype=np.float64), nan=0.0)
+    dist = 1.0 - np.abs(values)
+    dist = np.clip((dist + dist.T) / 2, 0.0, None)
+    np.fill_diagonal(dist, 0.0)
+
+    Z = linkage(squareform(dist, checks=False), method=method)
+    return Z, leaves_list(Z)
+
+
+def clustered_heatmap(corr_matrix, annotate=False, title="Clustered Correlation Heatmap",
+                      max_labels=MAX_TICK_LABELS):
+    """Interactive heatmap in dendrogram order with the dendrogram on top.
+
+    Values are rounded to 3 decimals to keep the payload small; axis labels
+    are hidden past `max_labels` variables (they remain visible on hover).
+    The heatmap columns sit at the numeric leaf positions of the dendrogram
+    and both share one x-axis, so zooming or panning one moves the other.
+    """
+    Z, order = cluster_linkage(corr_matrix)
+    p = len(order)
+    names = corr_matrix.columns[order].astype(str)
+    values = np.round(corr_matrix.to_numpy()[np.ix_(order, order)], 3)
+
+    fig = make_subplots(rows=2, cols=1, row_heights=[0.15, 0.85], vertical_spacing=0.01,
+                        shared_xaxes=True)
+
+    # Dendrogram as a single line trace (segments separated by None)
+    tree = dendrogram(Z, no_plot=True, count_sort=False, distance_sort=False)
+    xs, ys = [], []
+    for icoord, dcoord in zip(tree['icoord'], tree['dcoord']):
+        # scipy places leaf i at x = 10*i + 5
+        xs.extend([(x - 5) / 10 for x in icoord] + [None])
+        ys.extend(list(dcoord) + [None])
+    fig.add_trace(go.Scatter(x=xs, y=ys, mode='lines', line=dict(width=1, color='gray'),
+                             hoverinfo='skip', showlegend=False), row=1, col=1)
+
+    # Columns at the leaf positions; names come back through ticktext and hover
+    positions = np.arange(p)
+    fig.add_trace(go.Heatmap(
+        z=values, x=positions, y=names,
+        customdata=np.broadcast_to(names.to_numpy(dtype=object), (p, p)),
+        colorscale='RdBu_r', zmid=0, zmin=-1, zmax=1,
+        texttemplate='%{z:.2f}' if annotate else None,
+        hovertemplate='%{y} / %{customdata}: %{z:.3f}<extra></extra>',
+    ), row=2, col=1)
+
+    show_labels = p <= max_labels
+    fig.update_xaxes(range=[-0.5, p - 0.5], row=2, col=1)
+    fig.update_xaxes(showticklabels=False, showgrid=False, zeroline=False, row=1, col=1)
+    fig.update_yaxes(visible=False, row=1, col=1)
+    fig.update_xaxes(tickmode='array', tickvals=positions, ticktext=names, tickangle=-90,
+                     showticklabels=show_labels, showgrid=False, zeroline=False, row=2, col=1)
+    fig.update_yaxes(showticklabels=show_labels, autorange='reversed', row=2, col=1)
+    fig.update_layout(title=title, height=max(600, min(1200, 12 * p)))
+
+    return fig
@@ -0,0 +1,49 @@
+import hashlib
+import weakref
+
+import pandas as pd
+
+_fingerprints = {}
+
+
+def _hash_frame(df):
+    # Every row is hashed: the fingerprint keys caches (and the model store)
+    # that must never serve results of an edited dataset. hash_pandas_object
+    # is vectorized, and the hash is computed once per frame.
+    h = hashlib.sha1()
+    h.update(repr(df.shape).encode())
+    h.update(repr(list(df.columns)).encode())
+    h.update(repr([str(t) for t in df.dtypes]).encode())
+
+    try:
+        row_hashes = pd.util.hash_pandas_object(df, index=True)
+    except TypeError:
+        # Unhashable cells (lists, dicts) - fall back to their string form
+        row_hashes = pd.util.hash_pandas_object(df.astype(str), index=True)
+    h.update(row_hashes.to_numpy().tobytes())
+
+    return h.hexdigest()
+
+
+def dataset_digest(df):
+    """Return the full content hash (SHA-1 hex) of a dataset.
+
+    The hash is memoized per DataFrame object, so calling it on every rerun
+    is free once the dataset has been loaded. Pages replace
+    st.session_state["dataset"] with a new frame whenever data changes, which
+    yields a new digest. Persistent keys (see artifacts.artifact_key) use
+    the full digest.
+    """
+    key = id(df)
+    entry = _fingerprints.get(key)
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+
+    digest = _hash_frame(df)
+    _fingerprints[key] = (weakref.ref(df, lambda _, key=key: _fingerprints.pop(key, None)), digest)
+    return digest
+
+
+def dataset_fingerprint(df):
+    """Return a short content hash identifying this version of a dataset (for cache keys and display)."""
+    return dataset_digest(df)[:16]
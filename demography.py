@@ -0,0 +1,289 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+# Spellings mapped to the two pyramid sides (compared lower-cased, stripped)
+SEX_ALIASES = {
+    "Male": {"m", "male", "males", "man", "men", "h", "hombre", "hombres",
+             "masculino", "masc", "varon", "varón"},
+    "Female": {"f", "female", "females", "woman", "women", "mujer", "mujeres",
+               "femenino", "fem"},
+}
+SEX_LABELS = ["Male", "Female"]
+
+
+def normalize_sex(values):
+    """Integer sex codes: 0 = Male, 1 = Female, -1 = unknown/other.
+
+    Only the distinct values are inspected, so this is cheap on large frames.
+    """
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+    lookup = np.full(len(uniques) + 1, -1, dtype=np.int8)
+    for i, value in enumerate(uniques):
+        key = str(value).strip().lower()
+        for code, label in enumerate(SEX_LABELS):
+            if key in SEX_ALIASES[label]:
+                lookup[i] = code
+    # NaN codes are -1, which indexes the trailing "unknown" slot
+    return lookup[codes]
+
+
+def age_band_edges(band_width=5, max_age=85):
+    """Lower edges of the age bands; the last band is open-ended."""
+    return np.arange(0, max_age + band_width, band_width)
+
+
+def age_band_labels(edges):
+    labels = []
+    for lo, next_lo in zip(edges[:-1], edges[1:]):
+        hi = next_lo - 1
+        labels.append(str(lo) if hi == lo else f"{lo}-{hi}")
+    labels.append(f"{edges[-1]}+")
+    return labels
+
+
+def age_band_codes(ages, edges):
+    """Band index for each age (np.digitize on lower edges); -1 if invalid."""
+    ages = pd.to_numeric(pd.Series(ages), errors="coerce").to_numpy(dtype=np.float64)
+    invalid = ~np.isfinite(ages) | (ages < edges[0])
+
+    steps = np.diff(edges)
+    if len(steps) and np.all(steps == steps[0]):
+        # Regular bands: integer division is much cheaper than a binary search
+        codes = np.floor_divide(ages - edges[0], steps[0], where=~invalid, out=np.zeros_like(ages))
+        codes = np.minimum(codes.astype(np.int64), len(edges) - 1)
+    else:
+        codes = np.digitize(ages, edges) - 1
+    codes[invalid] = -1
+    return codes
+
+
+def build_pyramid(df, age_col, sex_col, band_width=5, max_age=85, edges=None, facet_cols=()):
+    """Population counts by age band x sex (x facets) in one bincount.
+
+    Ages are cut into `band_width`-year bands with an open `max_age`+ band,
+    or at custom lower `edges` (e.g. [0, 1, 5, 15, 45, 65]) when given.
+    Facet columns (e.g. region, year) are integer-coded and folded into the
+    same key, so any number of facets costs a single pass over the rows.
+
+    Returns a long DataFrame with the facet columns, 'Age Group' (ordered
+    categorical), 'Sex', 'Population' and 'Percent' (share of the facet total),
+    plus the number of rows dropped for unknown age or sex.
+    """
+    facet_cols = list(dict.fromkeys(c for c in facet_cols if c))
+    if edges is None:
+        edges = age_band_edges(band_width, max_age)
+    edges = np.asarray(edges)
+    labels = age_band_labels(edges)
+    n_bands = len(edges)
+
+    band = age_band_codes(df[age_col], edges)
+    sex = normalize_sex(df[sex_col])
+    valid = (band >= 0) & (sex >= 0)
+
+    key = sex.astype(np.int64) * n_bands + band
+    shape = [len(SEX_LABELS), n_bands]
+    facet_levels = []
+    for col in reversed(facet_cols):
+        codes, uniques = pd.factorize(df[col], sort=True)
+        valid &= codes >= 0
+        key += codes.astype(np.int64) * int(np.prod(shape))
+        shape.insert(0, len(uniques))
+        facet_levels.insert(0, uniques)
+
+    counts = np.bincount(key[valid], minlength=int(np.prod(shape))).reshape(shape)
+    dropped = int((~valid).sum())
+
+    index = pd.MultiIndex.from_product(
+        facet_levels + [SEX_LABELS, pd.CategoricalIndex(labels, categories=labels, ordered=True)],
+        names=facet_cols + ["Sex", "Age Group"],
+    )
+    pyramid = pd.DataFrame({"Population": counts.ravel()}, index=index).reset_index()
+
+    if facet_cols:
+        totals = pyramid.groupby(facet_cols, observed=True)["Population"].transform("sum")
+    else:
+        totals = pyramid["Population"].sum()
+    pyramid["Percent"] = np.where(totals > 0, pyramid["Population"] / totals * 100, 0.0)
+
+    return pyramid, dropped
+
+
+def pyramid_figure(pyramid, value="Population", facet_col=None, facet_row=None, title="Population Pyramid"):
+    """Horizontal bar pyramid: males to the left, females to the right."""
+    plot_df = pyramid.copy()
+    plot_df["Value"] = np.where(plot_df["Sex"] == "Male", -plot_df[value], plot_df[value])
+
+    fig = px.bar(
+        plot_df, x="Value", y="Age Group", color="Sex", orientation="h",
+        facet_col=facet_col, facet_row=facet_row,
+        custom_data=[value],
+        category_orders={"Age Group": list(plot_df["Age Group"].cat.categories), "Sex": SEX_LABELS},
+        title=title,
+    )
+    suffix = "%" if value == "Percent" else ""
+    fig.update_traces(hovertemplate=f"%{{y}}: %{{customdata[0]:,.1f}}{suffix}<extra>%{{fullData.name}}</extra>")
+    fig.update_layout(barmode="relative", bargap=0.1, height=600 if facet_row is None else 900)
+    fig.update_xaxes(title=value, tickformat=",.0f")
+    return fig
+
+
+# -------------------------
+# Age standardization
+# -------------------------
+
+# Lower edges of the 5-year bands used by the bundled standards (85+ open)
+STANDARD_AGE_EDGES = np.arange(0, 90, 5)
+
+# Standard populations per 100,000 for bands 0-4, 5-9, ..., 80-84, 85+.
+# WHO 85+ is the sum of its 85-89 ... 100+ bands. Weights are normalized
+# before use, so the published rounding (WHO sums to 100,035) is harmless.
+STANDARD_POPULATIONS = {
+    "WHO World (2000-2025)": [8860, 8690, 8600, 8470, 8220, 7930, 7610, 7150, 6590,
+                              6040, 5370, 4550, 3720, 2960, 2210, 1520, 910, 635],
+    "Segi World (1960)": [12000, 10000, 9000, 9000, 8000, 8000, 6000, 6000, 6000,
+                          6000, 5000, 4000, 4000, 3000, 2000, 1000, 500, 500],
+}
+
+
+def age_lower_bounds(values):
+    """Numeric ages, or the lower bound of age-group labels like "15-19"/"85+"."""
+    series = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype=np.float64)
+    # Parse each distinct label once
+    codes, uniques = pd.factorize(series)
+    bounds = pd.to_numeric(pd.Series(uniques, dtype=str).str.extract(r"(\d+(?:\.\d+)?)")[0],
+                           errors="coerce").to_numpy(dtype=np.float64)
+    return np.append(bounds, np.nan)[codes]
+
+
+def age_specific_table(df, age_col, event_col, pop_col, strata_cols=(), edges=STANDARD_AGE_EDGES):
+    """Events and population as (strata x age band) matrices.
+
+    One groupby-sum over strata and age band; empty cells are zero-filled.
+    """
+    strata_cols = list(dict.fromkeys(c for c in strata_cols if c))
+    edges = np.asarray(edges)
+    band = age_band_codes(age_lower_bounds(df[age_col]), edges)
+
+    if strata_cols:
+        keys = [df[c] for c in strata_cols]
+    else:
+        keys = [pd.Series("All", index=df.index, name="Stratum")]
+    keys.append(pd.Series(band, index=df.index, name="_band"))
+    sums = (df[[event_col, pop_col]]
+            .apply(pd.to_numeric, errors="coerce")
+            .loc[band >= 0]
+            .groupby([k[band >= 0] for k in keys], observed=True)
+            .sum())
+
+    events = sums[event_col].unstack("_band", fill_value=0)
+    population = sums[pop_col].unstack("_band", fill_value=0)
+    bands = range(len(edges))
+    events = events.reindex(columns=bands, fill_value=0)
+    population = population.reindex(columns=bands, fill_value=0)
+
+    labels = age_band_labels(edges)
+    events.columns = population.columns = labels
+    return events, population
+
+
+def direct_standardize(df, age_col, event_col, pop_col, strata_cols=(),
+                       standard="WHO World (2000-2025)", edges=STANDARD_AGE_EDGES,
+                       per=100_000, alpha=0.05):
+    """Directly age-standardized rates for every stratum in one call.
+
+    `standard` is a key of STANDARD_POPULATIONS or a sequence of weights, one
+    per age band in `edges`. Confidence intervals use the Fay-Feuer gamma
+    method. A stratum with no population in a band the standard weights has
+    no defined adjusted rate: its rate and interval are NaN and the band is
+    counted in "Empty Bands".
+    """
+    from scipy import stats
+
+    weights = STANDARD_POPULATIONS[standard] if isinstance(standard, str) else standard
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(weights) != len(edges):
+        raise ValueError(f"Standard population has {len(weights)} bands, expected {len(edges)}")
+    weights = weights / weights.sum()
+
+    events, population = age_specific_table(df, age_col, event_col, pop_col, strata_cols, edges)
+    d = events.to_numpy(dtype=np.float64)
+    n = population.to_numpy(dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.where(n > 0, d / n, 0.0)
+        var_terms = np.where(n > 0, d / n ** 2, 0.0)
+        w_over_n = np.where(n > 0, weights / n, 0.0)
+
+    adjusted = rates @ weights
+    variance = var_terms @ weights ** 2
+    wm = w_over_n.max(axis=1)
+    # Counting such a band as rate 0 would understate the rate of coarse data
+    empty_bands = ((n == 0) & (weights > 0)).sum(axis=1)
+    undefined = empty_bands > 0
+
+    # Fay & Feuer (1997) gamma intervals
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lower = np.where(
+            adjusted > 0,
+            stats.gamma.ppf(alpha / 2, adjusted ** 2 / variance, scale=variance / adjusted),
+            0.0,
+        )
+        upper = stats.gamma.ppf(1 - alpha / 2, (adjusted + wm) ** 2 / (variance + wm ** 2),
+                                scale=(variance + wm ** 2) / (adjusted + wm))
+
+    total_events = d.sum(axis=1)
+    total_pop = n.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crude = np.where(total_pop > 0, total_events / total_pop, np.nan)
+
+    return pd.DataFrame({
+        "Events": total_events,
+        "Population": total_pop,
+        "Crude Rate": crude * per,
+        "Adjusted Rate": np.where(undefined, np.nan, adjusted * per),
+        "CI Lower": np.where(undefined, np.nan, lower * per),
+        "CI Upper": np.where(undefined, np.nan, upper * per),
+        "Empty Bands": empty_bands,
+    }, index=events.index)
+
+
+def indirect_standardize(df, age_col, event_col, pop_col, strata_cols=(),
+                         reference_rates=None, edges=STANDARD_AGE_EDGES, alpha=0.05):
+    """Expected counts and SMRs for every stratum in one call.
+
+    `reference_rates` are age-specific rates (events per person) aligned with
+    `edges`; by default the pooled rates of the whole dataset are used
+    (internal standard). SMR intervals are exact Poisson limits.
+    """
+    from scipy import stats
+
+    events, population = age_specific_table(df, age_col, event_col, pop_col, strata_cols, edges)
+    d = events.to_numpy(dtype=np.float64)
+    n = population.to_numpy(dtype=np.float64)
+
+    if reference_rates is None:
+        pooled_n = n.sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            reference_rates = np.where(pooled_n > 0, d.sum(axis=0) / pooled_n, 0.0)
+    reference_rates = np.asarray(reference_rates, dtype=np.float64)
+    if len(reference_rates) != len(edges):
+        raise ValueError(f"Reference rates have {len(reference_rates)} bands, expected {len(edges)}")
+
+    observed = d.sum(axis=1)
+    expected = n @ reference_rates
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        smr = np.where(expected > 0, observed / expected, np.nan)
+        lower = np.where(observed > 0, stats.chi2.ppf(alpha / 2, 2 * observed) / (2 * expected), 0.0)
+        upper = stats.chi2.ppf(1 - alpha / 2, 2 * observed + 2) / (2 * expected)
+
+    return pd.DataFrame({
+        "Observed": observed,
+        "Expected": expected,
+        "SMR": smr,
+        "CI Lower": lower,
+        "CI Upper": upper,
+    }, index=events.index)
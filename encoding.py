@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.model_selection import KFold
+from sklearn.utils import murmurhash3_32
+
+# Label of the pooled column collecting rare (and unseen) levels
+OTHER_LEVEL = "Other"
+
+# One-hot columns with more kept levels than this are hashed instead
+HASH_THRESHOLD = 1000
+HASH_FEATURES = 2 ** 10
+
+# Target encoding: pseudo-count pulling small levels toward the global mean,
+# and folds used to encode the training rows out-of-fold
+TARGET_SMOOTHING = 10.0
+TARGET_FOLDS = 5
+
+ENCODINGS = {
+    "One-hot": "onehot",
+    "Frequency": "frequency",
+    "Target (mean)": "target",
+}
+
+
+def _levels(column):
+    # Missing values get no level (all-zero row), as with pd.get_dummies
+    values = pd.Series(column, copy=False)
+    return values.where(values.isna(), values.astype(str))
+
+
+class CategoricalEncoder(BaseEstimator, TransformerMixin):
+    """Sparse encoder for categorical columns of any cardinality.
+
+    Every column is encoded independently into a scipy CSR block:
+
+    - ``"onehot"``: one column per kept level. Levels seen fewer than
+      `min_frequency` times (or beyond the `max_levels` most frequent) are
+      pooled into one "Other" column, which also receives levels unseen
+      during fitting. With `drop_first` the first kept level is the
+      reference. Above `hash_threshold` kept levels the column is hashed
+      into `n_hash_features` buckets instead.
+    - ``"frequency"``: one column with the level's share of the training rows.
+    - ``"target"``: one column with the smoothed mean of y for the level; the
+      training rows themselves are encoded out-of-fold so a row never sees
+      its own target.
+
+    The output is never densified, so it can feed sparse-capable estimators
+    directly.
+    """
+
+    def __init__(self, strategy="onehot", min_frequency=1, max_levels=None, drop_first=True,
+                 hash_threshold=HASH_THRESHOLD, n_hash_features=HASH_FEATURES,
+                 smoothing=TARGET_SMOOTHING):
+        self.strategy = strategy
+        self.min_frequency = min_frequency
+        self.max_levels = max_levels
+        self.drop_first = drop_first
+        self.hash_threshold = hash_threshold
+        self.n_hash_features = n_hash_features
+        self.smoothing = smoothing
+
+    def _columns(self, X):
+        if isinstance(X, pd.DataFrame):
+            return [str(c) for c in X.columns], [X.iloc[:, i] for i in range(X.shape[1])]
+        X = np.asarray(X, dtype=object)
+        return [f"x{i}" for i in range(X.shape[1])], [X[:, i] for i in range(X.shape[1])]
+
+    def _fit_column(self, values, y):
+        if self.strategy == "target":
+            if y is None:
+                raise ValueError("Target encoding needs the target values")
+            stats = pd.DataFrame({"level": values, "y": y}).groupby("level")["y"].agg(["sum", "count"])
+            prior = float(np.mean(y))
+            means = (stats["sum"] + self.smoothing * prior) / (stats["count"] + self.smoothing)
+            return {"kind": "target", "means": means, "prior": prior}
+
+        return self._fit_counts(values.value_counts())
+
+    def _fit_counts(self, counts):
+        if self.strategy == "frequency":
+            return {"kind": "frequency", "share": counts / counts.sum()}
+        counts = counts.sort_values(ascending=False, kind="stable")
+        kept = counts[counts >= self.min_frequency]
+        if self.max_levels is not None:
+            kept = kept.iloc[:self.max_levels]
+        pooled = len(kept) < len(counts)
+        levels = sorted(kept.index)
+        if len(levels) > self.hash_threshold:
+            return {"kind": "hash"}
+        reference = levels.pop(0) if self.drop_first and levels else None
+        return {"kind": "onehot", "levels": levels, "reference": reference, "other": pooled}
+
+    def fit(self, X, y=None):
+        names, columns = self._columns(X)
+        y = None if y is None else np.asarray(y, dtype=np.float64)
+        self.feature_names_in_ = np.array(names, dtype=object)
+        self.encodings_ = [self._fit_column(_levels(col), y) for col in columns]
+        return self
+
+    def fit_from_counts(self, counts):
+        """Fit from per-column level counts ({column: pd.Series of counts}).
+
+        Lets data streamed in chunks be encoded without holding it: the
+        counts are summed chunk by chunk, then the encoder is fitted once.
+        Target encoding needs the rows themselves and is not supported.
+        """
+        if self.strategy == "target":
+            raise ValueError("Target encoding cannot be fitted from level counts")
+        self.feature_names_in_ = np.array(list(counts), dtype=object)
+        self.encodings_ = [self._fit_counts(c) for c in counts.values()]
+        return self
+
+    def fit_transform(self, X, y=None, **fit_params):
+        self.fit(X, y)
+        if self.strategy != "target":
+            return self.transform(X)
+
+        # Out-of-fold target means for the training rows
+        names, columns = self._columns(X)
+        y = np.asarray(y, dtype=np.float64)
+        blocks = []
+        for col in columns:
+            values = _levels(col).reset_index(drop=True)
+            encoded = np.empty(len(values))
+            for fit_idx, enc_idx in KFold(min(TARGET_FOLDS, len(values)), shuffle=True, random_state=0).split(values):
+                enc = self._fit_column(values.iloc[fit_idx], y[fit_idx])
+                encoded[enc_idx] = values.iloc[enc_idx].map(enc["means"]).fillna(enc["prior"]).to_numpy()
+            blocks.append(sp.csr_matrix(encoded.reshape(-1, 1)))
+        return sp.hstack(blocks, format="csr")
+
+    def _transform_column(self, name, values, enc):
+        n = len(values)
+        if enc["kind"] in ("frequency", "target"):
+            mapping, fill = (enc["share"], 0.0) if enc["kind"] == "frequency" else (enc["means"], enc["prior"])
+            encoded = values.map(mapping).astype(np.float64).fillna(fill).to_numpy()
+            return sp.csr_matrix(encoded.reshape(-1, 1))
+
+        codes, uniques = pd.factorize(values)
+        if enc["kind"] == "hash":
+            buckets = np.array([murmurhash3_32(f"{name}={u}", positive=True) % self.n_hash_features
+                                for u in uniques], dtype=np.int64)
+            width = self.n_hash_features
+        else:
+            position = {level: i for i, level in enumerate(enc["levels"])}
+            position[enc["reference"]] = -1
+            width = len(enc["levels"]) + enc["other"]
+            # Pooled and unseen levels go to "Other" when pooling, otherwise get no column
+            other = len(enc["levels"]) if enc["other"] else -1
+            buckets = np.array([position.get(u, other) for u in uniques], dtype=np.int64)
+
+        rows = np.flatnonzero(codes >= 0)
+        cols = buckets[codes[rows]] if len(uniques) else np.empty(0, dtype=np.int64)
+        hit = cols >= 0
+        data = np.ones(hit.sum())
+        return sp.csr_matrix((data, (rows[hit], cols[hit])), shape=(n, width))
+
+    def transform(self, X):
+        names, columns = self._columns(X)
+        blocks = [self._transform_column(name, _levels(col), enc)
+                  for name, col, enc in zip(names, columns, self.encodings_)]
+        return sp.hstack(blocks, format="csr") if blocks else sp.csr_matrix((len(X), 0))
+
+    def get_feature_names_out(self, input_features=None):
+        names = self.feature_names_in_ if input_features is None else input_features
+        out = []
+        for name, enc in zip(names, self.encodings_):
+            if enc["kind"] == "onehot":
+                out += [f"{name}_{level}" for level in enc["levels"]]
+                if enc["other"]:
+                    out.append(f"{name}_{OTHER_LEVEL}")
+            elif enc["kind"] == "hash":
+                out += [f"{name}_hash{i}" for i in range(self.n_hash_features)]
+            else:
+                out.append(f"{name}_{enc['kind']}")
+        return np.array(out, dtype=object)
+
+
+def encode_frame(df, columns, min_frequency=1, max_levels=None):
+    """`df` with the categorical `columns` one-hot encoded (pd.get_dummies replacement).
+
+    For the statsmodels / lifelines fits, which need named dense columns:
+    rare levels are pooled into "<column>_Other" first, so the frame width is
+    bounded by the kept levels rather than the raw cardinality. Hashing is
+    never used here (hashed columns have no interpretable coefficient).
+    """
+    columns = list(columns)
+    if not columns:
+        return df
+    encoder = CategoricalEncoder(min_frequency=min_frequency, max_levels=max_levels,
+                                 hash_threshold=np.inf).fit(df[columns])
+    dummies = pd.DataFrame(encoder.transform(df[columns]).toarray().astype(np.uint8), index=df.index,
+                           columns=encoder.get_feature_names_out())
+    return pd.concat([df.drop(columns=columns), dummies], axis=1)
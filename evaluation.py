@@ -0,0 +1,213 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from sklearn.linear_model import LogisticRegression, Ridge
+from sklearn.metrics import (accuracy_score, f1_score, mean_absolute_error, mean_squared_error,
+                             precision_recall_curve, precision_score, r2_score, recall_score,
+                             roc_auc_score, roc_curve, average_precision_score)
+from sklearn.model_selection import KFold, StratifiedKFold, cross_val_predict
+
+from benchmarks import COST_COLUMNS
+
+# Curves are drawn with at most this many points per model/class
+MAX_CURVE_POINTS = 500
+
+
+def make_folds(y, problem_type, cv_folds, random_state=42):
+    """(train_idx, test_idx) pairs generated once and shared by every model."""
+    if problem_type == "classification":
+        splitter = StratifiedKFold(cv_folds, shuffle=True, random_state=random_state)
+    else:
+        splitter = KFold(cv_folds, shuffle=True, random_state=random_state)
+    return list(splitter.split(np.zeros(len(y)), y))
+
+
+def prediction_metrics(problem_type, y_true, y_pred):
+    """The page's metrics computed from stored predictions (no model needed)."""
+    if problem_type == "classification":
+        return {
+            "Accuracy": accuracy_score(y_true, y_pred),
+            "Precision": precision_score(y_true, y_pred, average="weighted", zero_division=0),
+            "Recall": recall_score(y_true, y_pred, average="weighted", zero_division=0),
+            "F1-Score": f1_score(y_true, y_pred, average="weighted", zero_division=0),
+        }
+    return {
+        "RMSE": np.sqrt(mean_squared_error(y_true, y_pred)),
+        "MAE": mean_absolute_error(y_true, y_pred),
+        "R² Score": r2_score(y_true, y_pred),
+    }
+
+
+def fold_scores(problem_type, y_true, oof_pred, folds):
+    """Per-fold accuracy / R² from out-of-fold predictions (what cross_val_score reports)."""
+    score = accuracy_score if problem_type == "classification" else r2_score
+    return [score(y_true[test_idx], oof_pred[test_idx]) for _, test_idx in folds]
+
+
+def model_outputs(estimator, X, classes):
+    """Predictions plus class scores aligned to `classes` (None for regressors)."""
+    predictions = estimator.predict(X)
+    if classes is None:
+        return predictions, None
+    if hasattr(estimator, "predict_proba"):
+        raw = estimator.predict_proba(X)
+    elif hasattr(estimator, "decision_function"):
+        raw = estimator.decision_function(X)
+        if raw.ndim == 1:
+            raw = np.column_stack([-raw, raw])
+    else:
+        return predictions, None
+    # A fold may miss a rare class; keep columns in the global class order
+    scores = np.zeros((len(X), len(classes)))
+    scores[:, np.searchsorted(classes, estimator.classes_)] = raw
+    return predictions, scores
+
+
+def _thin(*arrays):
+    n = len(arrays[0])
+    if n <= MAX_CURVE_POINTS:
+        return arrays
+    keep = np.unique(np.linspace(0, n - 1, MAX_CURVE_POINTS).astype(np.int64))
+    return tuple(a[keep] for a in arrays)
+
+
+def classification_curves(y_true, scores):
+    """ROC and PR curves per model from out-of-fold class scores.
+
+    `scores` maps model name -> (n_samples, n_classes) probabilities or
+    decision values. Binary targets use the positive class; multiclass
+    targets are micro-averaged one-vs-rest.
+    """
+    y_true = np.asarray(y_true)
+    classes = np.unique(y_true)
+    curves = {}
+    for name, s in scores.items():
+        if s is None:
+            continue
+        s = np.asarray(s, dtype=np.float64)
+        if s.ndim == 1:
+            s = np.column_stack([-s, s])
+        if len(classes) == 2:
+            truth, score = (y_true == classes[1]).astype(int), s[:, 1]
+        else:
+            truth = (y_true[:, None] == classes[None, :]).astype(int).ravel()
+            score = s.ravel()
+        fpr, tpr, _ = roc_curve(truth, score)
+        precision, recall, _ = precision_recall_curve(truth, score)
+        curves[name] = {
+            "roc": _thin(fpr, tpr),
+            "pr": _thin(recall, precision),
+            "auc": roc_auc_score(truth, score),
+            "ap": average_precision_score(truth, score),
+        }
+    return curves
+
+
+def curves_figure(curves, title="Out-of-fold ROC and Precision-Recall"):
+    """ROC and PR side by side, one color per model."""
+    fig = make_subplots(rows=1, cols=2, subplot_titles=("ROC", "Precision-Recall"))
+    palette = px.colors.qualitative.Plotly
+    for i, (name, c) in enumerate(curves.items()):
+        color = palette[i % len(palette)]
+        fig.add_trace(go.Scatter(x=c["roc"][0], y=c["roc"][1], mode="lines", legendgroup=name,
+                                 name=f"{name} (AUC {c['auc']:.3f})", line=dict(color=color)), row=1, col=1)
+        fig.add_trace(go.Scatter(x=c["pr"][0], y=c["pr"][1], mode="lines", legendgroup=name,
+                                 name=f"{name} (AP {c['ap']:.3f})", line=dict(color=color)), row=1, col=2)
+    fig.add_trace(go.Scatter(x=[0, 1], y=[0, 1], mode="lines", showlegend=False,
+                             line=dict(dash="dash", color="gray")), row=1, col=1)
+    fig.update_xaxes(title_text="False Positive Rate", row=1, col=1)
+    fig.update_yaxes(title_text="True Positive Rate", row=1, col=1)
+    fig.update_xaxes(title_text="Recall", row=1, col=2)
+    fig.update_yaxes(title_text="Precision", row=1, col=2)
+    fig.update_layout(title=title, height=500)
+    return fig
+
+
+def _meta_features(problem_type, outputs):
+    if problem_type == "classification":
+        # Drop one probability column per model (they sum to 1)
+        return np.column_stack([np.asarray(o)[:, 1:] for o in outputs])
+    return np.column_stack(outputs)
+
+
+class StackedEnsemble:
+    """Fitted base models feeding a meta-model; predicts like one estimator."""
+
+    def __init__(self, problem_type, base_models, meta, classes=None):
+        self.problem_type = problem_type
+        self.base_models = base_models
+        self.meta = meta
+        self.classes = classes
+
+    def _features(self, X):
+        outputs = []
+        for model in self.base_models.values():
+            predictions, scores = model_outputs(model, X, self.classes)
+            outputs.append(scores if self.problem_type == "classification" else predictions)
+        return _meta_features(self.problem_type, outputs)
+
+    def predict(self, X):
+        return self.meta.predict(self._features(X))
+
+
+def stack_models(problem_type, y_train, folds, base_models, oof_outputs, test_outputs):
+    """Stacked ensemble trained on the base models' out-of-fold outputs.
+
+    `oof_outputs` / `test_outputs` map model name -> OOF class scores
+    (classification) or predictions (regression), and the matching test-set
+    outputs. Only the small meta-model is fitted; its own out-of-fold
+    predictions reuse the shared folds. Returns (ensemble, oof_predictions,
+    oof_scores, test_predictions, test_scores); scores are None for
+    regression.
+    """
+    names = list(oof_outputs)
+    Z = _meta_features(problem_type, [oof_outputs[n] for n in names])
+    Z_test = _meta_features(problem_type, [test_outputs[n] for n in names])
+
+    if problem_type == "classification":
+        classes = np.unique(y_train)
+        meta = LogisticRegression(max_iter=1000)
+        oof_scores = cross_val_predict(meta, Z, y_train, cv=folds, method="predict_proba")
+        oof_pred = classes[oof_scores.argmax(axis=1)]
+        meta.fit(Z, y_train)
+        test_scores = meta.predict_proba(Z_test)
+    else:
+        classes = oof_scores = test_scores = None
+        meta = Ridge(alpha=1.0)
+        oof_pred = cross_val_predict(meta, Z, y_train, cv=folds)
+        meta.fit(Z, y_train)
+
+    ensemble = StackedEnsemble(problem_type, {n: base_models[n] for n in names}, meta, classes)
+    return ensemble, oof_pred, oof_scores, meta.predict(Z_test), test_scores
+
+
+def model_result(problem_type, name, model, y_test, predictions, y_train=None, folds=None,
+                 oof_predictions=None, oof_scores=None, costs=None):
+    """One row of the page's results: holdout metrics, out-of-fold CV metrics and `costs`."""
+    result = {"Model": name, **prediction_metrics(problem_type, y_test, predictions), "CV Score": None}
+    if folds is not None and oof_predictions is not None:
+        result["CV Score"] = float(np.mean(fold_scores(problem_type, y_train, oof_predictions, folds)))
+        oof_metrics = prediction_metrics(problem_type, y_train, oof_predictions)
+        if problem_type == "classification":
+            result["CV F1"] = oof_metrics["F1-Score"]
+            if oof_scores is not None:
+                result["CV AUC"] = classification_curves(y_train, {name: oof_scores})[name]["auc"]
+        else:
+            result["CV RMSE"] = oof_metrics["RMSE"]
+    result.update(costs or {})
+    result.update({"Predictions": predictions, "Model Object": model,
+                   "OOF Predictions": oof_predictions, "OOF Scores": oof_scores})
+    return result
+
+
+def results_frame(results, problem_type):
+    """Display table: holdout metrics, then CV (out-of-fold) metrics, then training/inference costs."""
+    if problem_type == "classification":
+        cols = ["Model", "Accuracy", "Precision", "Recall", "F1-Score", "CV Score", "CV F1", "CV AUC"]
+    else:
+        cols = ["Model", "RMSE", "MAE", "R² Score", "CV Score", "CV RMSE"]
+    cols += COST_COLUMNS
+    frame = pd.DataFrame(results)
+    return frame[[c for c in cols if c in frame.columns and frame[c].notna().any()]]
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+
+import plotly.io as pio
+import streamlit as st
+
+from dataset_version import dataset_fingerprint
+
+# LRU bounds: number of figures and total compressed size
+MAX_CACHED_FIGURES = 64
+MAX_CACHE_BYTES = 256 * 1024 ** 2
+
+
+class FigureCache:
+    """Size-bounded LRU of serialized plotly figures.
+
+    Figures are stored as zlib-compressed plotly JSON, so cached entries are
+    immutable and a hit always returns a fresh Figure. Entries are evicted
+    least-recently-used first once either bound is exceeded; a single figure
+    larger than `max_bytes` is rendered but never stored.
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_FIGURES, max_bytes=MAX_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return pio.from_json(zlib.decompress(blob).decode())
+
+    def put(self, key, fig):
+        blob = zlib.compress(pio.to_json(fig, validate=False).encode(), 1)
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= len(self._entries.pop(key))
+            self._entries[key] = blob
+            self.nbytes += len(blob)
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+@st.cache_resource(show_spinner=False)
+def get_figure_cache():
+    """Process-wide figure cache shared by all sessions."""
+    return FigureCache()
+
+
+def figure_key(df, chart, params):
+    """Cache key from the dataset version, chart type and its parameters."""
+    payload = json.dumps(params, sort_keys=True, default=str)
+    digest = hashlib.sha1(f"{chart}|{payload}".encode()).hexdigest()[:16]
+    return f"{dataset_fingerprint(df)}:{digest}"
+
+
+def cached_figure(df, chart, params, build):
+    """Return the figure for (dataset version, chart, params), building it on a miss.
+
+    `build` is a zero-argument callable producing the plotly Figure; it only
+    runs when the figure is not cached. Hits and misses are also counted per
+    session for the page's cache report.
+    """
+    cache = get_figure_cache()
+    key = figure_key(df, chart, params)
+    stats = st.session_state.setdefault("figure_cache_stats", {"hits": 0, "misses": 0})
+
+    fig = cache.get(key)
+    if fig is not None:
+        stats["hits"] += 1
+        return fig
+
+    stats["misses"] += 1
+    fig = build()
+    cache.put(key, fig)
+    return fig
+
+
+def cache_report():
+    """One-line summary of this session's hits/misses and the cache size."""
+    cache = get_figure_cache()
+    stats = st.session_state.get("figure_cache_stats", {"hits": 0, "misses": 0})
+    total = stats["hits"] + stats["misses"]
+    rate = stats["hits"] / total * 100 if total else 0.0
+    return (f"Figure cache: {stats['hits']} hits / {stats['misses']} misses ({rate:.0f}% hit rate) · "
+            f"{len(cache)} figures, {cache.nbytes / 1024 ** 2:.1f} MB")
@@ -0,0 +1,328 @@
+import hashlib
+import json
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+try:
+    import shapefile  # pyshp
+    SHAPEFILE_AVAILABLE = True
+except ImportError:
+    SHAPEFILE_AVAILABLE = False
+
+# Administrative boundary files shipped with (or dropped into) the app
+GEODATA_DIR = Path(__file__).parent / "geodata"
+BOUNDARY_SUFFIXES = (".geojson", ".json", ".shp")
+
+# Map detail -> web-map zoom level the geometry is simplified for
+# (None keeps the full-resolution boundaries)
+DETAIL_LEVELS = {"Low": 4, "Medium": 6, "High": 8, "Full": None}
+
+# Coordinates are snapped to this many decimals (~0.1 m) so that borders
+# shared by neighbouring regions match exactly
+QUANTIZE_DIGITS = 6
+
+
+# -------------------------
+# Loading
+# -------------------------
+
+def available_boundaries():
+    """Boundary files in GEODATA_DIR, by display name."""
+    if not GEODATA_DIR.is_dir():
+        return {}
+    files = sorted(p for p in GEODATA_DIR.iterdir() if p.suffix.lower() in BOUNDARY_SUFFIXES)
+    if not SHAPEFILE_AVAILABLE:
+        files = [p for p in files if p.suffix.lower() != ".shp"]
+    return {p.stem: p for p in files}
+
+
+def read_boundaries(source):
+    """FeatureCollection dict from a GeoJSON/shapefile path or GeoJSON bytes."""
+    if isinstance(source, (bytes, bytearray)):
+        collection = json.loads(source)
+    elif Path(source).suffix.lower() == ".shp":
+        if not SHAPEFILE_AVAILABLE:
+            raise ImportError("Install 'pyshp' to read shapefiles: pip install pyshp")
+        collection = shapefile.Reader(str(source)).__geo_interface__
+    else:
+        with open(source, encoding="utf-8") as f:
+            collection = json.load(f)
+
+    if collection.get("type") != "FeatureCollection":
+        raise ValueError("Boundaries must be a GeoJSON FeatureCollection")
+    features = [f for f in collection["features"]
+                if (f.get("geometry") or {}).get("type") in ("Polygon", "MultiPolygon")]
+    if not features:
+        raise ValueError("No polygon features found in the boundary file")
+    return {"type": "FeatureCollection", "features": features}
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _cached_file(path, mtime):
+    return read_boundaries(path)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _cached_upload(digest, _data):
+    return read_boundaries(_data)
+
+
+def load_boundaries(source):
+    """(cache key, FeatureCollection) for a boundary file path or uploaded bytes.
+
+    Parsed boundaries are shared read-only across reruns and sessions.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        digest = hashlib.sha1(source).hexdigest()[:16]
+        return digest, _cached_upload(digest, source)
+    path = Path(source)
+    mtime = path.stat().st_mtime
+    return f"{path}:{mtime}", _cached_file(str(path), mtime)
+
+
+# -------------------------
+# Topology-preserving simplification
+# -------------------------
+
+def zoom_tolerance(zoom):
+    """Degrees spanned by one 256-px tile pixel at `zoom` (the simplification tolerance)."""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def _douglas_peucker(points, tolerance):
+    """Douglas-Peucker on an open polyline; both endpoints are always kept."""
+    n = len(points)
+    if n < 3:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        a, b = points[i], points[j]
+        rel = points[i + 1:j] - a
+        d = b - a
+        norm = np.hypot(d[0], d[1])
+        if norm == 0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(d[0] * rel[:, 1] - d[1] * rel[:, 0]) / norm
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            keep[i + 1 + k] = True
+            stack.append((i, i + 1 + k))
+            stack.append((i + 1 + k, j))
+    return points[keep]
+
+
+def _canonical_simplify(arc, tolerance, memo):
+    """Simplify an arc the same way whichever ring (and direction) it comes from."""
+    first, last = tuple(arc[0]), tuple(arc[-1])
+    reverse = last < first or (last == first and tuple(arc[-2]) < tuple(arc[1]))
+    canonical = arc[::-1] if reverse else arc
+    key = canonical.tobytes()
+    simplified = memo.get(key)
+    if simplified is None:
+        simplified = memo[key] = _douglas_peucker(canonical, tolerance)
+    return simplified[::-1] if reverse else simplified
+
+
+def _open_ring(coords):
+    """Quantized ring without the closing point or repeated vertices."""
+    ring = np.round(np.asarray(coords, dtype=np.float64)[:, :2], QUANTIZE_DIGITS)
+    ring = ring[np.r_[True, np.any(np.diff(ring, axis=0) != 0, axis=1)]]
+    if len(ring) > 1 and np.array_equal(ring[0], ring[-1]):
+        ring = ring[:-1]
+    return ring
+
+
+def _junctions(rings):
+    """Vertices where more than two distinct neighbours meet (arc endpoints)."""
+    pts = np.concatenate(rings)
+    prev = np.concatenate([np.roll(r, 1, axis=0) for r in rings])
+    nxt = np.concatenate([np.roll(r, -1, axis=0) for r in rings])
+    edges = pd.DataFrame({
+        "x": np.concatenate([pts[:, 0], pts[:, 0]]),
+        "y": np.concatenate([pts[:, 1], pts[:, 1]]),
+        "nx": np.concatenate([prev[:, 0], nxt[:, 0]]),
+        "ny": np.concatenate([prev[:, 1], nxt[:, 1]]),
+    }).drop_duplicates()
+    degree = edges.groupby(["x", "y"], sort=False).size()
+    junction_index = degree.index[degree.to_numpy() > 2]
+    return pd.MultiIndex.from_arrays([pts[:, 0], pts[:, 1]]).isin(junction_index)
+
+
+def _simplify_ring(ring, is_junction, tolerance, memo):
+    junction_pos = np.flatnonzero(is_junction)
+    if len(junction_pos) == 0:
+        # Free-standing ring (island, enclave): start at its smallest vertex
+        # and walk towards the smaller neighbour, so a ring shared by two
+        # polygons is cut identically in both
+        start = int(np.lexsort((ring[:, 1], ring[:, 0]))[0])
+        ring = np.roll(ring, -start, axis=0)
+        if tuple(ring[-1]) < tuple(ring[1]):
+            ring = np.roll(ring[::-1], 1, axis=0)
+        far = int(np.argmax(np.hypot(*(ring - ring[0]).T)))
+        closed = np.vstack([ring, ring[:1]])
+        parts = [closed[:far + 1], closed[far:]]
+    else:
+        ring = np.roll(ring, -junction_pos[0], axis=0)
+        cuts = np.append(junction_pos - junction_pos[0], len(ring))
+        closed = np.vstack([ring, ring[:1]])
+        parts = [closed[a:b + 1] for a, b in zip(cuts[:-1], cuts[1:])]
+
+    pieces = [_canonical_simplify(part, tolerance, memo) for part in parts]
+    simplified = np.vstack([pieces[0]] + [p[1:] for p in pieces[1:]])
+    if len(simplified) < 4:
+        # Collapsed below a triangle; keep the detailed ring
+        simplified = np.vstack([ring, ring[:1]])
+    return simplified
+
+
+def _signed_area(ring):
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * np.sum(x[:-1] * y[1:] - x[1:] * y[:-1])
+
+
+def _wind(ring, exterior):
+    # d3-geo (used by plotly) expects clockwise exteriors and counter-clockwise holes
+    clockwise = _signed_area(ring) < 0
+    return ring if clockwise == exterior else ring[::-1]
+
+
+def _polygons(geometry):
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    return geometry["coordinates"]
+
+
+def simplify_boundaries(collection, tolerance=None):
+    """Copy of `collection` with shared borders simplified consistently.
+
+    Rings are cut into arcs at junctions (vertices where three or more
+    borders meet); every arc is simplified once with Douglas-Peucker and
+    reused by each region it borders, so neighbours never gain gaps or
+    overlaps. With `tolerance=None` geometry is only quantized and rewound.
+    Each output feature gets its position as "id".
+    """
+    rings, owners = [], []
+    for f_idx, feature in enumerate(collection["features"]):
+        for p_idx, polygon in enumerate(_polygons(feature["geometry"])):
+            for r_idx, coords in enumerate(polygon):
+                ring = _open_ring(coords)
+                if len(ring) >= 3:
+                    rings.append(ring)
+                    owners.append((f_idx, p_idx, r_idx))
+
+    flags = _junctions(rings)
+    offsets = np.cumsum([0] + [len(r) for r in rings])
+    memo = {}
+
+    shapes = {}
+    for ring, (f_idx, p_idx, r_idx), lo, hi in zip(rings, owners, offsets[:-1], offsets[1:]):
+        if tolerance:
+            out = _simplify_ring(ring, flags[lo:hi], tolerance, memo)
+        else:
+            out = np.vstack([ring, ring[:1]])
+        out = _wind(out, exterior=r_idx == 0)
+        shapes.setdefault(f_idx, {}).setdefault(p_idx, []).append(out.tolist())
+
+    features = []
+    for f_idx, feature in enumerate(collection["features"]):
+        polygons = [rs for _, rs in sorted(shapes.get(f_idx, {}).items())]
+        features.append({
+            "type": "Feature",
+            "id": f_idx,
+            "properties": feature.get("properties") or {},
+            "geometry": {"type": "MultiPolygon", "coordinates": polygons},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _cached_simplified(key, zoom, _collection):
+    return simplify_boundaries(_collection, None if zoom is None else zoom_tolerance(zoom))
+
+
+def simplified_boundaries(key, collection, zoom):
+    """simplify_boundaries cached per (boundary file, zoom level)."""
+    return _cached_simplified(key, zoom, collection)
+
+
+# -------------------------
+# Region keys and aggregates
+# -------------------------
+
+def normalize_key(value):
+    """Join key: case-, accent- and whitespace-insensitive text."""
+    text = unicodedata.normalize("NFKD", str(value).strip().casefold())
+    return " ".join("".join(c for c in text if not unicodedata.combining(c)).split())
+
+
+def key_properties(collection):
+    """Feature property names usable as region keys (present on every feature)."""
+    names = None
+    for feature in collection["features"]:
+        props = set((feature.get("properties") or {}).keys())
+        names = props if names is None else names & props
+    return sorted(names or [])
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _cached_index(key, key_property, _collection):
+    index = {}
+    for i, feature in enumerate(_collection["features"]):
+        value = (feature.get("properties") or {}).get(key_property)
+        if value is not None:
+            index.setdefault(normalize_key(value), i)
+    return index
+
+
+def region_index(key, collection, key_property):
+    """Normalized region key -> feature id, built once per boundary file and property."""
+    return _cached_index(key, key_property, collection)
+
+
+def best_key_property(key, collection, regions):
+    """Property whose values match the most distinct `regions`."""
+    wanted = {normalize_key(r) for r in pd.unique(pd.Series(regions).dropna())}
+    scores = {prop: len(wanted & region_index(key, collection, prop).keys())
+              for prop in key_properties(collection)}
+    return max(scores, key=scores.get) if scores else None
+
+
+def aggregate_by_region(df, region_col, value_col):
+    """Sum, Mean and Count of `value_col` per region in one groupby."""
+    return (df.groupby(region_col, observed=True)
+              .agg(Sum=(value_col, "sum"), Mean=(value_col, "mean"), Count=(value_col, "size"))
+              .reset_index())
+
+
+def join_regions(aggregates, region_col, index):
+    """Attach feature ids to region aggregates; returns (matched, unmatched regions)."""
+    codes, uniques = pd.factorize(aggregates[region_col])
+    lookup = np.array([index.get(normalize_key(u), -1) for u in uniques] + [-1])
+    feature_id = lookup[codes]
+    matched = aggregates.assign(feature_id=feature_id)[feature_id >= 0]
+    unmatched = aggregates.loc[feature_id < 0, region_col].tolist()
+    return matched, unmatched
+
+
+def choropleth_figure(joined, geojson, region_col, value, title=None):
+    """Offline choropleth (no tile server) fitted to the mapped regions."""
+    fig = px.choropleth(
+        joined, geojson=geojson, locations="feature_id", color=value,
+        hover_name=region_col, hover_data={"feature_id": False, "Sum": ":,.2f",
+                                           "Mean": ":,.2f", "Count": ":,"},
+        color_continuous_scale="Reds", title=title,
+    )
+    fig.update_geos(fitbounds="locations", visible=False)
+    fig.update_layout(height=600, margin=dict(l=0, r=0, t=50, b=0))
+    return fig
@@ -0,0 +1,425 @@
+import hashlib
+import json
+import tempfile
+import time
+import traceback
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.linear_model import SGDClassifier, SGDRegressor
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neural_network import MLPClassifier, MLPRegressor
+from sklearn.preprocessing import StandardScaler
+
+try:
+    import xgboost as xgb
+    XGBOOST_AVAILABLE = True
+except ImportError:
+    XGBOOST_AVAILABLE = False
+
+from artifacts import private_dir
+from encoding import CategoricalEncoder
+from evaluation import prediction_metrics
+from scoring import SCORING_CHUNK_ROWS, read_chunks
+
+# Rows sampled from the file to decide which columns are categorical
+DTYPE_SAMPLE_ROWS = 10_000
+
+# Holdout rows are drawn from every chunk; at most this many are kept (in memory)
+MAX_HOLDOUT_ROWS = 200_000
+
+# The holdout is scored every EVAL_EVERY chunks, and a checkpoint written
+# every CHECKPOINT_EVERY chunks (and at the end of each epoch)
+EVAL_EVERY = 5
+CHECKPOINT_EVERY = 10
+
+CHECKPOINT_DIR = private_dir("incremental_checkpoints")
+
+# Outcome of pass 1, written once per run; checkpoints only hold the rest
+# (model, position, curve), so the holdout is not rewritten every time
+_SETUP_FIELDS = ("key", "feature_dtypes", "preprocessor", "classes", "total_rows", "holdout_X", "holdout_y")
+
+# Estimators with partial_fit, by problem type. GaussianNB needs dense
+# chunks; the others take the sparse encoded chunks as they are.
+INCREMENTAL_MODELS = {
+    "classification": {
+        "SGD Logistic Regression": lambda: SGDClassifier(loss="log_loss", random_state=0),
+        "Naive Bayes (Gaussian)": lambda: GaussianNB(),
+        "MLP (mini-batch)": lambda: MLPClassifier(hidden_layer_sizes=(64,), random_state=0),
+    },
+    "regression": {
+        "SGD Linear Regression": lambda: SGDRegressor(random_state=0),
+        "MLP (mini-batch)": lambda: MLPRegressor(hidden_layer_sizes=(64,), random_state=0),
+    },
+}
+DENSE_ONLY = (GaussianNB,)
+
+# Boosting rounds for the external-memory XGBoost model
+XGB_ROUNDS = 200
+XGB_EXTERNAL = "XGBoost (external memory)"
+if XGBOOST_AVAILABLE:
+    for _models in INCREMENTAL_MODELS.values():
+        _models[XGB_EXTERNAL] = None
+
+
+def infer_dtypes(source, features):
+    """Training dtypes of `features`, from a sample of the file's first rows."""
+    sample = next(read_chunks(source, features, chunk_rows=DTYPE_SAMPLE_ROWS))
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return {col: ("object" if sample[col].dtype == object or sample[col].dtype.name == "category"
+                  else str(sample[col].dtype)) for col in features}
+
+
+class StreamingPreprocessor:
+    """Mean imputation, standardization and sparse encoding fitted chunk by chunk.
+
+    partial_fit() accumulates numeric means/variances (StandardScaler
+    partial_fit, NaNs ignored) and categorical level counts; finalize() fits
+    the encoder from the counts. transform() returns a CSR matrix.
+    """
+
+    def __init__(self, feature_dtypes, min_frequency=1):
+        self.feature_dtypes = feature_dtypes
+        self.numeric = [c for c, t in feature_dtypes.items() if t not in ("object", "category")]
+        self.categorical = [c for c, t in feature_dtypes.items() if t in ("object", "category")]
+        self.scaler = StandardScaler()
+        self.encoder = CategoricalEncoder(min_frequency=min_frequency)
+        self._counts = {col: pd.Series(dtype=np.int64) for col in self.categorical}
+
+    def partial_fit(self, X):
+        if self.numeric:
+            self.scaler.partial_fit(X[self.numeric].to_numpy(dtype=np.float64))
+        for col in self.categorical:
+            values = X[col].where(X[col].isna(), X[col].astype(str))
+            self._counts[col] = self._counts[col].add(values.value_counts(), fill_value=0)
+        return self
+
+    def finalize(self):
+        if self.categorical:
+            self.encoder.fit_from_counts(self._counts)
+        self._counts = None
+        return self
+
+    def transform(self, X):
+        blocks = []
+        if self.numeric:
+            values = X[self.numeric].to_numpy(dtype=np.float64)
+            values = np.where(np.isnan(values), self.scaler.mean_, values)
+            blocks.append(sp.csr_matrix(self.scaler.transform(values)))
+        if self.categorical:
+            blocks.append(self.encoder.transform(X[self.categorical]))
+        return sp.hstack(blocks, format="csr")
+
+
+class IncrementalModel:
+    """Fitted streaming preprocessor + estimator, used like a pipeline on raw frames.
+
+    Classifiers are trained on label codes 0..k-1, so `classes_` are codes
+    (as for the modeling page's pipelines) and scoring decodes them.
+    """
+
+    def __init__(self, preprocessor, estimator, n_classes=None):
+        self.preprocessor = preprocessor
+        self.estimator = estimator
+        self.n_classes = n_classes
+        if n_classes is not None:
+            self.classes_ = np.arange(n_classes)
+            if hasattr(estimator, "predict_proba"):
+                self.predict_proba = self._predict_proba
+
+    def _features(self, X):
+        Xt = self.preprocessor.transform(X)
+        return Xt.toarray() if isinstance(self.estimator, DENSE_ONLY) else Xt
+
+    def predict(self, X):
+        return self.estimator.predict(self._features(X))
+
+    def _predict_proba(self, X):
+        return self.estimator.predict_proba(self._features(X))
+
+
+class _BoosterModel:
+    """predict / predict_proba over a trained xgboost Booster."""
+
+    def __init__(self, booster, n_classes=None):
+        self.booster = booster
+        self.n_classes = n_classes
+
+    def predict_proba(self, X):
+        p = self.booster.predict(xgb.DMatrix(X))
+        return np.column_stack([1 - p, p]) if p.ndim == 1 else p
+
+    def predict(self, X):
+        if self.n_classes is None:
+            return self.booster.predict(xgb.DMatrix(X))
+        return self.predict_proba(X).argmax(axis=1)
+
+
+def _holdout_mask(chunk_index, n, fraction, seed=0):
+    # The same rows of a chunk are held out in every pass and epoch
+    return np.random.default_rng([seed, chunk_index]).random(n) < fraction
+
+
+def _source_identity(source):
+    # A path is identified by its size and modification time, an uploaded
+    # file by its size and content digest
+    if isinstance(source, (str, Path)):
+        stat = Path(source).stat()
+        return {"path": str(Path(source).resolve()), "size": stat.st_size, "mtime": stat.st_mtime_ns}
+    digest, size = hashlib.sha1(), 0
+    source.seek(0)
+    while block := source.read(1 << 20):
+        block = block.encode() if isinstance(block, str) else block
+        digest.update(block)
+        size += len(block)
+    source.seek(0)
+    return {"name": getattr(source, "name", "upload"), "size": size, "sha1": digest.hexdigest()}
+
+
+def run_key(source, features, target, model_name, problem_type, settings):
+    """Identifies a training run, so a checkpoint is only resumed by the same run on the same file."""
+    payload = json.dumps({"source": _source_identity(source), "features": list(features), "target": target,
+                          "model": model_name, "problem_type": problem_type, "settings": settings},
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def _dump(path, obj):
+    tmp = Path(path).with_suffix(".tmp")
+    joblib.dump(obj, tmp)
+    tmp.replace(path)
+
+
+def _save_checkpoint(path, state):
+    _dump(path, {k: v for k, v in state.items() if k not in _SETUP_FIELDS})
+
+
+class _Stream:
+    """Chunks of (features, target) from a file, with target-less rows dropped."""
+
+    def __init__(self, source, feature_dtypes, target, chunk_rows, target_is_text):
+        self.source = source
+        self.feature_dtypes = feature_dtypes
+        self.target = target
+        self.chunk_rows = chunk_rows
+        self.categorical = [c for c, t in feature_dtypes.items() if t in ("object", "category")]
+        if target_is_text:
+            self.categorical.append(target)
+
+    def __iter__(self):
+        if hasattr(self.source, "seek"):
+            self.source.seek(0)
+        columns = list(dict.fromkeys(list(self.feature_dtypes) + [self.target]))
+        for chunk in read_chunks(self.source, columns, self.categorical, self.chunk_rows):
+            y = chunk[self.target]
+            if self.target not in self.categorical:
+                y = pd.to_numeric(y, errors="coerce")
+            keep = y.notna().to_numpy()
+            X = chunk.loc[keep, list(self.feature_dtypes)].copy()
+            for col in self.feature_dtypes:
+                if col not in self.categorical:
+                    X[col] = pd.to_numeric(X[col], errors="coerce")
+            yield X, y[keep]
+
+
+def train_incremental(source, features, target, model_name, problem_type, chunk_rows=SCORING_CHUNK_ROWS,
+                      holdout_fraction=0.1, epochs=1, min_frequency=1, resume=True, on_progress=None):
+    """Train `model_name` on a CSV/Parquet file that need not fit in memory.
+
+    Pass 1 streams the file once to fit the preprocessing (means, variances,
+    level counts), collect the label set and set aside a holdout sample
+    (`holdout_fraction` of every chunk, capped at MAX_HOLDOUT_ROWS). Pass 2
+    streams it `epochs` times through partial_fit on the remaining rows, or
+    builds an external-memory DMatrix for XGBoost. The holdout is scored
+    every EVAL_EVERY chunks, giving a learning curve while training runs.
+
+    The outcome of pass 1 (fitted preprocessing, label set, holdout) is
+    saved once, and a checkpoint (model, position, curve) every
+    CHECKPOINT_EVERY chunks; with `resume`, an interrupted run on the same
+    file with the same settings continues from its last checkpoint. `on_progress` is
+    called with (stage, rows_done, total_rows, elapsed_seconds).
+
+    Returns (model, feature_dtypes, classes, curve, summary): an
+    IncrementalModel, the training dtypes and label classes needed for
+    scoring, the learning curve DataFrame and a dict of final holdout
+    metrics and throughput.
+    """
+    started = time.perf_counter()
+    settings = {"chunk_rows": chunk_rows, "holdout": holdout_fraction, "epochs": epochs,
+                "min_frequency": min_frequency}
+    key = run_key(source, features, target, model_name, problem_type, settings)
+    setup, checkpoint = CHECKPOINT_DIR / f"{key}.setup.joblib", CHECKPOINT_DIR / f"{key}.joblib"
+    progress = on_progress or (lambda *args: None)
+
+    state = None
+    if resume and setup.exists() and checkpoint.exists():
+        state = {**joblib.load(setup), **joblib.load(checkpoint)}
+    if state is None:
+        feature_dtypes = infer_dtypes(source, features)
+        target_is_text = problem_type == "classification"
+        stream = _Stream(source, feature_dtypes, target, chunk_rows, target_is_text)
+
+        # Pass 1: preprocessing statistics, label set and holdout sample
+        preprocessor = StreamingPreprocessor(feature_dtypes, min_frequency)
+        labels, holdout_X, holdout_y = set(), [], []
+        total_rows = holdout_rows = 0
+        for i, (X, y) in enumerate(stream):
+            mask = _holdout_mask(i, len(X), holdout_fraction)
+            preprocessor.partial_fit(X[~mask])
+            if target_is_text:
+                labels.update(y.astype(str).unique())
+            if holdout_rows < MAX_HOLDOUT_ROWS and mask.any():
+                take = np.flatnonzero(mask)[:MAX_HOLDOUT_ROWS - holdout_rows]
+                holdout_X.append(X.iloc[take])
+                holdout_y.append(y.iloc[take])
+                holdout_rows += len(take)
+            total_rows += len(X)
+            progress("Scanning", total_rows, None, time.perf_counter() - started)
+        if not total_rows:
+            raise ValueError(f"No rows with a value for {target}")
+        preprocessor.finalize()
+
+        classes = sorted(labels) if target_is_text else None
+        state = {
+            "key": key, "feature_dtypes": feature_dtypes, "preprocessor": preprocessor,
+            "classes": classes, "total_rows": total_rows, "estimator": None,
+            "holdout_X": pd.concat(holdout_X) if holdout_X else None,
+            "holdout_y": pd.concat(holdout_y) if holdout_y else None,
+            "epoch": 0, "chunk": 0, "rows_trained": 0, "curve": [],
+        }
+        _dump(setup, {field: state[field] for field in _SETUP_FIELDS})
+        _save_checkpoint(checkpoint, state)
+
+    feature_dtypes, preprocessor, classes = state["feature_dtypes"], state["preprocessor"], state["classes"]
+    code_of = {label: code for code, label in enumerate(classes)} if classes else None
+
+    def encode_target(y):
+        if code_of is None:
+            return y.to_numpy(dtype=np.float64)
+        return y.astype(str).map(code_of).to_numpy(dtype=np.int64)
+
+    holdout = None
+    if state["holdout_X"] is not None:
+        holdout = (preprocessor.transform(state["holdout_X"]), encode_target(state["holdout_y"]))
+    stream = _Stream(source, feature_dtypes, target, chunk_rows, classes is not None)
+    n_classes = len(classes) if classes else None
+
+    def evaluate(estimator):
+        if holdout is None:
+            return None
+        X_hold = holdout[0].toarray() if isinstance(estimator, DENSE_ONLY) else holdout[0]
+        metrics = prediction_metrics(problem_type, holdout[1], estimator.predict(X_hold))
+        return metrics["Accuracy"] if problem_type == "classification" else metrics["R² Score"]
+
+    if model_name == XGB_EXTERNAL:
+        estimator = _train_xgb_external(stream, state, preprocessor, encode_target, evaluate, n_classes,
+                                        holdout_fraction, checkpoint, progress, started)
+    else:
+        estimator = state["estimator"] or INCREMENTAL_MODELS[problem_type][model_name]()
+        fit_kwargs = {"classes": np.arange(n_classes)} if n_classes else {}
+        total = state["total_rows"] * epochs
+        for epoch in range(state["epoch"], epochs):
+            for i, (X, y) in enumerate(stream):
+                if i < state["chunk"]:
+                    continue  # done before the checkpoint
+                mask = _holdout_mask(i, len(X), holdout_fraction)
+                if (~mask).any():
+                    Xt = preprocessor.transform(X[~mask])
+                    if isinstance(estimator, DENSE_ONLY):
+                        Xt = Xt.toarray()
+                    estimator.partial_fit(Xt, encode_target(y[~mask]), **fit_kwargs)
+                state["rows_trained"] += int((~mask).sum())
+                state["chunk"] = i + 1
+                done = epoch * state["total_rows"] + min(state["total_rows"], (i + 1) * chunk_rows)
+                if (i + 1) % EVAL_EVERY == 0:
+                    state["curve"].append({"epoch": epoch + 1, "rows_trained": state["rows_trained"],
+                                           "holdout_score": evaluate(estimator)})
+                if (i + 1) % CHECKPOINT_EVERY == 0:
+                    state["estimator"] = estimator
+                    _save_checkpoint(checkpoint, state)
+                progress("Training", done, total, time.perf_counter() - started)
+
+            if not state["curve"] or state["curve"][-1]["rows_trained"] != state["rows_trained"]:
+                state["curve"].append({"epoch": epoch + 1, "rows_trained": state["rows_trained"],
+                                       "holdout_score": evaluate(estimator)})
+            state.update(estimator=estimator, epoch=epoch + 1, chunk=0)
+            _save_checkpoint(checkpoint, state)
+
+    summary = {"rows": state["total_rows"], "rows_trained": state["rows_trained"],
+               "holdout_rows": 0 if holdout is None else len(holdout[1]),
+               "seconds": time.perf_counter() - started}
+    if holdout is not None:
+        X_hold = holdout[0].toarray() if isinstance(estimator, DENSE_ONLY) else holdout[0]
+        summary.update(prediction_metrics(problem_type, holdout[1], estimator.predict(X_hold)))
+    summary["rows_per_second"] = state["rows_trained"] / summary["seconds"] if summary["seconds"] else 0.0
+    # Finished: the next run with these settings starts fresh
+    setup.unlink(missing_ok=True)
+    checkpoint.unlink(missing_ok=True)
+
+    model = IncrementalModel(preprocessor, estimator, n_classes)
+    return model, feature_dtypes, classes, pd.DataFrame(state["curve"]), summary
+
+
+def _train_xgb_external(stream, state, preprocessor, encode_target, evaluate, n_classes,
+                        holdout_fraction, checkpoint, progress, started):
+    """Hist boosting over an external-memory DMatrix built from the stream."""
+
+    class ChunkIter(xgb.DataIter):
+        def __init__(self, cache_dir):
+            self._chunks = None
+            super().__init__(cache_prefix=str(Path(cache_dir) / "cache"))
+
+        def next(self, input_data):
+            if self._chunks is None:
+                self._chunks = enumerate(stream)
+            for i, (X, y) in self._chunks:
+                mask = _holdout_mask(i, len(X), holdout_fraction)
+                if (~mask).any():
+                    input_data(data=preprocessor.transform(X[~mask]), label=encode_target(y[~mask]))
+                    return 1
+            return 0
+
+        def reset(self):
+            self._chunks = None
+
+    class Progress(xgb.callback.TrainingCallback):
+        def after_iteration(self, model, epoch, evals_log):
+            # "epoch" counts the rounds of this call, not those of a resumed booster
+            rounds = done_rounds + epoch + 1
+            if rounds % EVAL_EVERY == 0:
+                state["curve"].append({"round": rounds, "rows_trained": state["rows_trained"],
+                                       "holdout_score": evaluate(_BoosterModel(model, n_classes))})
+            if rounds % CHECKPOINT_EVERY == 0:
+                state["booster"] = model.save_raw()
+                _save_checkpoint(checkpoint, state)
+            progress("Boosting", rounds, XGB_ROUNDS, time.perf_counter() - started)
+            return False
+
+    if n_classes is None:
+        params = {"objective": "reg:squarederror"}
+    elif n_classes == 2:
+        params = {"objective": "binary:logistic"}
+    else:
+        params = {"objective": "multi:softprob", "num_class": n_classes}
+    params["tree_method"] = "hist"
+
+    previous = xgb.Booster(model_file=bytearray(state["booster"])) if state.get("booster") else None
+    done_rounds = previous.num_boosted_rounds() if previous is not None else 0
+    with tempfile.TemporaryDirectory(prefix="xgb_extmem_", dir=CHECKPOINT_DIR) as cache_dir:
+        dtrain = xgb.DMatrix(ChunkIter(cache_dir))
+        try:
+            state["rows_trained"] = dtrain.num_row()
+            booster = xgb.train(params, dtrain, num_boost_round=XGB_ROUNDS - done_rounds,
+                                xgb_model=previous, callbacks=[Progress()])
+        except BaseException as exc:
+            # A cancelled job's traceback would keep xgb.train's frame, and dtrain, alive
+            traceback.clear_frames(exc.__traceback__.tb_next)
+            raise
+        finally:
+            # Release the cache pages before their directory is removed
+            del dtrain
+    return _BoosterModel(booster, n_classes)
@@ -0,0 +1,381 @@
+"""Local HTTP inference server for models trained on the modeling page.
+
+    python inference_server.py serve --model <registry key>
+    python inference_server.py serve --bundle artifacts/exports/best_model.joblib
+    python inference_server.py loadtest --data new_records.csv --concurrency 16
+
+Endpoints (JSON):
+    POST /predict   {"records": [{feature: value, ...}, ...]}
+    POST /model     {"model": "<registry key>"} or {"bundle": "<path under artifacts/exports>"}  (hot swap)
+    GET  /metrics   latency percentiles, batch sizes, throughput
+    GET  /health
+"""
+import argparse
+import json
+import queue
+import re
+import threading
+import time
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from artifacts import EXPORT_DIR, load_bundle
+from scoring import input_columns, read_chunks, score_chunk
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Micro-batching: a batch is scored once it holds MAX_BATCH_ROWS rows or its
+# first request has waited MAX_WAIT_MS, whichever comes first
+MAX_BATCH_ROWS = 512
+MAX_WAIT_MS = 5
+
+# A request waiting longer than this for its batch gets an error
+REQUEST_TIMEOUT_S = 30
+
+# Latencies kept for percentiles, and the window used for throughput
+METRICS_WINDOW = 10_000
+THROUGHPUT_WINDOW_S = 60
+
+
+class ServerMetrics:
+    """Thread-safe request latency, batch size and throughput counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.errors = 0
+        self._latencies = deque(maxlen=METRICS_WINDOW)
+        self._batch_rows = deque(maxlen=METRICS_WINDOW)
+        self._completed = deque()
+
+    def record_batch(self, rows):
+        with self._lock:
+            self.batches += 1
+            self._batch_rows.append(rows)
+
+    def record_request(self, rows, latency_s, ok=True):
+        now = time.time()
+        with self._lock:
+            self.requests += 1
+            if not ok:
+                self.errors += 1
+                return
+            self.rows += rows
+            self._latencies.append(latency_s * 1000)
+            self._completed.append((now, rows))
+            while self._completed and self._completed[0][0] < now - THROUGHPUT_WINDOW_S:
+                self._completed.popleft()
+
+    def snapshot(self):
+        with self._lock:
+            latencies = np.array(self._latencies) if self._latencies else np.zeros(1)
+            window = min(THROUGHPUT_WINDOW_S, max(time.time() - self.started, 1e-9))
+            recent = list(self._completed)
+            return {
+                "uptime_s": round(time.time() - self.started, 1),
+                "requests": self.requests,
+                "rows": self.rows,
+                "errors": self.errors,
+                "batches": self.batches,
+                "mean_batch_rows": round(float(np.mean(self._batch_rows)), 2) if self._batch_rows else 0.0,
+                "latency_ms": {f"p{q}": round(float(np.percentile(latencies, q)), 3) for q in (50, 95, 99)},
+                "requests_per_s": round(len(recent) / window, 2),
+                "rows_per_s": round(sum(rows for _, rows in recent) / window, 2),
+            }
+
+
+class _Request:
+    def __init__(self, records):
+        self.records = records
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Coalesces concurrent requests into one vectorized predict/predict_proba call.
+
+    A single worker thread takes the first queued request, keeps collecting
+    for up to MAX_WAIT_MS (or until MAX_BATCH_ROWS rows), scores all rows as
+    one frame and hands each request its slice. swap() replaces the model
+    between batches; a batch in flight finishes with the model it started on.
+    """
+
+    def __init__(self, bundle, max_batch_rows=MAX_BATCH_ROWS, max_wait_ms=MAX_WAIT_MS):
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self.metrics = ServerMetrics()
+        self._bundle = bundle
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name="micro-batcher", daemon=True).start()
+
+    @property
+    def bundle(self):
+        with self._lock:
+            return self._bundle
+
+    def swap(self, bundle):
+        with self._lock:
+            self._bundle = bundle
+
+    def predict(self, records):
+        """Score `records` (list of dicts) with the current model; blocks until done."""
+        features = set(self.bundle["feature_dtypes"])
+        for i, record in enumerate(records):
+            missing = features - record.keys()
+            if missing:
+                raise ValueError(f"Record {i} is missing features: {', '.join(sorted(missing))}")
+        started = time.perf_counter()
+        request = _Request(records)
+        self._queue.put(request)
+        if not request.done.wait(REQUEST_TIMEOUT_S):
+            request.error = "Timed out waiting for the model"
+        self.metrics.record_request(len(records), time.perf_counter() - started, request.error is None)
+        if request.error:
+            raise RuntimeError(request.error)
+        return request.result
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            rows = len(batch[0].records)
+            deadline = time.perf_counter() + self.max_wait
+            while rows < self.max_batch_rows:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                rows += len(request.records)
+            self._score(batch, rows)
+
+    def _score(self, batch, rows):
+        bundle = self.bundle
+        try:
+            self._score_batch(bundle, batch)
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].error = str(e)
+            else:
+                # Find the request(s) that broke the batch; the others still succeed
+                for request in batch:
+                    try:
+                        self._score_batch(bundle, [request])
+                    except Exception as e:
+                        request.error = str(e)
+        finally:
+            self.metrics.record_batch(rows)
+            for request in batch:
+                request.done.set()
+
+    @staticmethod
+    def _score_batch(bundle, batch):
+        frame = pd.DataFrame([record for request in batch for record in request.records])
+        scored = score_chunk(bundle["model"], frame, bundle["feature_dtypes"], bundle.get("classes"))
+        records = scored.to_dict("records")
+        offset = 0
+        for request in batch:
+            request.result = records[offset:offset + len(request.records)]
+            offset += len(request.records)
+
+
+def _swap_bundle(payload):
+    """Bundle named by a POST /model payload.
+
+    Bundles are pickles, so only registry keys and files under EXPORT_DIR
+    are loaded; any other path is refused.
+    """
+    key, path = payload.get("model"), payload.get("bundle")
+    if path is not None:
+        path = Path(str(path)).resolve()
+        if EXPORT_DIR.resolve() not in path.parents:
+            raise PermissionError(f"Only bundles exported to {EXPORT_DIR} can be loaded")
+        return load_bundle(path=path)
+    if not isinstance(key, str) or not re.fullmatch(r"[0-9a-f]+", key):
+        raise ValueError("Expected {\"model\": \"<registry key>\"} or {\"bundle\": \"<path>\"}")
+    return load_bundle(key=key)
+
+
+def _handler(batcher):
+    class InferenceHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            body = json.dumps(payload, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"status": "ok", "model": batcher.bundle["name"]})
+            elif self.path == "/metrics":
+                self._reply(200, {"model": batcher.bundle["name"], **batcher.metrics.snapshot()})
+            else:
+                self._reply(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            try:
+                payload = self._body()
+            except ValueError:
+                self._reply(400, {"error": "Body must be JSON"})
+                return
+            if not isinstance(payload, dict):
+                self._reply(400, {"error": "Body must be a JSON object"})
+                return
+
+            if self.path == "/predict":
+                records = payload.get("records")
+                if not isinstance(records, list) or not records:
+                    self._reply(400, {"error": "Expected {\"records\": [...]} with at least one record"})
+                    return
+                if not all(isinstance(record, dict) for record in records):
+                    self._reply(400, {"error": "Every record must be a JSON object of feature values"})
+                    return
+                try:
+                    self._reply(200, {"model": batcher.bundle["name"], "predictions": batcher.predict(records)})
+                except ValueError as e:
+                    self._reply(400, {"error": str(e)})
+                except RuntimeError as e:
+                    self._reply(500, {"error": str(e)})
+            elif self.path == "/model":
+                try:
+                    # Loaded before swapping, so requests never wait on disk I/O
+                    bundle = _swap_bundle(payload)
+                except PermissionError as e:
+                    self._reply(403, {"error": str(e)})
+                    return
+                except Exception as e:
+                    self._reply(400, {"error": f"Cannot load model: {e}"})
+                    return
+                batcher.swap(bundle)
+                self._reply(200, {"model": bundle["name"]})
+            else:
+                self._reply(404, {"error": f"Unknown path {self.path}"})
+
+        def log_message(self, format, *args):
+            # Per-request access logs would dominate the cost of small requests
+            pass
+
+    return InferenceHandler
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Bursts of concurrent clients would otherwise overflow the default backlog of 5
+    request_queue_size = 128
+
+
+def serve(bundle, host=DEFAULT_HOST, port=DEFAULT_PORT, max_batch_rows=MAX_BATCH_ROWS, max_wait_ms=MAX_WAIT_MS):
+    """Run the inference server until interrupted."""
+    batcher = MicroBatcher(bundle, max_batch_rows, max_wait_ms)
+    server = _Server((host, port), _handler(batcher))
+    print(f"Serving {bundle['name']} on http://{host}:{port} (batches up to {max_batch_rows} rows / {max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def load_test(url, records, n_requests=2000, concurrency=16, rows_per_request=1):
+    """Fire `n_requests` POST /predict calls from `concurrency` threads; client-side latency stats.
+
+    Requests cycle through `records` (list of dicts), `rows_per_request` at
+    a time. Returns requests, errors, seconds, requests_per_s and
+    p50/p95/p99 latency in milliseconds.
+    """
+    endpoint = url.rstrip("/") + "/predict"
+    payloads = [json.dumps({"records": records[i:i + rows_per_request]}, default=str).encode()
+                for i in range(0, max(len(records) - rows_per_request + 1, 1), rows_per_request)]
+    latencies, errors = [], []
+    counter = iter(range(n_requests))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            request = urllib.request.Request(endpoint, data=payloads[i % len(payloads)],
+                                             headers={"Content-Type": "application/json"})
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT_S) as response:
+                    response.read()
+                latencies.append((time.perf_counter() - started) * 1000)
+            except Exception as e:
+                errors.append(str(e))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    latencies = np.array(latencies) if latencies else np.full(1, np.nan)
+    return {
+        "requests": n_requests,
+        "errors": len(errors),
+        "seconds": round(seconds, 3),
+        "requests_per_s": round(n_requests / seconds, 1),
+        **{f"p{q}_ms": round(float(np.percentile(latencies, q)), 3) for q in (50, 95, 99)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_cmd = commands.add_parser("serve", help="Run the inference server")
+    source = serve_cmd.add_mutually_exclusive_group(required=True)
+    source.add_argument("--model", help="Registry key of a stored run")
+    source.add_argument("--bundle", help="Model exported from the modeling page")
+    serve_cmd.add_argument("--host", default=DEFAULT_HOST)
+    serve_cmd.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_cmd.add_argument("--max-batch-rows", type=int, default=MAX_BATCH_ROWS)
+    serve_cmd.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+
+    test_cmd = commands.add_parser("loadtest", help="Measure latency against a running server")
+    test_cmd.add_argument("--data", required=True, help="CSV or Parquet file with feature columns")
+    test_cmd.add_argument("--url", default=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+    test_cmd.add_argument("--requests", type=int, default=2000)
+    test_cmd.add_argument("--concurrency", type=int, default=16)
+    test_cmd.add_argument("--rows-per-request", type=int, default=1)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(load_bundle(key=args.model, path=args.bundle), args.host, args.port,
+              args.max_batch_rows, args.max_wait_ms)
+    else:
+        with urllib.request.urlopen(args.url.rstrip("/") + "/health") as response:
+            print(f"Model: {json.loads(response.read())['model']}")
+        sample = next(read_chunks(args.data, input_columns(args.data), chunk_rows=max(1000, args.rows_per_request)))
+        records = json.loads(sample.to_json(orient="records"))
+        print(json.dumps(load_test(args.url, records, args.requests, args.concurrency, args.rows_per_request),
+                         indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import json
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+
+import joblib
+import pandas as pd
+import streamlit as st
+
+from artifacts import private_dir
+from training import get_training_pool
+
+# Long-running work (training, searches, survival fits, reports) runs on
+# this many background threads of the server process; heavy jobs fan out
+# further on the training process pool
+JOB_WORKERS = 2
+
+# Job status (JSON) and results (joblib) outlive the session that started
+# them; only the newest MAX_STORED_JOBS are kept
+JOB_DIR = private_dir("jobs")
+MAX_STORED_JOBS = 50
+
+# Results held in memory after first use, so reruns don't reload them from disk
+RESULT_CACHE_SIZE = 8
+
+# Seconds between status refreshes of a page waiting on a job
+JOB_POLL_SECONDS = 1.0
+
+ACTIVE_STATES = ("queued", "running")
+
+_STATUS_FIELDS = ("id", "kind", "label", "state", "progress", "message", "error",
+                  "created", "started", "finished")
+
+
+class JobCancelled(Exception):
+    """Raised inside a job by Job.update once cancellation was requested."""
+
+
+class Job:
+    """Handle passed to a job function for progress reports and cancellation."""
+
+    def __init__(self, kind, label):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.label = label
+        self.state = "queued"
+        self.progress = None
+        self.message = ""
+        self.error = None
+        self.created = datetime.now().isoformat(timespec="seconds")
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def update(self, fraction=None, message=None):
+        """Report progress (`fraction` in [0, 1]); raises JobCancelled if the job was cancelled.
+
+        Every call is a cancellation point, so job functions should report
+        between units of work.
+        """
+        if fraction is not None:
+            self.progress = min(max(float(fraction), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+        if self.cancelled:
+            raise JobCancelled()
+
+    def status(self):
+        return {field: getattr(self, field) for field in _STATUS_FIELDS}
+
+
+_lock = threading.Lock()
+_jobs = {}
+_results = OrderedDict()
+_executor = None
+
+
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+        return _executor
+
+
+def _paths(job_id):
+    return JOB_DIR / f"{job_id}.json", JOB_DIR / f"{job_id}.joblib"
+
+
+def _write_status(job):
+    meta, _ = _paths(job.id)
+    tmp = meta.with_suffix(".tmp")
+    tmp.write_text(json.dumps(job.status(), default=str), encoding="utf-8")
+    tmp.replace(meta)
+
+
+def _prune():
+    stored = sorted(JOB_DIR.glob("*.json"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for meta in stored[MAX_STORED_JOBS:]:
+        job = _jobs.get(meta.stem)
+        if job is not None and job.state in ACTIVE_STATES:
+            continue
+        for path in _paths(meta.stem):
+            path.unlink(missing_ok=True)
+        _jobs.pop(meta.stem, None)
+        _results.pop(meta.stem, None)
+
+
+def _run(job, func, args, kwargs):
+    if job.cancelled:
+        return
+    job.state, job.started = "running", datetime.now().isoformat(timespec="seconds")
+    _write_status(job)
+    try:
+        result = func(job, *args, **kwargs)
+        _, blob = _paths(job.id)
+        joblib.dump(result, blob)
+        with _lock:
+            _results[job.id] = result
+            while len(_results) > RESULT_CACHE_SIZE:
+                _results.popitem(last=False)
+        job.state, job.progress = "done", 1.0
+    except JobCancelled:
+        job.state = "cancelled"
+    except Exception as e:
+        job.state, job.error = "failed", f"{e}\n{traceback.format_exc(limit=5)}"
+    job.finished = datetime.now().isoformat(timespec="seconds")
+    _write_status(job)
+
+
+def submit(kind, func, *args, label="", **kwargs):
+    """Queue `func(job, *args, **kwargs)` on the background workers; returns the job id.
+
+    `func` runs outside any Streamlit script run, so it must not call st.*;
+    it reports through `job` (see Job.update) and returns a picklable
+    result, which is written to JOB_DIR and read back with job_result().
+    """
+    job = Job(kind, label)
+    with _lock:
+        _jobs[job.id] = job
+    _write_status(job)
+    _prune()
+    _pool().submit(_run, job, func, args, kwargs)
+    return job.id
+
+
+def run_on_pool(job, func, *args, **kwargs):
+    """Run `func(*args, **kwargs)` on the training process pool and return its result.
+
+    For CPU-bound steps of a job, which would otherwise hold the server's
+    GIL against every session's script runs. `func` and its arguments must
+    be picklable. The wait is a cancellation point (see Job.update); a
+    cancelled task that already started finishes in its worker, and its
+    result is dropped.
+    """
+    future = get_training_pool().submit(func, *args, **kwargs)
+    try:
+        while True:
+            try:
+                return future.result(timeout=JOB_POLL_SECONDS)
+            except FutureTimeout:
+                job.update()
+    finally:
+        future.cancel()
+
+
+def get_job(job_id):
+    """Status dict of a job, or None if unknown.
+
+    Jobs of an earlier server process are read from JOB_DIR; one that was
+    still queued or running when that process stopped is reported as
+    'interrupted'.
+    """
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job.status()
+    meta, _ = _paths(job_id)
+    try:
+        status = json.loads(meta.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if status["state"] in ACTIVE_STATES:
+        status["state"] = "interrupted"
+    return status
+
+
+def job_result(job_id):
+    """Return value of a finished job (loaded from disk if not in memory)."""
+    with _lock:
+        if job_id in _results:
+            _results.move_to_end(job_id)
+            return _results[job_id]
+    _, blob = _paths(job_id)
+    result = joblib.load(blob)
+    with _lock:
+        _results[job_id] = result
+        while len(_results) > RESULT_CACHE_SIZE:
+            _results.popitem(last=False)
+    return result
+
+
+def cancel_job(job_id):
+    """Request cancellation: a queued job never starts, a running one stops at its next update()."""
+    job = _jobs.get(job_id)
+    if job is not None and job.state in ACTIVE_STATES:
+        job._cancel.set()
+        if job.state == "queued":
+            job.state, job.finished = "cancelled", datetime.now().isoformat(timespec="seconds")
+            _write_status(job)
+
+
+def list_jobs(job_ids=None):
+    """Status of the given jobs (all stored jobs when None), newest first, as a DataFrame."""
+    if job_ids is None:
+        job_ids = {meta.stem for meta in JOB_DIR.glob("*.json")} | set(_jobs)
+    statuses = [status for status in map(get_job, job_ids) if status is not None]
+    if not statuses:
+        return pd.DataFrame(columns=list(_STATUS_FIELDS))
+    return pd.DataFrame(statuses).sort_values("created", ascending=False, ignore_index=True)
+
+
+# -------------------------
+# Streamlit helpers
+# -------------------------
+def start_job(session_key, kind, func, *args, label="", **kwargs):
+    """submit() and remember the job under st.session_state[session_key] (and in this session's job list)."""
+    job_id = submit(kind, func, *args, label=label, **kwargs)
+    st.session_state[session_key] = job_id
+    st.session_state.setdefault("job_ids", []).append(job_id)
+    return job_id
+
+
+def job_active(session_key):
+    """Whether the job stored under `session_key` is still queued or running."""
+    job_id = st.session_state.get(session_key)
+    status = get_job(job_id) if job_id else None
+    return status is not None and status["state"] in ACTIVE_STATES
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _poll(job_id):
+    status = get_job(job_id)
+    if status is None or status["state"] not in ACTIVE_STATES:
+        # Rerun the whole page so it can render the result
+        st.rerun(scope="app")
+    started = status["started"] or status["created"]
+    elapsed = time.time() - datetime.fromisoformat(started).timestamp()
+    text = f"{status['label']}: {status['state']}" + (f" · {status['message']}" if status["message"] else "")
+    st.progress(status["progress"] or 0.0, text=f"{text} ({elapsed:.0f}s)")
+    if st.button("⏹️ Cancel", key=f"cancel_{job_id}"):
+        cancel_job(job_id)
+    st.caption("Runs in the background: you can keep using this and other pages.")
+
+
+def job_status(session_key):
+    """Show progress of the job stored under `session_key` and return its status (None if no job).
+
+    While the job is active the progress bar refreshes on its own every
+    JOB_POLL_SECONDS, and the page reruns once the job finishes; a failed,
+    cancelled or interrupted job is reported here.
+    """
+    job_id = st.session_state.get(session_key)
+    status = get_job(job_id) if job_id else None
+    if status is None:
+        return None
+    if status["state"] in ACTIVE_STATES:
+        _poll(job_id)
+    elif status["state"] == "failed":
+        st.error(f"❌ {status['label']} failed: {status['error'].splitlines()[0]}")
+    elif status["state"] in ("cancelled", "interrupted"):
+        st.warning(f"⏹️ {status['label']} was {status['state']}")
+    return status
+
+
+def jobs_panel():
+    """Expander listing this session's background jobs."""
+    job_ids = st.session_state.get("job_ids", [])
+    with st.expander(f"🧵 Background Jobs ({len(job_ids)})"):
+        if not job_ids:
+            st.caption("No background jobs in this session")
+            return
+        jobs = list_jobs(job_ids)
+        st.dataframe(jobs[["label", "state", "progress", "message", "created", "finished"]],
+                     use_container_width=True, hide_index=True)
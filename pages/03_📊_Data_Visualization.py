@@ -1,13 +1,29 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
+import json
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
 from chatbot import chatbot_sidebar
+from kde import evaluate_kde, violin_figure
+from correlation import cached_correlation, clustered_heatmap, top_k_pairs, KENDALL_MAX_ROWS
+from time_buckets import TIME_UNITS
+from time_cube import get_time_cube
+from dataset_version import dataset_fingerprint
+from screening import cached_screen, forest_figure, CORRECTIONS
+from figure_cache import cached_figure, cache_report
+from render_metrics import render_chart, perf_mark, performance_panel
+from jobs import jobs_panel
+from geo import (available_boundaries, load_boundaries, simplified_boundaries, key_properties,
+                 best_key_property, region_index, aggregate_by_region, join_regions,
+                 choropleth_figure, DETAIL_LEVELS)
+from demography import (build_pyramid, pyramid_figure, direct_standardize, indirect_standardize,
+                         age_band_labels, STANDARD_AGE_EDGES, STANDARD_POPULATIONS)
+
+# Largest matrix whose heatmap cells get value annotations
+MAX_ANNOTATED_VARIABLES = 30
 
 st.session_state["page_name"] = "Data Visualization"
 
@@ -18,6 +34,7 @@ if "dataset" not in st.session_state:
     st.stop()
 
 df = st.session_state["dataset"]
+perf_mark()
 
 # Dataset info
 col1, col2, col3, col4 = st.columns(4)
@@ -34,17 +51,9 @@ with col4:
 
 st.markdown("---")
 
-# Tabs for different visualizations
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-    "📈 Distribution",
-    "🔗 Relationships", 
-    "📊 Comparisons",
-    "🌡️ Heatmaps",
-    "📉 Advanced",
-    "🏥 Epidemiological"
-])
-
-with tab1:
+
+def distribution_tab():
+    perf_mark()
     st.subheader("📈 Distribution Analysis")
     
     if num_cols:
@@ -56,37 +65,43 @@ with tab1:
         
         if viz_type == "Histogram":
             bins = st.slider("Number of bins:", 10, 100, 30)
-            fig = px.histogram(df, x=col, nbins=bins, 
-                              title=f"Distribution of {col}",
-                              marginal="box")
-            fig.update_layout(showlegend=False)
-            st.plotly_chart(fig, use_container_width=True)
+            def build_histogram():
+                fig = px.histogram(df, x=col, nbins=bins, 
+                                  title=f"Distribution of {col}",
+                                  marginal="box")
+                fig.update_layout(showlegend=False)
+                return fig
+            fig = cached_figure(df, "histogram", dict(col=col, bins=bins), build_histogram)
+            render_chart(fig, rows=len(df))
             
         elif viz_type == "Box Plot":
-            fig = px.box(df, y=col, title=f"Box Plot of {col}",
-                        points="outliers")
-            st.plotly_chart(fig, use_container_width=True)
+            fig = cached_figure(df, "box", dict(col=col),
+                                lambda: px.box(df, y=col, title=f"Box Plot of {col}",
+                                               points="outliers"))
+            render_chart(fig, rows=len(df))
             
         elif viz_type == "Violin Plot":
-            fig = px.violin(df, y=col, box=True, title=f"Violin Plot of {col}")
-            st.plotly_chart(fig, use_container_width=True)
+            fig = cached_figure(df, "violin", dict(col=col),
+                                lambda: violin_figure(df, y=col, title=f"Violin Plot of {col}"))
+            render_chart(fig, rows=len(df))
             
         elif viz_type == "Distribution Curve":
             fig = go.Figure()
             fig.add_trace(go.Histogram(x=df[col], name="Histogram", 
                                        opacity=0.7, histnorm='probability density'))
             
-            # Add KDE line
-            from scipy import stats
-            kde = stats.gaussian_kde(df[col].dropna())
-            x_range = np.linspace(df[col].min(), df[col].max(), 100)
-            fig.add_trace(go.Scatter(x=x_range, y=kde(x_range), 
-                                    mode='lines', name='KDE', 
-                                    line=dict(width=3)))
+            # Add KDE line (binned FFT estimate, matches gaussian_kde)
+            try:
+                x_range = np.linspace(df[col].min(), df[col].max(), 200)
+                fig.add_trace(go.Scatter(x=x_range, y=evaluate_kde(df[col].dropna(), x_range), 
+                                        mode='lines', name='KDE', 
+                                        line=dict(width=3)))
+            except ValueError as e:
+                st.warning(f"⚠️ KDE not available: {str(e)}")
             
             fig.update_layout(title=f"Distribution of {col}", 
                             xaxis_title=col, yaxis_title="Density")
-            st.plotly_chart(fig, use_container_width=True)
+            render_chart(fig, rows=len(df))
         
         # Statistics
         with st.expander("📊 Statistics"):
@@ -95,7 +110,9 @@ with tab1:
     else:
         st.info("No numeric columns available")
 
-with tab2:
+
+def relationships_tab():
+    perf_mark()
     st.subheader("🔗 Relationship Analysis")
     
     if len(num_cols) >= 2:
@@ -115,21 +132,24 @@ with tab2:
         plot_type = st.radio("Plot type:", ["Scatter", "Line", "Scatter + Trend"], horizontal=True)
         
         if plot_type == "Scatter":
-            fig = px.scatter(df, x=x_col, y=y_col, color=color_col, size=size_col,
-                           title=f"{y_col} vs {x_col}",
-                           hover_data=df.columns[:5])
-            st.plotly_chart(fig, use_container_width=True)
+            fig = cached_figure(df, "scatter", dict(x=x_col, y=y_col, color=color_col, size=size_col),
+                                lambda: px.scatter(df, x=x_col, y=y_col, color=color_col, size=size_col,
+                                                   title=f"{y_col} vs {x_col}",
+                                                   hover_data=df.columns[:5]))
+            render_chart(fig, rows=len(df))
             
         elif plot_type == "Line":
-            fig = px.line(df, x=x_col, y=y_col, color=color_col,
-                         title=f"{y_col} vs {x_col}")
-            st.plotly_chart(fig, use_container_width=True)
+            fig = cached_figure(df, "line", dict(x=x_col, y=y_col, color=color_col),
+                                lambda: px.line(df, x=x_col, y=y_col, color=color_col,
+                                                title=f"{y_col} vs {x_col}"))
+            render_chart(fig, rows=len(df))
             
         elif plot_type == "Scatter + Trend":
-            fig = px.scatter(df, x=x_col, y=y_col, color=color_col,
-                           trendline="ols", 
-                           title=f"{y_col} vs {x_col} (with trend)")
-            st.plotly_chart(fig, use_container_width=True)
+            fig = cached_figure(df, "scatter_trend", dict(x=x_col, y=y_col, color=color_col),
+                                lambda: px.scatter(df, x=x_col, y=y_col, color=color_col,
+                                                   trendline="ols", 
+                                                   title=f"{y_col} vs {x_col} (with trend)"))
+            render_chart(fig, rows=len(df))
             
             # Show correlation
             corr = df[[x_col, y_col]].corr().iloc[0, 1]
@@ -137,7 +157,9 @@ with tab2:
     else:
         st.info("Need at least 2 numeric columns for relationship analysis")
 
-with tab3:
+
+def comparisons_tab():
+    perf_mark()
     st.subheader("📊 Comparison Analysis")
     
     if cat_cols and num_cols:
@@ -162,18 +184,20 @@ with tab3:
                 fig = px.bar(agg_df, x=cat_col, y=num_col,
                            title=f"{agg_func.title()} of {num_col} by {cat_col}")
             
-            st.plotly_chart(fig, use_container_width=True)
+            render_chart(fig, rows=len(df))
             
         elif plot_type == "Box Plot by Category":
-            fig = px.box(df, x=cat_col, y=num_col, 
-                        title=f"{num_col} distribution by {cat_col}",
-                        points="outliers")
-            st.plotly_chart(fig, use_container_width=True)
+            fig = cached_figure(df, "box_by", dict(cat=cat_col, num=num_col),
+                                lambda: px.box(df, x=cat_col, y=num_col, 
+                                               title=f"{num_col} distribution by {cat_col}",
+                                               points="outliers"))
+            render_chart(fig, rows=len(df))
             
         elif plot_type == "Violin Plot by Category":
-            fig = px.violin(df, x=cat_col, y=num_col, box=True,
-                          title=f"{num_col} distribution by {cat_col}")
-            st.plotly_chart(fig, use_container_width=True)
+            fig = cached_figure(df, "violin_by", dict(cat=cat_col, num=num_col),
+                                lambda: violin_figure(df, y=num_col, x=cat_col,
+                                                      title=f"{num_col} distribution by {cat_col}"))
+            render_chart(fig, rows=len(df))
     
     elif cat_cols:
         st.markdown("#### Categorical Distribution")
@@ -187,52 +211,66 @@ with tab3:
             fig = px.bar(x=value_counts.index, y=value_counts.values,
                         labels={'x': cat_col, 'y': 'Count'},
                         title=f"Distribution of {cat_col}")
-            st.plotly_chart(fig, use_container_width=True)
+            render_chart(fig, rows=len(df))
         else:
             fig = px.pie(values=value_counts.values, names=value_counts.index,
                         title=f"Distribution of {cat_col}")
-            st.plotly_chart(fig, use_container_width=True)
+            render_chart(fig, rows=len(df))
     else:
         st.info("Need categorical and numeric columns for comparison")
 
-with tab4:
+
+def heatmaps_tab():
+    perf_mark()
     st.subheader("🌡️ Correlation Analysis")
     
-    if len(num_cols) > 1:
-        # Correlation matrix
-        corr_matrix = df[num_cols].corr()
+    corr_type = st.radio("Variables:", ["Numeric", "Categorical (Cramér's V)"],
+                        horizontal=True, key="corr_type")
+    
+    if corr_type == "Numeric":
+        method = st.radio("Method:", ["Pearson", "Spearman", "Kendall"],
+                         horizontal=True, key="corr_method")
+        corr_cols = num_cols
+        corr_method = method.lower()
+        if corr_method == "kendall" and len(df) > KENDALL_MAX_ROWS:
+            st.caption(f"Kendall's tau is estimated on a sample of {KENDALL_MAX_ROWS:,} rows")
+    else:
+        corr_cols = cat_cols
+        corr_method = "cramers_v"
+    
+    if len(corr_cols) > 1:
+        # Correlation matrix (cached per dataset version)
+        corr_matrix = cached_correlation(df, corr_cols, corr_method)
         
         viz_type = st.radio("Visualization:", ["Heatmap", "Clustermap"], horizontal=True)
         
+        # Cell annotations are only readable on small matrices
+        annotate = len(corr_cols) <= MAX_ANNOTATED_VARIABLES
+        
         if viz_type == "Heatmap":
             fig = px.imshow(corr_matrix, 
-                          text_auto='.2f',
+                          text_auto='.2f' if annotate else False,
                           aspect="auto",
                           color_continuous_scale='RdBu_r',
                           title="Correlation Heatmap")
-            st.plotly_chart(fig, use_container_width=True)
+            render_chart(fig, rows=len(df))
         else:
-            fig, ax = plt.subplots(figsize=(10, 8))
-            sns.clustermap(corr_matrix, annot=True, cmap="coolwarm", center=0,
-                          fmt='.2f', linewidths=0.5)
-            st.pyplot(plt.gcf())
+            # Linkage is cached per correlation matrix
+            fig = clustered_heatmap(corr_matrix, annotate=annotate)
+            render_chart(fig, rows=len(df))
         
         # Top correlations
         st.markdown("#### 🔝 Top Correlations")
         
-        # Get upper triangle of correlation matrix
-        mask = np.triu(np.ones_like(corr_matrix, dtype=bool), k=1)
-        corr_pairs = corr_matrix.where(mask).stack().reset_index()
-        corr_pairs.columns = ['Variable 1', 'Variable 2', 'Correlation']
-        corr_pairs['Abs Correlation'] = corr_pairs['Correlation'].abs()
-        corr_pairs = corr_pairs.sort_values('Abs Correlation', ascending=False).head(10)
+        corr_pairs = top_k_pairs(corr_matrix, k=10)
         
-        st.dataframe(corr_pairs[['Variable 1', 'Variable 2', 'Correlation']], 
-                    use_container_width=True)
+        st.dataframe(corr_pairs, use_container_width=True)
     else:
-        st.info("Need at least 2 numeric columns for correlation analysis")
+        st.info("Need at least 2 columns of the selected type for correlation analysis")
+
 
-with tab5:
+def advanced_tab():
+    perf_mark()
     st.subheader("📉 Advanced Visualizations")
     
     viz_choice = st.selectbox("Select visualization:", 
@@ -248,10 +286,14 @@ with tab5:
                 
                 if st.button("Generate Pair Plot"):
                     with st.spinner("Creating pair plot..."):
-                        fig = px.scatter_matrix(df, dimensions=cols_to_plot, color=color_by,
-                                              title="Pair Plot")
-                        fig.update_traces(diagonal_visible=False)
-                        st.plotly_chart(fig, use_container_width=True)
+                        def build_pair_plot():
+                            fig = px.scatter_matrix(df, dimensions=cols_to_plot, color=color_by,
+                                                  title="Pair Plot")
+                            fig.update_traces(diagonal_visible=False)
+                            return fig
+                        fig = cached_figure(df, "scatter_matrix", dict(cols=cols_to_plot, color=color_by),
+                                            build_pair_plot)
+                        render_chart(fig, rows=len(df))
             else:
                 st.warning("Please select 2-5 columns")
         else:
@@ -269,9 +311,10 @@ with tab5:
             
             color_by = st.selectbox("Color by:", [None] + cat_cols + num_cols, key="3d_color")
             
-            fig = px.scatter_3d(df, x=x_col, y=y_col, z=z_col, color=color_by,
-                              title="3D Scatter Plot")
-            st.plotly_chart(fig, use_container_width=True)
+            fig = cached_figure(df, "scatter_3d", dict(x=x_col, y=y_col, z=z_col, color=color_by),
+                                lambda: px.scatter_3d(df, x=x_col, y=y_col, z=z_col, color=color_by,
+                                                      title="3D Scatter Plot"))
+            render_chart(fig, rows=len(df))
         else:
             st.info("Need at least 3 numeric columns for 3D scatter")
     
@@ -283,10 +326,11 @@ with tab5:
             color_by = st.selectbox("Color by:", cat_cols + num_cols, key="parallel_color")
             
             if len(cols_to_plot) >= 2:
-                fig = px.parallel_coordinates(df, dimensions=cols_to_plot,
-                                            color=color_by,
-                                            title="Parallel Coordinates Plot")
-                st.plotly_chart(fig, use_container_width=True)
+                fig = cached_figure(df, "parallel_coordinates", dict(cols=cols_to_plot, color=color_by),
+                                    lambda: px.parallel_coordinates(df, dimensions=cols_to_plot,
+                                                                    color=color_by,
+                                                                    title="Parallel Coordinates Plot"))
+                render_chart(fig, rows=len(df))
         else:
             st.info("Need at least 2 numeric columns")
     
@@ -297,317 +341,498 @@ with tab5:
                                       key="sunburst_path")
             
             if len(path_cols) >= 2:
-                fig = px.sunburst(df, path=path_cols, title="Sunburst Chart")
-                st.plotly_chart(fig, use_container_width=True)
+                fig = cached_figure(df, "sunburst", dict(path=path_cols),
+                                    lambda: px.sunburst(df, path=path_cols, title="Sunburst Chart"))
+                render_chart(fig, rows=len(df))
         else:
             st.info("Need at least 2 categorical columns for sunburst")
 
-with tab6:
-    st.subheader("🏥 Epidemiological Visualizations")
+
+def population_pyramid_view():
+    perf_mark()
+    st.info("**Population Pyramid**: Visualize age and sex distribution of a population")
     
-    epi_viz = st.selectbox("Select epidemiological visualization:", [
-        "Population Pyramid",
-        "Age-Adjusted Rates",
-        "Incidence/Prevalence Trends",
-        "Survival Curve",
-        "Geographical Heat Map",
-        "2x2 Contingency Analysis"
-    ])
-    
-    if epi_viz == "Population Pyramid":
-        st.info("**Population Pyramid**: Visualize age and sex distribution of a population")
-        
+    col1, col2 = st.columns(2)
+    with col1:
         age_col = st.selectbox("Age column:", df.columns, key="pyram_age")
+        band_width = st.select_slider("Age band width (years):", [1, 5, 10], value=5, key="pyram_band")
+    with col2:
         sex_col = st.selectbox("Sex/Gender column:", df.columns, key="pyram_sex")
-        
-        if st.button("Generate Pyramid"):
-            try:
-                # Group by age and sex
-                pyramid_data = df.groupby([age_col, sex_col]).size().reset_index(name='count')
-                
-                # Create pyramid
-                fig = go.Figure()
-                
-                for sex in pyramid_data[sex_col].unique():
-                    sex_data = pyramid_data[pyramid_data[sex_col] == sex]
-                    values = sex_data['count'].values
-                    
-                    # Make one side negative for pyramid effect
-                    if sex == pyramid_data[sex_col].unique()[0]:
-                        values = -values
-                    
-                    fig.add_trace(go.Bar(
-                        y=sex_data[age_col],
-                        x=values,
-                        name=str(sex),
-                        orientation='h'
-                    ))
-                
-                fig.update_layout(
-                    title="Population Pyramid",
-                    barmode='overlay',
-                    bargap=0.1,
-                    xaxis=dict(title='Population'),
-                    yaxis=dict(title='Age'),
-                    height=600
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
+        max_age = st.number_input("Open-ended top band from age:", 10, 120, 85, step=5, key="pyram_max")
     
-    elif epi_viz == "Age-Adjusted Rates":
-        st.info("**Age-Adjusted Rates**: Standardize rates across different age groups")
-        
-        age_col = st.selectbox("Age group column:", df.columns, key="age_adj_age")
-        rate_col = st.selectbox("Rate/Count column:", num_cols, key="age_adj_rate")
+    other_cols = [c for c in df.columns if c not in [age_col, sex_col]]
+    col1, col2 = st.columns(2)
+    with col1:
+        facet_col = st.selectbox("Facet columns by (optional):", [None] + other_cols, key="pyram_facet_col")
+    with col2:
+        facet_row = st.selectbox("Facet rows by (optional):",
+                                 [None] + [c for c in other_cols if c != facet_col], key="pyram_facet_row")
+    
+    show_percent = st.checkbox("Show % of population", value=False, key="pyram_pct")
+    
+    if st.button("Generate Pyramid"):
+        try:
+            # Single aggregation over age band x sex x facets
+            pyramid_data, dropped = build_pyramid(
+                df, age_col, sex_col, band_width=band_width, max_age=int(max_age),
+                facet_cols=[facet_col, facet_row]
+            )
+            
+            if dropped:
+                st.caption(f"{dropped:,} rows with missing age, unrecognized sex or missing facet were excluded")
+            
+            fig = pyramid_figure(pyramid_data,
+                                 value="Percent" if show_percent else "Population",
+                                 facet_col=facet_col, facet_row=facet_row)
+            
+            render_chart(fig, rows=len(df))
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
+
+
+def age_adjusted_rates_view():
+    perf_mark()
+    st.info("**Age-Adjusted Rates**: Standardize rates across different age groups")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        age_col = st.selectbox("Age / age group column:", df.columns, key="age_adj_age")
+    with col2:
+        rate_col = st.selectbox("Event count column:", num_cols, key="age_adj_rate")
+    with col3:
         pop_col = st.selectbox("Population column:", num_cols, key="age_adj_pop")
-        
-        if st.button("Calculate Age-Adjusted Rate"):
-            try:
-                # Calculate crude rates per age group
-                rates = df.groupby(age_col).apply(
-                    lambda x: (x[rate_col].sum() / x[pop_col].sum()) * 100000
-                ).reset_index(name='crude_rate')
-                
-                fig = px.bar(rates, x=age_col, y='crude_rate',
-                           title="Age-Specific Rates (per 100,000)",
-                           labels={'crude_rate': 'Rate per 100,000'})
-                
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Display table
-                st.dataframe(rates.style.format({'crude_rate': '{:.2f}'}),
-                           use_container_width=True)
-                
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
     
-    elif epi_viz == "Incidence/Prevalence Trends":
-        st.info("**Disease Trends**: Visualize temporal patterns of disease occurrence")
-        
-        date_col = st.selectbox("Date column:", df.columns, key="trend_date")
-        case_col = st.selectbox("Case count column (optional):", ["Count rows"] + num_cols, key="trend_cases")
-        
-        time_unit = st.radio("Aggregate by:", ["Day", "Week", "Month", "Year"], horizontal=True)
-        
-        if st.button("Generate Trend"):
-            try:
-                df_trend = df.copy()
-                df_trend[date_col] = pd.to_datetime(df_trend[date_col])
-                
-                # Aggregate by time unit
-                if time_unit == "Day":
-                    df_trend['period'] = df_trend[date_col].dt.date
-                elif time_unit == "Week":
-                    df_trend['period'] = df_trend[date_col].dt.to_period('W').apply(lambda r: r.start_time)
-                elif time_unit == "Month":
-                    df_trend['period'] = df_trend[date_col].dt.to_period('M').apply(lambda r: r.start_time)
-                else:  # Year
-                    df_trend['period'] = df_trend[date_col].dt.year
-                
-                if case_col == "Count rows":
-                    trend_data = df_trend.groupby('period').size().reset_index(name='cases')
-                else:
-                    trend_data = df_trend.groupby('period')[case_col].sum().reset_index(name='cases')
-                
-                fig = go.Figure()
-                
-                # Add line chart
+    strata_cols = st.multiselect("Stratify by (e.g. region, year):",
+                                 [c for c in df.columns if c not in [age_col, rate_col, pop_col]],
+                                 key="age_adj_strata")
+    
+    method = st.radio("Method:", ["Direct", "Indirect (SMR)"], horizontal=True, key="age_adj_method")
+    
+    if method == "Direct":
+        standard_name = st.selectbox("Standard population:",
+                                     list(STANDARD_POPULATIONS.keys()) + ["Custom"],
+                                     key="age_adj_standard")
+        if standard_name == "Custom":
+            st.caption("Enter the standard population for each age band (any scale)")
+            custom_std = st.data_editor(
+                pd.DataFrame({
+                    'Age Group': age_band_labels(STANDARD_AGE_EDGES),
+                    'Population': STANDARD_POPULATIONS["WHO World (2000-2025)"],
+                }),
+                disabled=['Age Group'], hide_index=True, key="age_adj_custom"
+            )
+            standard = custom_std['Population'].to_numpy()
+        else:
+            standard = standard_name
+    else:
+        st.caption("Reference rates: pooled age-specific rates of the whole dataset")
+    
+    if st.button("Calculate Age-Adjusted Rate"):
+        try:
+            if method == "Direct":
+                rates = direct_standardize(df, age_col, rate_col, pop_col,
+                                           strata_cols=strata_cols, standard=standard)
+                value_col, ref_value = 'Adjusted Rate', None
+                title = "Age-Adjusted Rates per 100,000 (95% Fay-Feuer CI)"
+                incomplete = int((rates['Empty Bands'] > 0).sum())
+                if incomplete:
+                    st.warning(f"{incomplete} stratum(s) have no population in some standard age bands; "
+                               f"their adjusted rate is undefined (NaN). Use finer age data or fewer strata.")
+            else:
+                rates = indirect_standardize(df, age_col, rate_col, pop_col,
+                                             strata_cols=strata_cols)
+                value_col, ref_value = 'SMR', 1
+                title = "Standardized Mortality/Morbidity Ratios (95% exact CI)"
+            
+            rates = rates.reset_index()
+            rates['Stratum'] = rates[strata_cols or ['Stratum']].astype(str).agg(' | '.join, axis=1)
+            
+            fig = go.Figure(go.Bar(
+                x=rates['Stratum'], y=rates[value_col],
+                error_y=dict(type='data', symmetric=False,
+                             array=rates['CI Upper'] - rates[value_col],
+                             arrayminus=rates[value_col] - rates['CI Lower'])
+            ))
+            if ref_value is not None:
+                fig.add_hline(y=ref_value, line_dash="dash", line_color="green")
+            fig.update_layout(title=title, xaxis_title="Stratum", yaxis_title=value_col)
+            
+            render_chart(fig, rows=len(df))
+            
+            # Display table
+            st.dataframe((rates.drop(columns='Stratum') if strata_cols else rates).style.format(
+                {c: '{:.2f}' for c in rates.columns if c in
+                 ['Crude Rate', 'Adjusted Rate', 'Expected', 'SMR', 'CI Lower', 'CI Upper']}),
+                use_container_width=True)
+            
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
+
+
+def incidence_trends_view():
+    perf_mark()
+    st.info("**Disease Trends**: Visualize temporal patterns of disease occurrence")
+    
+    date_col = st.selectbox("Date column:", df.columns, key="trend_date")
+    case_col = st.selectbox("Case count column (optional):", ["Count rows"] + num_cols, key="trend_cases")
+    
+    time_unit = st.radio("Aggregate by:", TIME_UNITS, horizontal=True)
+    
+    # The trend stays shown only for the dataset version and columns it was
+    # generated for; the time unit and zoom are explored from the cube
+    trend_inputs = (dataset_fingerprint(df), date_col, case_col)
+    if st.button("Generate Trend"):
+        st.session_state["trend_generated"] = trend_inputs
+    
+    if st.session_state.get("trend_generated") == trend_inputs:
+        try:
+            # Pre-aggregated once per dataset/column choice; resolution and
+            # zoom changes are served from the cube without touching df
+            cube = get_time_cube(df, date_col, None if case_col == "Count rows" else case_col)
+            if cube.rows == 0:
+                raise ValueError(f"No valid dates in '{date_col}'")
+            
+            first, last = cube.date_range
+            zoom = (first.date(), last.date())
+            if first < last:
+                zoom = st.slider("Date range:", min_value=first.date(), max_value=last.date(), value=zoom)
+            
+            trend_data = cube.series(time_unit, start=zoom[0], end=zoom[1])
+            
+            fig = go.Figure()
+            
+            # Add line chart
+            fig.add_trace(go.Scatter(
+                x=trend_data['period'],
+                y=trend_data['cases'],
+                customdata=trend_data['label'],
+                hovertemplate='%{customdata}: %{y}',
+                mode='lines+markers',
+                name='Cases',
+                line=dict(width=2, color='red')
+            ))
+            
+            # Add moving average
+            if len(trend_data) > 7:
+                trend_data['ma7'] = trend_data['cases'].rolling(window=7, center=True).mean()
                 fig.add_trace(go.Scatter(
                     x=trend_data['period'],
-                    y=trend_data['cases'],
-                    mode='lines+markers',
-                    name='Cases',
-                    line=dict(width=2, color='red')
+                    y=trend_data['ma7'],
+                    mode='lines',
+                    name='7-period MA',
+                    line=dict(width=3, dash='dash', color='blue')
                 ))
-                
-                # Add moving average
-                if len(trend_data) > 7:
-                    trend_data['ma7'] = trend_data['cases'].rolling(window=7, center=True).mean()
-                    fig.add_trace(go.Scatter(
-                        x=trend_data['period'],
-                        y=trend_data['ma7'],
-                        mode='lines',
-                        name='7-period MA',
-                        line=dict(width=3, dash='dash', color='blue')
-                    ))
-                
-                fig.update_layout(
-                    title=f"Disease Incidence Trend by {time_unit}",
-                    xaxis_title="Time Period",
-                    yaxis_title="Number of Cases",
-                    hovermode='x unified'
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Summary stats
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("Total Cases", f"{trend_data['cases'].sum():.0f}")
-                with col2:
-                    st.metric("Peak Cases", f"{trend_data['cases'].max():.0f}")
-                with col3:
-                    st.metric("Average per Period", f"{trend_data['cases'].mean():.1f}")
-                
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
+            
+            fig.update_layout(
+                title=f"Disease Incidence Trend by {time_unit}",
+                xaxis_title="Time Period",
+                yaxis_title="Number of Cases",
+                hovermode='x unified'
+            )
+            
+            render_chart(fig, rows=len(df))
+            
+            # Summary stats
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Total Cases", f"{trend_data['cases'].sum():.0f}")
+            with col2:
+                st.metric("Peak Cases", f"{trend_data['cases'].max():.0f}")
+            with col3:
+                st.metric("Average per Period", f"{trend_data['cases'].mean():.1f}")
+            
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
+
+
+def survival_curve_view():
+    perf_mark()
+    st.info("**Kaplan-Meier Survival**: Visualize survival probability over time")
     
-    elif epi_viz == "Survival Curve":
-        st.info("**Kaplan-Meier Survival**: Visualize survival probability over time")
-        
-        time_col = st.selectbox("Time-to-event column:", num_cols, key="surv_time")
-        event_col = st.selectbox("Event indicator (1=event, 0=censored):", df.columns, key="surv_event")
-        group_col = st.selectbox("Group by (optional):", ["None"] + cat_cols, key="surv_group")
-        
-        if st.button("Generate Survival Curve"):
-            try:
-                from lifelines import KaplanMeierFitter
-                
-                kmf = KaplanMeierFitter()
-                fig = go.Figure()
-                
-                if group_col != "None":
-                    for group in df[group_col].unique():
-                        mask = df[group_col] == group
-                        kmf.fit(df.loc[mask, time_col], 
-                               df.loc[mask, event_col],
-                               label=str(group))
-                        
-                        fig.add_trace(go.Scatter(
-                            x=kmf.survival_function_.index,
-                            y=kmf.survival_function_[str(group)],
-                            mode='lines',
-                            name=f'{group}',
-                            line=dict(width=2)
-                        ))
-                else:
-                    kmf.fit(df[time_col], df[event_col])
+    time_col = st.selectbox("Time-to-event column:", num_cols, key="surv_time")
+    event_col = st.selectbox("Event indicator (1=event, 0=censored):", df.columns, key="surv_event")
+    group_col = st.selectbox("Group by (optional):", ["None"] + cat_cols, key="surv_group")
+    
+    if st.button("Generate Survival Curve"):
+        try:
+            from lifelines import KaplanMeierFitter
+            
+            kmf = KaplanMeierFitter()
+            fig = go.Figure()
+            
+            if group_col != "None":
+                for group in df[group_col].unique():
+                    mask = df[group_col] == group
+                    kmf.fit(df.loc[mask, time_col], 
+                           df.loc[mask, event_col],
+                           label=str(group))
                     
                     fig.add_trace(go.Scatter(
                         x=kmf.survival_function_.index,
-                        y=kmf.survival_function_['KM_estimate'],
+                        y=kmf.survival_function_[str(group)],
                         mode='lines',
-                        name='Survival',
-                        line=dict(width=2, color='blue')
+                        name=f'{group}',
+                        line=dict(width=2)
                     ))
+            else:
+                kmf.fit(df[time_col], df[event_col])
                 
-                fig.update_layout(
-                    title="Kaplan-Meier Survival Curve",
-                    xaxis_title="Time",
-                    yaxis_title="Survival Probability",
-                    yaxis_range=[0, 1]
+                fig.add_trace(go.Scatter(
+                    x=kmf.survival_function_.index,
+                    y=kmf.survival_function_['KM_estimate'],
+                    mode='lines',
+                    name='Survival',
+                    line=dict(width=2, color='blue')
+                ))
+            
+            fig.update_layout(
+                title="Kaplan-Meier Survival Curve",
+                xaxis_title="Time",
+                yaxis_title="Survival Probability",
+                yaxis_range=[0, 1]
+            )
+            
+            render_chart(fig, rows=len(df))
+            
+            st.success(f"Median survival time: {kmf.median_survival_time_:.2f}")
+            
+        except ImportError:
+            st.error("❌ Install 'lifelines' package: pip install lifelines")
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
+
+
+def geographical_heat_map_view():
+    perf_mark()
+    st.info("**Geographic Distribution**: Map disease prevalence or incidence by region")
+    
+    region_col = st.selectbox("Region/Location column:", df.columns, key="geo_region")
+    value_col = st.selectbox("Value to map:", num_cols, key="geo_value")
+    
+    agg_func = st.radio("Aggregation:", ["Sum", "Mean", "Count"], horizontal=True)
+    
+    bundled = available_boundaries()
+    col1, col2 = st.columns(2)
+    with col1:
+        boundary_name = st.selectbox("Boundaries:", list(bundled) + ["Upload GeoJSON", "None (bar chart)"],
+                                     key="geo_boundaries")
+    with col2:
+        detail = st.select_slider("Map detail:", list(DETAIL_LEVELS), value="Medium", key="geo_detail")
+    
+    source = bundled.get(boundary_name)
+    if boundary_name == "Upload GeoJSON":
+        upload = st.file_uploader("Boundary file (GeoJSON FeatureCollection):", type=["geojson", "json"],
+                                  key="geo_upload")
+        source = upload.getvalue() if upload is not None else None
+    
+    boundaries = key_property = None
+    if source is not None:
+        try:
+            boundary_key, boundaries = load_boundaries(source)
+            properties = key_properties(boundaries)
+            best = best_key_property(boundary_key, boundaries, df[region_col])
+            key_property = st.selectbox("Match regions on property:", properties,
+                                        index=properties.index(best) if best in properties else 0)
+        except Exception as e:
+            st.error(f"Error loading boundaries: {str(e)}")
+            boundaries = None
+    
+    if st.button("Generate Heat Map"):
+        try:
+            # Sum, mean and count in a single groupby
+            geo_data = aggregate_by_region(df, region_col, value_col)
+            
+            if boundaries is not None and key_property is not None:
+                joined, unmatched = join_regions(
+                    geo_data, region_col, region_index(boundary_key, boundaries, key_property)
                 )
+                geojson = simplified_boundaries(boundary_key, boundaries, DETAIL_LEVELS[detail])
                 
-                st.plotly_chart(fig, use_container_width=True)
-                
-                st.success(f"Median survival time: {kmf.median_survival_time_:.2f}")
-                
-            except ImportError:
-                st.error("❌ Install 'lifelines' package: pip install lifelines")
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
-    
-    elif epi_viz == "Geographical Heat Map":
-        st.info("**Geographic Distribution**: Map disease prevalence or incidence by region")
-        
-        region_col = st.selectbox("Region/Location column:", df.columns, key="geo_region")
-        value_col = st.selectbox("Value to map:", num_cols, key="geo_value")
-        
-        agg_func = st.radio("Aggregation:", ["Sum", "Mean", "Count"], horizontal=True)
-        
-        if st.button("Generate Heat Map"):
-            try:
-                if agg_func == "Sum":
-                    geo_data = df.groupby(region_col)[value_col].sum().reset_index()
-                elif agg_func == "Mean":
-                    geo_data = df.groupby(region_col)[value_col].mean().reset_index()
-                else:  # Count
-                    geo_data = df.groupby(region_col).size().reset_index(name=value_col)
+                fig = choropleth_figure(joined, geojson, region_col, agg_func,
+                                        title=f"{agg_func} of {value_col} by {region_col}")
+                render_chart(fig, rows=len(df))
                 
-                fig = px.bar(geo_data, x=region_col, y=value_col,
+                st.caption(f"{len(joined)} of {len(geo_data)} regions matched on '{key_property}' · "
+                           f"{len(json.dumps(geojson)) / 1024:,.0f} KB of geometry at '{detail}' detail")
+                if unmatched:
+                    st.warning(f"⚠️ {len(unmatched)} regions not found in the boundaries: "
+                               + ", ".join(map(str, unmatched[:10])) + ("..." if len(unmatched) > 10 else ""))
+            else:
+                fig = px.bar(geo_data, x=region_col, y=agg_func,
                            title=f"{agg_func} of {value_col} by {region_col}",
-                           color=value_col,
+                           color=agg_func,
                            color_continuous_scale='Reds')
                 
                 fig.update_layout(xaxis={'categoryorder':'total descending'})
                 
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Show high-risk areas
-                top_5 = geo_data.nlargest(5, value_col)
-                st.markdown("##### 🔴 Top 5 High-Risk Areas")
-                st.dataframe(top_5, use_container_width=True)
-                
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
+                render_chart(fig, rows=len(df))
+            
+            # Show high-risk areas
+            top_5 = geo_data.nlargest(5, agg_func)
+            st.markdown("##### 🔴 Top 5 High-Risk Areas")
+            st.dataframe(top_5, use_container_width=True)
+            
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
+
+
+def contingency_view():
+    perf_mark()
+    st.info("**2x2 Table**: Analyze association between exposure and outcome")
     
-    elif epi_viz == "2x2 Contingency Analysis":
-        st.info("**2x2 Table**: Analyze association between exposure and outcome")
-        
-        exposure_col = st.selectbox("Exposure variable (binary):", df.columns, key="cont_exp")
-        outcome_col = st.selectbox("Outcome variable (binary):", df.columns, key="cont_out")
-        
-        if st.button("Analyze Association"):
-            try:
-                from scipy import stats
+    exposure_col = st.selectbox("Exposure variable (binary):", df.columns, key="cont_exp")
+    outcome_col = st.selectbox("Outcome variable (binary):", df.columns, key="cont_out")
+    
+    if st.button("Analyze Association"):
+        try:
+            from scipy import stats
+            
+            # Create contingency table
+            cont_table = pd.crosstab(df[exposure_col], df[outcome_col])
+            
+            st.markdown("##### 📋 Contingency Table")
+            st.dataframe(cont_table, use_container_width=True)
+            
+            if cont_table.shape == (2, 2):
+                a = cont_table.iloc[1, 1]  # Exposed + Diseased
+                b = cont_table.iloc[1, 0]  # Exposed + Not diseased
+                c = cont_table.iloc[0, 1]  # Unexposed + Diseased
+                d = cont_table.iloc[0, 0]  # Unexposed + Not diseased
+                
+                # Calculate measures
+                risk_exposed = a / (a + b)
+                risk_unexposed = c / (c + d)
+                risk_ratio = risk_exposed / risk_unexposed
+                odds_ratio = (a * d) / (b * c)
+                
+                # Chi-square test
+                chi2, p_value, dof, expected = stats.chi2_contingency(cont_table)
+                
+                # Display results
+                col1, col2, col3 = st.columns(3)
                 
-                # Create contingency table
-                cont_table = pd.crosstab(df[exposure_col], df[outcome_col])
+                with col1:
+                    st.metric("Risk Ratio", f"{risk_ratio:.3f}")
+                    st.caption("RR > 1: Increased risk")
                 
-                st.markdown("##### 📋 Contingency Table")
-                st.dataframe(cont_table, use_container_width=True)
+                with col2:
+                    st.metric("Odds Ratio", f"{odds_ratio:.3f}")
+                    st.caption("OR > 1: Increased odds")
                 
-                if cont_table.shape == (2, 2):
-                    a = cont_table.iloc[1, 1]  # Exposed + Diseased
-                    b = cont_table.iloc[1, 0]  # Exposed + Not diseased
-                    c = cont_table.iloc[0, 1]  # Unexposed + Diseased
-                    d = cont_table.iloc[0, 0]  # Unexposed + Not diseased
-                    
-                    # Calculate measures
-                    risk_exposed = a / (a + b)
-                    risk_unexposed = c / (c + d)
-                    risk_ratio = risk_exposed / risk_unexposed
-                    odds_ratio = (a * d) / (b * c)
-                    
-                    # Chi-square test
-                    chi2, p_value, dof, expected = stats.chi2_contingency(cont_table)
-                    
-                    # Display results
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        st.metric("Risk Ratio", f"{risk_ratio:.3f}")
-                        st.caption("RR > 1: Increased risk")
-                    
-                    with col2:
-                        st.metric("Odds Ratio", f"{odds_ratio:.3f}")
-                        st.caption("OR > 1: Increased odds")
-                    
-                    with col3:
-                        st.metric("Chi² p-value", f"{p_value:.4f}")
-                        if p_value < 0.05:
-                            st.caption("✓ Significant")
-                        else:
-                            st.caption("Not significant")
-                    
-                    # Visualization
-                    fig = px.imshow(cont_table, text_auto=True, aspect="auto",
-                                  labels=dict(x=outcome_col, y=exposure_col),
-                                  title="Contingency Table Heatmap",
-                                  color_continuous_scale='Blues')
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                else:
-                    st.warning("⚠️ Variables must be binary (2 categories each)")
+                with col3:
+                    st.metric("Chi² p-value", f"{p_value:.4f}")
+                    if p_value < 0.05:
+                        st.caption("✓ Significant")
+                    else:
+                        st.caption("Not significant")
+                
+                # Visualization
+                fig = px.imshow(cont_table, text_auto=True, aspect="auto",
+                              labels=dict(x=outcome_col, y=exposure_col),
+                              title="Contingency Table Heatmap",
+                              color_continuous_scale='Blues')
+                render_chart(fig, rows=len(df))
                 
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
+            else:
+                st.warning("⚠️ Variables must be binary (2 categories each)")
+            
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
+
+
+def exposure_screening_view():
+    perf_mark()
+    st.info("**Exposure Screening**: Test every binary exposure against one outcome at once")
+    
+    outcome_col = st.selectbox("Outcome variable (binary):", df.columns, key="screen_out")
+    candidates = [c for c in df.columns if c != outcome_col]
+    exposure_cols = st.multiselect("Exposures to screen:", candidates, default=candidates, key="screen_exp")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        correction = st.selectbox("Multiple-testing correction:", list(CORRECTIONS.keys()), key="screen_corr")
+    with col2:
+        measure = st.radio("Forest plot measure:", ["RR", "OR"], horizontal=True, key="screen_measure")
+    
+    if st.button("Screen Exposures"):
+        try:
+            # All 2x2 tables from one bincount pass over integer-coded columns
+            results, skipped = cached_screen(df, outcome_col, exposure_cols, CORRECTIONS[correction])
+            
+            if skipped:
+                st.caption(f"Skipped {len(skipped)} non-binary columns: {', '.join(map(str, skipped[:10]))}"
+                           + ("..." if len(skipped) > 10 else ""))
+            
+            if results.empty:
+                st.warning("⚠️ No binary exposures to screen")
+            else:
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.metric("Exposures Screened", len(results))
+                with col2:
+                    st.metric("Significant (adjusted)", int(results['Significant'].sum()))
+                
+                render_chart(forest_figure(results, measure), rows=len(df))
+                
+                st.dataframe(results.style.format({
+                    'Attack Rate Exposed': '{:.1%}', 'Attack Rate Unexposed': '{:.1%}',
+                    'RR': '{:.2f}', 'RR CI Lower': '{:.2f}', 'RR CI Upper': '{:.2f}',
+                    'OR': '{:.2f}', 'OR CI Lower': '{:.2f}', 'OR CI Upper': '{:.2f}',
+                    'Chi-square': '{:.2f}', 'p-value': '{:.4g}', 'Adjusted p-value': '{:.4g}'
+                }), use_container_width=True)
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
+
+
+EPI_VIEWS = {
+    "Population Pyramid": population_pyramid_view,
+    "Age-Adjusted Rates": age_adjusted_rates_view,
+    "Incidence/Prevalence Trends": incidence_trends_view,
+    "Survival Curve": survival_curve_view,
+    "Geographical Heat Map": geographical_heat_map_view,
+    "2x2 Contingency Analysis": contingency_view,
+    "Exposure Screening (many 2x2)": exposure_screening_view,
+}
+
+
+def epidemiological_tab():
+    perf_mark()
+    st.subheader("🏥 Epidemiological Visualizations")
+    
+    epi_viz = st.selectbox("Select epidemiological visualization:", list(EPI_VIEWS))
+    
+    EPI_VIEWS[epi_viz]()
+
+
+VIEWS = {
+    "📈 Distribution": distribution_tab,
+    "🔗 Relationships": relationships_tab,
+    "📊 Comparisons": comparisons_tab,
+    "🌡️ Heatmaps": heatmaps_tab,
+    "📉 Advanced": advanced_tab,
+    "🏥 Epidemiological": epidemiological_tab,
+}
+
+
+# Only the selected view runs (st.tabs would run every tab on each rerun),
+# and as a fragment: its widgets rerun the view and the cost panels below
+# it, not the whole page
+@st.fragment
+def visualization_view():
+    view = st.radio("View:", list(VIEWS), horizontal=True, key="viz_view", label_visibility="collapsed")
+    VIEWS[view]()
+    
+    performance_panel()
+    st.caption(cache_report())
+
+
+visualization_view()
 
 # Data preview
 st.markdown("---")
 with st.expander("📋 View Data"):
     st.dataframe(df, use_container_width=True)
 
+jobs_panel()
+
 chatbot_sidebar()
@@ -1,26 +1,35 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV
-from sklearn.preprocessing import LabelEncoder, StandardScaler
+from datetime import datetime
+from pathlib import Path
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
 from sklearn.linear_model import LinearRegression, LogisticRegression, Ridge, Lasso
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor, GradientBoostingClassifier, GradientBoostingRegressor
 from sklearn.svm import SVC, SVR
 from sklearn.neighbors import KNeighborsClassifier, KNeighborsRegressor
 from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
-from sklearn.metrics import (accuracy_score, precision_score, recall_score, f1_score, 
-                            mean_squared_error, r2_score, mean_absolute_error, 
-                            classification_report, confusion_matrix)
+from sklearn.metrics import confusion_matrix
 import plotly.graph_objects as go
 import plotly.express as px
 
-try:
-    from xgboost import XGBClassifier, XGBRegressor
-    XGBOOST_AVAILABLE = True
-except ImportError:
-    XGBOOST_AVAILABLE = False
-
 from chatbot import chatbot_sidebar
+from render_metrics import render_chart, perf_mark, performance_panel
+from training import train_models, available_cores, preflight, PREFLIGHT_SIZES, PREFLIGHT_VALIDATION_ROWS
+from preprocessing import split_columns, build_preprocessor, build_native_preprocessor
+from boosting import hist_boosting, hist_xgboost, NATIVE_MODELS, XGBOOST_AVAILABLE
+from encoding import ENCODINGS
+from search import save_trials, load_trials
+from dataset_version import dataset_fingerprint, dataset_digest
+from scoring import (score_to_parquet, input_columns, preview_parquet, SCORING_CHUNK_ROWS,
+                     SCORING_OUTPUT_DIR, STREAMABLE_FORMATS, MAX_DOWNLOAD_BYTES)
+from artifacts import (artifact_key, load_artifact, save_artifact, registry, delete_artifacts,
+                       export_bundle, EXPORT_DIR)
+from benchmarks import COST_COLUMNS, FIT_TIME, latency_column, project_costs
+from jobs import start_job, job_status, job_active, job_result, jobs_panel
+from evaluation import (make_folds, model_result, stack_models, results_frame,
+                        classification_curves, curves_figure)
 
 st.session_state["page_name"] = "Modeling and Evaluation"
 
@@ -33,7 +42,7 @@ if "dataset" not in st.session_state:
     st.warning("⚠️ Please upload a dataset first.")
     st.stop()
 
-df = st.session_state["dataset"].copy()
+df = st.session_state["dataset"]
 
 # -------------------------
 # Configuration
@@ -76,23 +85,18 @@ with st.expander("🔍 View Configuration", expanded=True):
         st.info(f"**Train/Test Split:** {int((1-test_size)*100)}/{int(test_size*100)}")
 
 try:
-    X = df[selected_features].copy()
-    y = df[target_col].copy()
+    X = df[selected_features]
+    y = df[target_col]
     
-    # Handle missing values
-    if X.isnull().sum().sum() > 0:
-        st.warning(f"⚠️ Found {X.isnull().sum().sum()} missing values. Filling with mean/mode...")
-        for col in X.columns:
-            if X[col].dtype in ['float64', 'int64']:
-                X[col].fillna(X[col].mean(), inplace=True)
-            else:
-                X[col].fillna(X[col].mode()[0] if len(X[col].mode()) > 0 else 'Unknown', inplace=True)
+    # Imputation, encoding and scaling run inside the training pipeline, fitted
+    # on each training split/fold only (see preprocessing.py)
+    numeric_cols, categorical_cols = split_columns(X)
+    missing = int(X.isnull().sum().sum())
+    if missing > 0:
+        st.warning(f"⚠️ Found {missing} missing values. They will be filled with mean/mode learned from the training data...")
     
-    # Encode categorical features
-    categorical_cols = X.select_dtypes(include=['object', 'category']).columns
     if len(categorical_cols) > 0:
         st.info(f"🔄 Encoding {len(categorical_cols)} categorical features...")
-        X = pd.get_dummies(X, columns=categorical_cols, drop_first=True)
     
     # Determine problem type
     unique_targets = y.nunique()
@@ -132,6 +136,7 @@ st.subheader("🎯 Model Selection")
 if problem_type == "classification":
     available_models = {
         "Logistic Regression": LogisticRegression(max_iter=1000),
+        "Histogram Boosting": hist_boosting(problem_type, len(numeric_cols), len(categorical_cols), random_state),
         "Random Forest": RandomForestClassifier(n_estimators=100, random_state=random_state),
         "Decision Tree": DecisionTreeClassifier(random_state=random_state),
         "K-Nearest Neighbors": KNeighborsClassifier(),
@@ -140,11 +145,13 @@ if problem_type == "classification":
     }
     
     if XGBOOST_AVAILABLE:
-        available_models["XGBoost"] = XGBClassifier(random_state=random_state, eval_metric='logloss')
+        available_models["XGBoost"] = hist_xgboost(problem_type, len(numeric_cols), len(categorical_cols),
+                                                   random_state)
     
 else:  # Regression
     available_models = {
         "Linear Regression": LinearRegression(),
+        "Histogram Boosting": hist_boosting(problem_type, len(numeric_cols), len(categorical_cols), random_state),
         "Ridge Regression": Ridge(),
         "Lasso Regression": Lasso(),
         "Random Forest": RandomForestRegressor(n_estimators=100, random_state=random_state),
@@ -155,7 +162,8 @@ else:  # Regression
     }
     
     if XGBOOST_AVAILABLE:
-        available_models["XGBoost"] = XGBRegressor(random_state=random_state)
+        available_models["XGBoost"] = hist_xgboost(problem_type, len(numeric_cols), len(categorical_cols),
+                                                   random_state)
 
 selected_models = st.multiselect(
     "Select models to train:",
@@ -170,213 +178,487 @@ with st.expander("⚙️ Advanced Options"):
     with col1:
         use_scaling = st.checkbox("Standardize Features", value=True)
         use_cv = st.checkbox("Use Cross-Validation", value=True)
+        encoding = st.selectbox("Categorical Encoding:", list(ENCODINGS),
+                                disabled=len(categorical_cols) == 0,
+                                help="Histogram Boosting and XGBoost skip encoding, imputation and "
+                                     "scaling: they split on categories and missing values natively")
+        min_level_count = st.number_input("Pool categorical levels with fewer rows than:", 1, 10000, 1,
+                                          disabled=len(categorical_cols) == 0,
+                                          help="Rare levels share one 'Other' column (one-hot only). "
+                                               "Columns with more than 1,000 levels are hashed.")
     
     with col2:
         cv_folds = st.slider("CV Folds:", 3, 10, 5) if use_cv else 5
         optimize_hyperparams = st.checkbox("Optimize Hyperparameters (slower)", value=False)
+        search_budget = st.slider("Search Time Budget per Model (seconds):", 10, 600, 60, step=10,
+                                  disabled=not optimize_hyperparams,
+                                  help="Successive-halving search over each model's space; "
+                                       "no new trial of a model starts once its budget is spent")
+        use_stacking = st.checkbox("Add Stacked Ensemble (from CV predictions)", value=False,
+                                   disabled=not use_cv)
+
+preprocessor = build_preprocessor(numeric_cols, categorical_cols, scale=use_scaling,
+                                  encoding=ENCODINGS[encoding], min_frequency=min_level_count)
+# Histogram boosting reads categoricals and missing values as they are
+native_preprocessors = {name: build_native_preprocessor(numeric_cols, categorical_cols, min_level_count)
+                        for name in NATIVE_MODELS}
+
+# -------------------------
+# Pre-flight Estimate
+# -------------------------
+# Projections are only reused while the data, split and preprocessing match
+preflight_signature = (dataset_fingerprint(df), tuple(selected_features), target_col, test_size, random_state,
+                       use_scaling, ENCODINGS[encoding], min_level_count)
+preflight_run = st.session_state.get('preflight')
+if preflight_run is not None and preflight_run['signature'] != preflight_signature:
+    preflight_run = None
+
+with st.expander("🧪 Pre-flight: estimate training cost before training", expanded=len(X_train) > 50_000):
+    st.caption(f"Fits each selected model on {', '.join(f'{n:,}' for n in PREFLIGHT_SIZES)}-row subsamples "
+               f"of the training split and extrapolates to all {len(X_train):,} training rows.")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        time_budget = st.number_input("Fit time budget per model (s):", 1, 86_400, 600, step=60,
+                                      help="Compared with the projected fit time, CV folds included")
+    with col2:
+        memory_budget = st.number_input("Memory budget per model (MB):", 100, 1_000_000, 4_096, step=512,
+                                        help="Compared with the projected growth of a worker's resident "
+                                             "memory during the fit, native libraries included")
+    with col3:
+        skip_over_budget = st.checkbox("Skip models projected over budget", value=True)
+    
+    if st.button("🧪 Run Pre-flight", disabled=not selected_models):
+        preflight_status = st.empty()
+        
+        def show_preflight_progress(done_models, total_models, elapsed):
+            preflight_status.text(f"Pre-flight: {done_models}/{total_models} models ({elapsed:.0f}s)")
+        
+        curve, preflight_errors = preflight(
+            {name: available_models[name] for name in selected_models}, X_train, np.asarray(y_train),
+            preprocessor=preprocessor, preprocessors=native_preprocessors, random_state=random_state,
+            on_tick=show_preflight_progress
+        )
+        preflight_status.empty()
+        for name, error in preflight_errors.items():
+            st.error(f"❌ Pre-flight of {name} failed: {error}")
+        preflight_run = {'signature': preflight_signature, 'curve': curve}
+        st.session_state['preflight'] = preflight_run
+    
+    if preflight_run is not None and not preflight_run['curve'].empty:
+        curve = preflight_run['curve']
+        estimates = project_costs(curve, len(X_train), cv_folds if use_cv else None)
+        fit_col = "Projected Fit + CV (s)" if use_cv else "Projected Fit (s)"
+        estimates["Over Budget"] = ((estimates[fit_col] > time_budget) |
+                                    (estimates["Projected Memory (MB)"] > memory_budget))
+        preflight_run['over_budget'] = estimates.index[estimates["Over Budget"]].tolist()
+        st.dataframe(estimates.style.format({col: "{:,.3g}" for col in estimates.columns
+                                             if col not in ("Sampled Rows", "Over Budget")}),
+                     use_container_width=True)
+        
+        fig = px.line(curve, x='rows', y='score', color='model', markers=True, log_x=True,
+                      labels={'rows': "Training rows", 'score': "Accuracy" if problem_type == "classification"
+                              else "R² Score"},
+                      title=f"Learning Curve ({min(PREFLIGHT_VALIDATION_ROWS, len(X_train) // 5):,} validation rows)")
+        render_chart(fig, rows=len(curve))
 
 # -------------------------
 # Train Models
 # -------------------------
-if st.button("🚀 Train Models", type="primary", use_container_width=True):
+def run_training_job(job, models, X_train, y_train, X_test, y_test, folds, preprocessor, preprocessors,
+                     search_budget, use_stacking, artifact_keys, run_info):
+    """Background job: load stored models, train the rest, store them and stack.
+
+    Runs outside the script (no st.* calls); messages for the page are
+    returned as (level, text) notes.
+    """
+    problem_type = run_info['problem_type']
+    results, notes, search_trials = [], [], []
+    oof_outputs, test_outputs = {}, {}
+    
+    def collect(trained):
+        model_name = trained['name']
+        if trained['best_params']:
+            notes.append(('info', f"Best params for {model_name}: {trained['best_params']}"))
+        
+        results.append(model_result(
+            problem_type, model_name, trained['model'], y_test, trained['predictions'],
+            y_train, folds, trained['oof_predictions'], trained['oof_scores'], trained.get('costs')
+        ))
+        if folds is not None:
+            oof_outputs[model_name] = (trained['oof_scores'] if problem_type == "classification"
+                                       else trained['oof_predictions'])
+            test_outputs[model_name] = (trained['test_scores'] if problem_type == "classification"
+                                        else trained['predictions'])
+    
+    stored = {name: load_artifact(key) for name, key in artifact_keys.items()}
+    stored = {name: artifact for name, artifact in stored.items() if artifact is not None}
+    for model_name, artifact in stored.items():
+        notes.append(('info', f"📦 {model_name} loaded from the artifact store (trained {artifact['created']})"))
+        collect({'name': model_name, **artifact})
+    
+    def show_progress(done_tasks, total_tasks, elapsed):
+        # Also where a cancelled job stops
+        job.update(done_tasks / total_tasks, f"{done_tasks}/{total_tasks} tasks on {available_cores()} cores, "
+                                             f"{len(results)}/{len(models)} models done")
+    
+    # Models and CV folds train concurrently; results arrive as each model finishes
+    to_train = [name for name in models if name not in stored]
+    trainer = train_models(
+        {name: models[name] for name in to_train},
+        X_train, y_train, X_test,
+        folds=folds,
+        preprocessor=preprocessor,
+        search_budget=search_budget,
+        on_tick=show_progress,
+        preprocessors=preprocessors
+    ) if to_train else iter(())
+    try:
+        for trained in trainer:
+            model_name = trained['name']
+            if trained['error']:
+                notes.append(('error', f"❌ {model_name} failed: {trained['error']}"))
+                continue
+            
+            if trained['cv_error']:
+                notes.append(('warning', f"⚠️ Cross-validation of {model_name} failed, CV metrics omitted: "
+                                         f"{trained['cv_error']}"))
+            
+            search_trials.extend(trained['trials'])
+            collect(trained)
+            
+            metrics = {k: v for k, v in results[-1].items()
+                       if k not in ('Model', 'Predictions', 'Model Object', 'OOF Predictions', 'OOF Scores')}
+            if not trained['cv_error']:
+                # A run with failed folds is retrained next time rather than served without CV
+                save_artifact(artifact_keys[model_name], trained, {
+                    **run_info, "model": model_name, "best_params": trained['best_params'], "metrics": metrics,
+                })
+    finally:
+        # On cancellation, drop any tasks not yet started
+        if to_train:
+            trainer.close()
+    
+    # Keep the user's model order regardless of finishing order
+    results.sort(key=lambda r: list(models).index(r['Model']))
+    
+    if search_trials:
+        save_trials(search_trials, dataset=run_info['dataset'], target=run_info['target'])
+    
+    # Stacking only fits a small meta-model on the stored out-of-fold outputs
+    usable = {name: out for name, out in oof_outputs.items() if out is not None}
+    if use_stacking and len(usable) >= 2:
+        try:
+            ensemble, oof_pred, oof_scores, test_pred, _ = stack_models(
+                problem_type, y_train, folds,
+                {r['Model']: r['Model Object'] for r in results}, usable, test_outputs
+            )
+            results.append(model_result(
+                problem_type, "Stacked Ensemble", ensemble, y_test, test_pred,
+                y_train, folds, oof_pred, oof_scores
+            ))
+        except Exception as e:
+            notes.append(('error', f"❌ Stacked Ensemble failed: {str(e)}"))
+    
+    return {"results": results, "notes": notes, "search_trials": search_trials,
+            "info": run_info, "y_test": y_test, "y_train": y_train}
+
+
+if st.button("🚀 Train Models", type="primary", use_container_width=True,
+             disabled=job_active('training_job')):
+    if preflight_run is not None and skip_over_budget:
+        over_budget = [name for name in selected_models if name in preflight_run.get('over_budget', [])]
+        if over_budget:
+            st.warning(f"⏭️ Skipping models projected over budget: {', '.join(over_budget)}")
+            selected_models = [name for name in selected_models if name not in over_budget]
+    
     if not selected_models:
         st.warning("⚠️ Please select at least one model.")
     else:
-        results = []
+        # Folds are generated once and shared by every model, so out-of-fold
+        # predictions are comparable (and stackable) across models
+        y_train_values = np.asarray(y_train)
+        folds = make_folds(y_train_values, problem_type, cv_folds, random_state) if use_cv else None
         
-        # Scale features if needed
-        if use_scaling:
-            scaler = StandardScaler()
-            X_train_scaled = scaler.fit_transform(X_train)
-            X_test_scaled = scaler.transform(X_test)
-        else:
-            X_train_scaled = X_train
-            X_test_scaled = X_test
+        # Combinations trained before (same data version, features, target, model,
+        # parameters and run settings) come straight from the artifact store
+        dataset_id = dataset_fingerprint(df)
+        run_config = {
+            "test_size": test_size, "random_state": random_state,
+            "cv_folds": cv_folds if use_cv else None, "scaling": use_scaling,
+            "encoding": ENCODINGS[encoding], "min_level_count": min_level_count,
+            "search_budget": search_budget if optimize_hyperparams else None,
+        }
+        artifact_keys = {
+            name: artifact_key(dataset_digest(df), selected_features, target_col, name, available_models[name],
+                               run_config)
+            for name in selected_models
+        }
+        
+        # What scoring new data needs besides the fitted pipeline
+        run_info = {
+            "dataset": dataset_id, "target": target_col, "features": selected_features,
+            "problem_type": problem_type, "config": run_config,
+            "feature_dtypes": X.dtypes.astype(str).to_dict(),
+            "classes": le.classes_.tolist() if problem_type == "classification" else None,
+        }
+        
+        # Training continues in the background across reruns and page switches
+        start_job(
+            'training_job', 'training', run_training_job,
+            {name: available_models[name] for name in selected_models},
+            X_train, y_train_values, X_test, y_test, folds, preprocessor, native_preprocessors,
+            search_budget if optimize_hyperparams else None, use_stacking, artifact_keys, run_info,
+            label=f"Training {len(selected_models)} models → {target_col}"
+        )
+
+# -------------------------
+# Training Progress and Results
+# -------------------------
+training_status = job_status('training_job')
+if training_status is not None and training_status['state'] == 'done':
+    run = job_result(training_status['id'])
+    results = run['results']
+    # Shown with the data of the run, whatever the widgets say now
+    run_info, y_test, y_train = run['info'], run['y_test'], run['y_train']
+    problem_type = run_info['problem_type']
+    
+    for level, note in run['notes']:
+        getattr(st, level)(note)
+    
+    # Trial history is kept across runs, per dataset version and target
+    if run['search_trials']:
+        history = load_trials(dataset=run_info['dataset'], target=run_info['target'])
+        with st.expander(f"🔎 Hyperparameter Search History ({len(run['search_trials'])} trials this run)"):
+            run_trials = pd.DataFrame(run['search_trials'])
+            run_trials['params'] = run_trials['params'].astype(str)
+            st.dataframe(run_trials.sort_values(['model', 'rung', 'score'], ascending=[True, False, False]),
+                         use_container_width=True)
+            st.caption(f"{len(history)} trials recorded for this dataset and target")
+            st.download_button("📥 Download search history (CSV)", history.to_csv(index=False),
+                               file_name="search_history.csv", mime="text/csv")
+    
+    # -------------------------
+    # Display Results
+    # -------------------------
+    if results:
+        perf_mark()
+        st.markdown("---")
+        st.subheader("📊 Model Results")
         
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        # Results table
+        results_df = pd.DataFrame(results)
         
-        for idx, model_name in enumerate(selected_models):
-            status_text.text(f"Training {model_name}... ({idx+1}/{len(selected_models)})")
+        if problem_type == "classification":
+            results_display = results_frame(results, problem_type)
+            metric_cols = [col for col in results_display.columns if col not in ['Model'] + COST_COLUMNS]
+            cost_cols = [col for col in results_display.columns if col in COST_COLUMNS]
+            results_display = results_display.style.format({
+                col: "{:.4f}" for col in metric_cols
+            }).format({col: "{:,.3g}" for col in cost_cols}
+            ).background_gradient(subset=metric_cols, cmap='RdYlGn', vmin=0, vmax=1)
             
-            try:
-                model = available_models[model_name]
-                
-                # Hyperparameter optimization
-                if optimize_hyperparams and model_name in ["Random Forest", "Gradient Boosting"]:
-                    with st.spinner(f"Optimizing {model_name}..."):
-                        if problem_type == "classification":
-                            param_grid = {
-                                'n_estimators': [50, 100, 200],
-                                'max_depth': [5, 10, None]
-                            }
-                        else:
-                            param_grid = {
-                                'n_estimators': [50, 100, 200],
-                                'max_depth': [5, 10, None]
-                            }
-                        
-                        grid_search = GridSearchCV(model, param_grid, cv=3, n_jobs=-1)
-                        grid_search.fit(X_train_scaled, y_train)
-                        model = grid_search.best_estimator_
-                        st.info(f"Best params for {model_name}: {grid_search.best_params_}")
-                else:
-                    model.fit(X_train_scaled, y_train)
-                
-                # Predictions
-                y_pred = model.predict(X_test_scaled)
-                
-                # Metrics
-                if problem_type == "classification":
-                    accuracy = accuracy_score(y_test, y_pred)
-                    precision = precision_score(y_test, y_pred, average='weighted', zero_division=0)
-                    recall = recall_score(y_test, y_pred, average='weighted', zero_division=0)
-                    f1 = f1_score(y_test, y_pred, average='weighted', zero_division=0)
-                    
-                    # Cross-validation
-                    if use_cv:
-                        cv_scores = cross_val_score(model, X_train_scaled, y_train, cv=cv_folds)
-                        cv_mean = cv_scores.mean()
-                    else:
-                        cv_mean = None
-                    
-                    results.append({
-                        'Model': model_name,
-                        'Accuracy': accuracy,
-                        'Precision': precision,
-                        'Recall': recall,
-                        'F1-Score': f1,
-                        'CV Score': cv_mean,
-                        'Predictions': y_pred,
-                        'Model Object': model
-                    })
-                    
-                else:  # Regression
-                    mse = mean_squared_error(y_test, y_pred)
-                    rmse = np.sqrt(mse)
-                    mae = mean_absolute_error(y_test, y_pred)
-                    r2 = r2_score(y_test, y_pred)
-                    
-                    # Cross-validation
-                    if use_cv:
-                        cv_scores = cross_val_score(model, X_train_scaled, y_train, 
-                                                   cv=cv_folds, scoring='r2')
-                        cv_mean = cv_scores.mean()
-                    else:
-                        cv_mean = None
-                    
-                    results.append({
-                        'Model': model_name,
-                        'RMSE': rmse,
-                        'MAE': mae,
-                        'R² Score': r2,
-                        'CV Score': cv_mean,
-                        'Predictions': y_pred,
-                        'Model Object': model
-                    })
+            st.dataframe(results_display, use_container_width=True)
             
-            except Exception as e:
-                st.error(f"❌ {model_name} failed: {str(e)}")
+            # Best model
+            best_idx = results_df['Accuracy'].idxmax()
+            best_model = results_df.loc[best_idx]
             
-            progress_bar.progress((idx + 1) / len(selected_models))
-        
-        status_text.empty()
-        progress_bar.empty()
-        
-        # -------------------------
-        # Display Results
-        # -------------------------
-        if results:
-            st.markdown("---")
-            st.subheader("📊 Model Results")
+            st.success(f"🏆 **Best Model:** {best_model['Model']} with Accuracy = {best_model['Accuracy']:.4f}")
+            
+            # Confusion Matrix for best model
+            st.markdown("#### 🎯 Confusion Matrix (Best Model)")
+            cm = confusion_matrix(y_test, best_model['Predictions'])
             
-            # Results table
-            results_df = pd.DataFrame(results)
+            fig = px.imshow(cm, text_auto=True, aspect="auto",
+                          labels=dict(x="Predicted", y="Actual"),
+                          title=f"Confusion Matrix - {best_model['Model']}")
+            render_chart(fig, rows=len(y_test))
             
-            if problem_type == "classification":
-                display_cols = ['Model', 'Accuracy', 'Precision', 'Recall', 'F1-Score']
-                if use_cv:
-                    display_cols.append('CV Score')
-                
-                results_display = results_df[display_cols].copy()
-                results_display = results_display.style.format({
-                    col: "{:.4f}" for col in display_cols if col != 'Model'
-                }).background_gradient(subset=[col for col in display_cols if col != 'Model'], 
-                                      cmap='RdYlGn', vmin=0, vmax=1)
-                
-                st.dataframe(results_display, use_container_width=True)
-                
-                # Best model
-                best_idx = results_df['Accuracy'].idxmax()
-                best_model = results_df.loc[best_idx]
-                
-                st.success(f"🏆 **Best Model:** {best_model['Model']} with Accuracy = {best_model['Accuracy']:.4f}")
-                
-                # Confusion Matrix for best model
-                st.markdown("#### 🎯 Confusion Matrix (Best Model)")
-                cm = confusion_matrix(y_test, best_model['Predictions'])
-                
-                fig = px.imshow(cm, text_auto=True, aspect="auto",
-                              labels=dict(x="Predicted", y="Actual"),
-                              title=f"Confusion Matrix - {best_model['Model']}")
-                st.plotly_chart(fig, use_container_width=True)
-                
-            else:  # Regression
-                display_cols = ['Model', 'RMSE', 'MAE', 'R² Score']
-                if use_cv:
-                    display_cols.append('CV Score')
-                
-                results_display = results_df[display_cols].copy()
-                st.dataframe(results_display, use_container_width=True)
-                
-                # Best model (highest R²)
-                best_idx = results_df['R² Score'].idxmax()
-                best_model = results_df.loc[best_idx]
-                
-                st.success(f"🏆 **Best Model:** {best_model['Model']} with R² = {best_model['R² Score']:.4f}")
-                
-                # Actual vs Predicted plot
-                st.markdown("#### 📈 Actual vs Predicted (Best Model)")
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(x=y_test, y=best_model['Predictions'],
-                                        mode='markers', name='Predictions'))
-                fig.add_trace(go.Scatter(x=[y_test.min(), y_test.max()],
-                                        y=[y_test.min(), y_test.max()],
-                                        mode='lines', name='Perfect Fit',
-                                        line=dict(dash='dash', color='red')))
-                fig.update_layout(xaxis_title="Actual", yaxis_title="Predicted",
-                                title=f"Actual vs Predicted - {best_model['Model']}")
-                st.plotly_chart(fig, use_container_width=True)
+            # ROC / PR from out-of-fold scores (every training row, not just the holdout)
+            oof_scores = {r['Model']: r['OOF Scores'] for r in results if r['OOF Scores'] is not None}
+            if oof_scores:
+                st.markdown("#### 📉 ROC and Precision-Recall Curves (Cross-Validated)")
+                render_chart(curves_figure(classification_curves(y_train, oof_scores)), rows=len(y_train))
             
-            # Model comparison chart
-            st.markdown("#### 📊 Model Comparison")
+        else:  # Regression
+            results_display = results_frame(results, problem_type)
+            st.dataframe(results_display, use_container_width=True)
             
-            if problem_type == "classification":
-                fig = go.Figure()
-                metrics = ['Accuracy', 'Precision', 'Recall', 'F1-Score']
-                for metric in metrics:
-                    fig.add_trace(go.Bar(name=metric, x=results_df['Model'], 
-                                        y=results_df[metric]))
-                fig.update_layout(barmode='group', 
-                                title="Classification Metrics Comparison",
-                                yaxis_title="Score")
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                fig = go.Figure()
-                fig.add_trace(go.Bar(name='R² Score', x=results_df['Model'], 
-                                    y=results_df['R² Score']))
-                fig.update_layout(title="R² Score Comparison",
-                                yaxis_title="R² Score")
-                st.plotly_chart(fig, use_container_width=True)
+            # Best model (highest R²)
+            best_idx = results_df['R² Score'].idxmax()
+            best_model = results_df.loc[best_idx]
             
-            # Save to session state
-            st.session_state['model_results'] = results
-            st.session_state['best_model'] = best_model['Model Object']
-            st.session_state['best_model_name'] = best_model['Model']
-            st.session_state['best_score'] = best_model['Accuracy'] if problem_type == "classification" else best_model['R² Score']
-            st.session_state['problem_type'] = problem_type
-            st.session_state['feature_names'] = X.columns.tolist()
+            st.success(f"🏆 **Best Model:** {best_model['Model']} with R² = {best_model['R² Score']:.4f}")
             
+            # Actual vs Predicted plot
+            st.markdown("#### 📈 Actual vs Predicted (Best Model)")
+            fig = go.Figure()
+            fig.add_trace(go.Scatter(x=y_test, y=best_model['Predictions'],
+                                    mode='markers', name='Predictions'))
+            fig.add_trace(go.Scatter(x=[y_test.min(), y_test.max()],
+                                    y=[y_test.min(), y_test.max()],
+                                    mode='lines', name='Perfect Fit',
+                                    line=dict(dash='dash', color='red')))
+            fig.update_layout(xaxis_title="Actual", yaxis_title="Predicted",
+                            title=f"Actual vs Predicted - {best_model['Model']}")
+            render_chart(fig, rows=len(y_test))
+        
+        # Model comparison chart
+        st.markdown("#### 📊 Model Comparison")
+        
+        if problem_type == "classification":
+            fig = go.Figure()
+            metrics = ['Accuracy', 'Precision', 'Recall', 'F1-Score']
+            for metric in metrics:
+                fig.add_trace(go.Bar(name=metric, x=results_df['Model'], 
+                                    y=results_df[metric]))
+            fig.update_layout(barmode='group', 
+                            title="Classification Metrics Comparison",
+                            yaxis_title="Score")
+            render_chart(fig, rows=len(results_df))
+        else:
+            fig = go.Figure()
+            fig.add_trace(go.Bar(name='R² Score', x=results_df['Model'], 
+                                y=results_df['R² Score']))
+            fig.update_layout(title="R² Score Comparison",
+                            yaxis_title="R² Score")
+            render_chart(fig, rows=len(results_df))
+        
+        # Accuracy gains against what they cost in training and serving
+        if FIT_TIME in results_df and results_df[FIT_TIME].notna().any():
+            st.markdown("#### ⏱️ Score vs Cost")
+            score_col = 'Accuracy' if problem_type == "classification" else 'R² Score'
+            costed = results_df.dropna(subset=[FIT_TIME])
+            fig = px.scatter(costed, x=FIT_TIME, y=score_col, text='Model', log_x=True,
+                             size=costed[latency_column(1)].clip(lower=1e-9), size_max=30,
+                             hover_data=[col for col in COST_COLUMNS if col in costed],
+                             title=f"{score_col} vs Fit Time (marker size: single-row latency)")
+            fig.update_traces(textposition='top center')
+            render_chart(fig, rows=len(costed))
+        
+        # Save to session state
+        st.session_state['model_results'] = results
+        st.session_state['best_model'] = best_model['Model Object']
+        st.session_state['best_model_name'] = best_model['Model']
+        st.session_state['best_score'] = best_model['Accuracy'] if problem_type == "classification" else best_model['R² Score']
+        st.session_state['problem_type'] = problem_type
+        st.session_state['feature_names'] = run_info['features']
+        st.session_state['feature_dtypes'] = run_info['feature_dtypes']
+        st.session_state['model_classes'] = run_info['classes']
+        st.session_state['model_target'] = run_info['target']
+        
+        # Celebrate each finished run once, not on every rerun that shows it
+        if st.session_state.get('celebrated_job') != training_status['id']:
+            st.session_state['celebrated_job'] = training_status['id']
             st.balloons()
 
+# -------------------------
+# Score New Data
+# -------------------------
+st.markdown("---")
+st.subheader("📤 Score New Data")
+
+# Session best model first, then every stored run that can be scored
+scorers = {}
+if 'best_model' in st.session_state and 'feature_dtypes' in st.session_state:
+    scorers[f"🏆 Best model of this session ({st.session_state['best_model_name']})"] = (
+        lambda: st.session_state['best_model'],
+        st.session_state['feature_dtypes'], st.session_state.get('model_classes'), None
+    )
+stored_runs = registry()
+if not stored_runs.empty and 'feature_dtypes' in stored_runs:
+    for run in stored_runs.dropna(subset=['feature_dtypes']).itertuples():
+        scorers[f"📦 {run.model} → {run.target} ({run.created})"] = (
+            lambda key=run.key: load_artifact(key)['model'],
+            run.feature_dtypes, run.classes if isinstance(run.classes, list) else None, run.key
+        )
+
+if not scorers:
+    st.info("Train a model (or store one in the registry) to score new data.")
+else:
+    scorer = st.selectbox("Model:", list(scorers))
+    load_model, scorer_dtypes, scorer_classes, scorer_key = scorers[scorer]
+    st.caption(f"Needs columns: {', '.join(scorer_dtypes)}")
+    
+    with st.expander("🌐 Serve this model over HTTP (real-time scoring)"):
+        st.caption("Requests are micro-batched into one vectorized prediction; "
+                   "POST /model swaps the served model without a restart.")
+        if scorer_key is not None:
+            serve_args = f"--model {scorer_key}"
+        else:
+            bundle_path = EXPORT_DIR / "session_best_model.joblib"
+            if st.button("📦 Export for the inference server"):
+                export_bundle(bundle_path, load_model(), scorer_dtypes, scorer_classes,
+                              st.session_state['best_model_name'])
+                st.success(f"✅ Exported to {bundle_path}")
+            serve_args = f"--bundle {bundle_path}"
+        st.code(f"python inference_server.py serve {serve_args}\n"
+                f"python inference_server.py loadtest --data new_records.csv --concurrency 16", language="bash")
+    
+    input_mode = st.radio("Input:", ["Upload file", "File path on server"], horizontal=True)
+    if input_mode == "Upload file":
+        source = st.file_uploader("New records (CSV or Parquet):", type=list(STREAMABLE_FORMATS))
+    else:
+        source = st.text_input("Path to a CSV or Parquet file:").strip() or None
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.session_state.setdefault(
+            'scoring_output', str(SCORING_OUTPUT_DIR / f"predictions_{datetime.now():%Y%m%d_%H%M%S}.parquet")
+        )
+        output_path = st.text_input("Output Parquet file:", key='scoring_output')
+    with col2:
+        chunk_rows = st.number_input("Rows per chunk:", 1_000, 5_000_000, SCORING_CHUNK_ROWS, step=10_000)
+    
+    if source is not None:
+        try:
+            keep_columns = st.multiselect("Columns to copy into the output (IDs):",
+                                          [col for col in input_columns(source) if col not in scorer_dtypes])
+        except Exception as e:
+            st.error(f"❌ Cannot read input: {str(e)}")
+            keep_columns = None
+        
+        if keep_columns is not None and st.button("▶️ Score", type="primary"):
+            scoring_status = st.empty()
+            
+            def show_scoring_progress(rows_done, elapsed):
+                scoring_status.text(f"Scored {rows_done:,} rows ({rows_done / max(elapsed, 1e-9):,.0f} rows/s)")
+            
+            try:
+                summary = score_to_parquet(load_model(), source, output_path, scorer_dtypes, scorer_classes,
+                                           keep_columns, chunk_rows=int(chunk_rows),
+                                           on_progress=show_scoring_progress)
+                scoring_status.empty()
+                st.success(f"✅ Scored {summary['rows']:,} rows in {summary['seconds']:.1f}s "
+                           f"({summary['rows_per_second']:,.0f} rows/s) → {summary['output']}")
+                st.dataframe(preview_parquet(summary['output']), use_container_width=True)
+                if Path(summary['output']).stat().st_size <= MAX_DOWNLOAD_BYTES:
+                    with open(summary['output'], 'rb') as f:
+                        st.download_button("📥 Download predictions (Parquet)", f.read(),
+                                           file_name=Path(summary['output']).name)
+            except Exception as e:
+                st.error(f"❌ Scoring failed: {str(e)}")
+
+# -------------------------
+# Model Registry
+# -------------------------
+with st.expander("🗄️ Model Registry (stored training runs)"):
+    only_current = st.checkbox("Only runs on the current dataset", value=True)
+    runs = registry(dataset=dataset_fingerprint(df)) if only_current else registry()
+    if runs.empty:
+        st.caption("No stored runs yet")
+    else:
+        display_runs = runs.drop(columns=['key']).copy()
+        for col in ['features', 'config', 'best_params']:
+            display_runs[col] = display_runs[col].astype(str)
+        st.dataframe(display_runs, use_container_width=True)
+        st.caption(f"{len(runs)} runs · {runs['size_kb'].sum() / 1024:.1f} MB")
+        if st.button("🗑️ Delete listed runs"):
+            delete_artifacts(runs['key'].tolist())
+            st.rerun()
+
+jobs_panel()
+
+performance_panel()
+
 chatbot_sidebar()
@@ -11,6 +11,12 @@ import plotly.express as px
 from scipy import stats
 
 from chatbot import chatbot_sidebar
+from render_metrics import render_chart, perf_mark, performance_panel
+from time_cube import get_time_cube
+from dataset_version import dataset_fingerprint
+from screening import cached_screen, forest_figure, CORRECTIONS
+from encoding import encode_frame
+from jobs import start_job, job_status, job_active, job_result, jobs_panel, run_on_pool
 
 st.session_state["page_name"] = "Epidemiological Models"
 
@@ -23,7 +29,28 @@ if "dataset" not in st.session_state:
     st.warning("⚠️ Please upload a dataset first.")
     st.stop()
 
-df = st.session_state["dataset"].copy()
+df = st.session_state["dataset"]
+perf_mark()
+
+
+def fit_cox_model(cox_df, duration_col, event_col, min_level_count, max_levels):
+    """Encode categoricals, drop incomplete rows and fit a Cox PH model."""
+    categorical_cols = cox_df.drop(columns=[duration_col, event_col]).select_dtypes(
+        include=['object', 'category']).columns
+    if len(categorical_cols) > 0:
+        cox_df = encode_frame(cox_df, categorical_cols, min_level_count, max_levels)
+    cox_df = cox_df.dropna()
+    
+    cph = CoxPHFitter()
+    cph.fit(cox_df, duration_col=duration_col, event_col=event_col)
+    return cph
+
+
+def fit_cox(job, cox_df, duration_col, event_col, min_level_count, max_levels):
+    """Background job: fit_cox_model in a training pool worker, off the server process."""
+    job.update(0.0, f"Fitting on {len(cox_df):,} rows")
+    return run_on_pool(job, fit_cox_model, cox_df, duration_col, event_col, min_level_count, max_levels)
+
 
 # -------------------------
 # Model Selection
@@ -38,11 +65,23 @@ model_type = st.sidebar.selectbox(
         "Poisson Regression (Incidence Rates)",
         "Logistic Regression (Odds Ratios)",
         "Risk Ratios & Relative Risk",
+        "Outbreak Exposure Screening",
         "Standardized Mortality Ratio (SMR)",
         "Epidemic Curve Analysis"
     ]
 )
 
+# Regression models below expand categoricals into one column per level;
+# pooling rare levels bounds that width for high-cardinality columns
+if model_type in ("Cox Proportional Hazards", "Poisson Regression (Incidence Rates)",
+                  "Logistic Regression (Odds Ratios)"):
+    min_level_count = st.sidebar.number_input(
+        "Pool categorical levels with fewer rows than:", 1, 10000, 1,
+        help="Rare levels are combined into one '<column>_Other' term"
+    )
+    max_levels = st.sidebar.number_input("Max levels per categorical:", 2, 500, 50,
+                                         help="Less frequent levels are pooled into '<column>_Other'")
+
 st.markdown("---")
 
 # ========================
@@ -168,7 +207,7 @@ if model_type == "Survival Analysis (Kaplan-Meier)":
                     censored = len(df) - total_events
                     st.metric("Censored", f"{int(censored)}")
             
-            st.plotly_chart(fig, use_container_width=True)
+            render_chart(fig, rows=len(df))
             
             # Save to session state
             st.session_state['survival_results'] = {
@@ -203,122 +242,115 @@ elif model_type == "Cox Proportional Hazards":
         [col for col in df.columns if col not in [duration_col, event_col]]
     )
     
-    if st.button("🚀 Run Cox PH Model", type="primary"):
+    if st.button("🚀 Run Cox PH Model", type="primary", disabled=job_active('cox_job')):
         if not covariates:
             st.warning("⚠️ Please select at least one covariate.")
         else:
-            try:
-                # Prepare data
-                cox_df = df[[duration_col, event_col] + covariates].copy()
-                
-                # Handle categorical variables
-                categorical_cols = cox_df[covariates].select_dtypes(include=['object', 'category']).columns
-                if len(categorical_cols) > 0:
-                    cox_df = pd.get_dummies(cox_df, columns=categorical_cols, drop_first=True)
-                
-                # Remove missing values
-                cox_df = cox_df.dropna()
-                
-                # Fit Cox model
-                cph = CoxPHFitter()
-                cph.fit(cox_df, duration_col=duration_col, event_col=event_col)
-                
-                # Display summary
-                st.markdown("#### 📋 Cox PH Model Results")
-                
-                results_df = cph.summary
-                results_df['HR'] = np.exp(results_df['coef'])
-                results_df['HR_95%_Lower'] = np.exp(results_df['coef lower 95%'])
-                results_df['HR_95%_Upper'] = np.exp(results_df['coef upper 95%'])
-                
-                display_df = results_df[['coef', 'HR', 'HR_95%_Lower', 'HR_95%_Upper', 'p']].copy()
-                display_df.columns = ['Coefficient', 'Hazard Ratio', 'HR 95% CI Lower', 'HR 95% CI Upper', 'p-value']
-                
-                st.dataframe(display_df.style.format({
-                    'Coefficient': '{:.4f}',
-                    'Hazard Ratio': '{:.4f}',
-                    'HR 95% CI Lower': '{:.4f}',
-                    'HR 95% CI Upper': '{:.4f}',
-                    'p-value': '{:.4f}'
-                }), use_container_width=True)
-                
-                # Interpretation
-                st.markdown("#### 🔍 Interpretation")
-                for var in display_df.index:
-                    hr = display_df.loc[var, 'Hazard Ratio']
-                    p_val = display_df.loc[var, 'p-value']
-                    
-                    if p_val < 0.05:
-                        if hr > 1:
-                            pct_increase = (hr - 1) * 100
-                            st.warning(f"**{var}**: HR = {hr:.2f} (p={p_val:.4f}) - {pct_increase:.1f}% **increased** hazard")
-                        else:
-                            pct_decrease = (1 - hr) * 100
-                            st.success(f"**{var}**: HR = {hr:.2f} (p={p_val:.4f}) - {pct_decrease:.1f}% **decreased** hazard (protective)")
+            # Large survival fits run in the background and survive reruns
+            start_job('cox_job', 'cox', fit_cox, df[[duration_col, event_col] + covariates], duration_col,
+                      event_col, min_level_count, max_levels, label=f"Cox PH model ({duration_col})")
+    
+    cox_status = job_status('cox_job')
+    if cox_status is not None and cox_status['state'] == 'done':
+        try:
+            cph = job_result(cox_status['id'])
+            
+            # Display summary
+            st.markdown("#### 📋 Cox PH Model Results")
+            
+            results_df = cph.summary
+            results_df['HR'] = np.exp(results_df['coef'])
+            results_df['HR_95%_Lower'] = np.exp(results_df['coef lower 95%'])
+            results_df['HR_95%_Upper'] = np.exp(results_df['coef upper 95%'])
+            
+            display_df = results_df[['coef', 'HR', 'HR_95%_Lower', 'HR_95%_Upper', 'p']].copy()
+            display_df.columns = ['Coefficient', 'Hazard Ratio', 'HR 95% CI Lower', 'HR 95% CI Upper', 'p-value']
+            
+            st.dataframe(display_df.style.format({
+                'Coefficient': '{:.4f}',
+                'Hazard Ratio': '{:.4f}',
+                'HR 95% CI Lower': '{:.4f}',
+                'HR 95% CI Upper': '{:.4f}',
+                'p-value': '{:.4f}'
+            }), use_container_width=True)
+            
+            # Interpretation
+            st.markdown("#### 🔍 Interpretation")
+            for var in display_df.index:
+                hr = display_df.loc[var, 'Hazard Ratio']
+                p_val = display_df.loc[var, 'p-value']
+                
+                if p_val < 0.05:
+                    if hr > 1:
+                        pct_increase = (hr - 1) * 100
+                        st.warning(f"**{var}**: HR = {hr:.2f} (p={p_val:.4f}) - {pct_increase:.1f}% **increased** hazard")
                     else:
-                        st.info(f"**{var}**: HR = {hr:.2f} (p={p_val:.4f}) - Not statistically significant")
-                
-                # Forest plot
-                st.markdown("#### 🌲 Forest Plot (Hazard Ratios)")
-                
-                fig = go.Figure()
-                
-                y_pos = list(range(len(display_df)))
-                
-                # Add confidence intervals
-                for i, var in enumerate(display_df.index):
-                    fig.add_trace(go.Scatter(
-                        x=[display_df.loc[var, 'HR 95% CI Lower'], display_df.loc[var, 'HR 95% CI Upper']],
-                        y=[i, i],
-                        mode='lines',
-                        line=dict(color='gray', width=2),
-                        showlegend=False
-                    ))
-                
-                # Add point estimates
+                        pct_decrease = (1 - hr) * 100
+                        st.success(f"**{var}**: HR = {hr:.2f} (p={p_val:.4f}) - {pct_decrease:.1f}% **decreased** hazard (protective)")
+                else:
+                    st.info(f"**{var}**: HR = {hr:.2f} (p={p_val:.4f}) - Not statistically significant")
+            
+            # Forest plot
+            st.markdown("#### 🌲 Forest Plot (Hazard Ratios)")
+            
+            fig = go.Figure()
+            
+            y_pos = list(range(len(display_df)))
+            
+            # Add confidence intervals
+            for i, var in enumerate(display_df.index):
                 fig.add_trace(go.Scatter(
-                    x=display_df['Hazard Ratio'],
-                    y=y_pos,
-                    mode='markers',
-                    marker=dict(size=10, color='blue'),
-                    name='Hazard Ratio',
-                    text=[f"HR: {hr:.2f}" for hr in display_df['Hazard Ratio']],
-                    hovertemplate='%{text}<br>%{x:.2f}<extra></extra>'
+                    x=[display_df.loc[var, 'HR 95% CI Lower'], display_df.loc[var, 'HR 95% CI Upper']],
+                    y=[i, i],
+                    mode='lines',
+                    line=dict(color='gray', width=2),
+                    showlegend=False
                 ))
-                
-                # Add reference line at HR=1
-                fig.add_vline(x=1, line_dash="dash", line_color="red", annotation_text="HR=1 (No effect)")
-                
-                fig.update_layout(
-                    title="Hazard Ratios with 95% Confidence Intervals",
-                    xaxis_title="Hazard Ratio (log scale)",
-                    yaxis=dict(
-                        tickmode='array',
-                        tickvals=y_pos,
-                        ticktext=display_df.index
-                    ),
-                    xaxis_type="log",
-                    height=max(400, len(display_df) * 50)
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Model diagnostics
-                st.markdown("#### 🔬 Model Diagnostics")
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.metric("Concordance Index", f"{cph.concordance_index_:.4f}")
-                    st.caption("Values > 0.5 indicate predictive ability (0.7-0.8 is good)")
-                
-                with col2:
-                    st.metric("Log-Likelihood", f"{cph.log_likelihood_:.2f}")
-                
-                # Save to session state
-                st.session_state['cox_model'] = cph
-                
-            except Exception as e:
-                st.error(f"❌ Error in Cox model: {str(e)}")
+            
+            # Add point estimates
+            fig.add_trace(go.Scatter(
+                x=display_df['Hazard Ratio'],
+                y=y_pos,
+                mode='markers',
+                marker=dict(size=10, color='blue'),
+                name='Hazard Ratio',
+                text=[f"HR: {hr:.2f}" for hr in display_df['Hazard Ratio']],
+                hovertemplate='%{text}<br>%{x:.2f}<extra></extra>'
+            ))
+            
+            # Add reference line at HR=1
+            fig.add_vline(x=1, line_dash="dash", line_color="red", annotation_text="HR=1 (No effect)")
+            
+            fig.update_layout(
+                title="Hazard Ratios with 95% Confidence Intervals",
+                xaxis_title="Hazard Ratio (log scale)",
+                yaxis=dict(
+                    tickmode='array',
+                    tickvals=y_pos,
+                    ticktext=display_df.index
+                ),
+                xaxis_type="log",
+                height=max(400, len(display_df) * 50)
+            )
+            
+            render_chart(fig, rows=len(df))
+            
+            # Model diagnostics
+            st.markdown("#### 🔬 Model Diagnostics")
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.metric("Concordance Index", f"{cph.concordance_index_:.4f}")
+                st.caption("Values > 0.5 indicate predictive ability (0.7-0.8 is good)")
+            
+            with col2:
+                st.metric("Log-Likelihood", f"{cph.log_likelihood_:.2f}")
+            
+            # Save to session state
+            st.session_state['cox_model'] = cph
+            
+        except Exception as e:
+            st.error(f"❌ Error in Cox model: {str(e)}")
 
 # ========================
 # POISSON REGRESSION
@@ -354,7 +386,7 @@ elif model_type == "Poisson Regression (Incidence Rates)":
                 # Handle categorical variables
                 categorical_cols = model_df[predictors].select_dtypes(include=['object', 'category']).columns
                 if len(categorical_cols) > 0:
-                    model_df = pd.get_dummies(model_df, columns=categorical_cols, drop_first=True)
+                    model_df = encode_frame(model_df, categorical_cols, min_level_count, max_levels)
                 
                 model_df = model_df.dropna()
                 
@@ -457,7 +489,7 @@ elif model_type == "Logistic Regression (Odds Ratios)":
                 # Handle categorical variables
                 categorical_cols = model_df[predictors].select_dtypes(include=['object', 'category']).columns
                 if len(categorical_cols) > 0:
-                    model_df = pd.get_dummies(model_df, columns=categorical_cols, drop_first=True)
+                    model_df = encode_frame(model_df, categorical_cols, min_level_count, max_levels)
                 
                 model_df = model_df.dropna()
                 
@@ -546,7 +578,7 @@ elif model_type == "Logistic Regression (Odds Ratios)":
                     height=max(400, len(plot_df) * 50)
                 )
                 
-                st.plotly_chart(fig, use_container_width=True)
+                render_chart(fig, rows=len(df))
                 
                 # Model performance
                 st.markdown("#### 📊 Model Performance")
@@ -687,6 +719,65 @@ elif model_type == "Risk Ratios & Relative Risk":
         except Exception as e:
             st.error(f"❌ Error: {str(e)}")
 
+# ========================
+# OUTBREAK EXPOSURE SCREENING
+# ========================
+elif model_type == "Outbreak Exposure Screening":
+    st.subheader("🔎 Outbreak Exposure Screening")
+    
+    st.info("""
+    **Exposure Screening**: Builds the 2x2 table of every binary exposure (foods, activities, contacts) against the outcome
+    in one pass and ranks them by p-value. Fisher's exact test is used for sparse tables and p-values are adjusted
+    for multiple testing.
+    """)
+    
+    outcome_col = st.selectbox("🎯 Binary Outcome (ill / not ill):", df.columns)
+    candidates = [col for col in df.columns if col != outcome_col]
+    exposure_cols = st.multiselect("🍽️ Exposures to screen:", candidates, default=candidates)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        correction = st.selectbox("🧮 Multiple-testing correction:", list(CORRECTIONS.keys()))
+    with col2:
+        alpha = st.select_slider("Significance level:", [0.01, 0.05, 0.10], value=0.05)
+    
+    if st.button("🚀 Screen Exposures", type="primary"):
+        try:
+            results, skipped = cached_screen(df, outcome_col, exposure_cols, CORRECTIONS[correction], alpha)
+            
+            if skipped:
+                st.caption(f"Skipped {len(skipped)} non-binary columns: {', '.join(map(str, skipped[:10]))}"
+                           + ("..." if len(skipped) > 10 else ""))
+            
+            if results.empty:
+                st.warning("⚠️ No binary exposures to screen")
+            else:
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Exposures Screened", len(results))
+                with col2:
+                    st.metric("Significant (adjusted)", int(results['Significant'].sum()))
+                with col3:
+                    top = results.index[0]
+                    st.metric("Top Exposure", str(top), f"RR {results.loc[top, 'RR']:.2f}")
+                
+                st.markdown("#### 🌲 Risk Ratios (ranked by adjusted p-value)")
+                render_chart(forest_figure(results, "RR"), rows=len(df))
+                
+                st.markdown("#### 📋 Attack Rate Table")
+                st.dataframe(results.style.format({
+                    'Attack Rate Exposed': '{:.1%}', 'Attack Rate Unexposed': '{:.1%}',
+                    'RR': '{:.2f}', 'RR CI Lower': '{:.2f}', 'RR CI Upper': '{:.2f}',
+                    'OR': '{:.2f}', 'OR CI Lower': '{:.2f}', 'OR CI Upper': '{:.2f}',
+                    'Chi-square': '{:.2f}', 'p-value': '{:.4g}', 'Adjusted p-value': '{:.4g}'
+                }), use_container_width=True)
+                
+                st.download_button("📥 Download Results (CSV)", results.to_csv(),
+                                   file_name=f"exposure_screening_{outcome_col}.csv", mime="text/csv")
+                
+        except Exception as e:
+            st.error(f"❌ Error: {str(e)}")
+
 # ========================
 # SMR (Standardized Mortality Ratio)
 # ========================
@@ -781,7 +872,7 @@ elif model_type == "Standardized Mortality Ratio (SMR)":
                     height=max(400, len(smr_df) * 50)
                 )
                 
-                st.plotly_chart(fig, use_container_width=True)
+                render_chart(fig, rows=len(df))
                 
             else:
                 # Overall SMR
@@ -846,50 +937,50 @@ elif model_type == "Epidemic Curve Analysis":
     
     group_by_col = st.selectbox("👥 Group By (optional):", ["None"] + [col for col in df.columns if col not in [date_col, case_col]])
     
-    time_unit = st.radio("⏰ Time Unit:", ["Day", "Week", "Month"], horizontal=True)
+    time_unit = st.radio("⏰ Time Unit:", ["Day", "Week", "Epi Week (MMWR)", "Month"], horizontal=True)
     
+    # The curve stays shown only for the dataset version and columns it was
+    # generated for; the time unit, split and zoom are explored from the cube
+    epicurve_inputs = (dataset_fingerprint(df), date_col, case_col, group_by_col)
     if st.button("🚀 Generate Epidemic Curve", type="primary"):
+        st.session_state["epicurve_generated"] = epicurve_inputs
+    
+    if st.session_state.get("epicurve_generated") == epicurve_inputs:
         try:
-            # Convert to datetime
-            df_epi = df.copy()
-            df_epi[date_col] = pd.to_datetime(df_epi[date_col])
-            
-            # Group by time unit
-            if time_unit == "Day":
-                df_epi['time_period'] = df_epi[date_col].dt.date
-            elif time_unit == "Week":
-                df_epi['time_period'] = df_epi[date_col].dt.to_period('W').apply(lambda r: r.start_time)
-            else:  # Month
-                df_epi['time_period'] = df_epi[date_col].dt.to_period('M').apply(lambda r: r.start_time)
-            
-            # Aggregate cases
-            if case_col != "None":
-                if group_by_col != "None":
-                    epi_data = df_epi.groupby(['time_period', group_by_col])[case_col].sum().reset_index()
-                    
-                    fig = px.bar(epi_data, x='time_period', y=case_col, color=group_by_col,
-                                title=f"Epidemic Curve by {time_unit} (Grouped by {group_by_col})",
-                                labels={'time_period': f'{time_unit}', case_col: 'Number of Cases'})
-                else:
-                    epi_data = df_epi.groupby('time_period')[case_col].sum().reset_index()
-                    
-                    fig = px.bar(epi_data, x='time_period', y=case_col,
-                                title=f"Epidemic Curve by {time_unit}",
-                                labels={'time_period': f'{time_unit}', case_col: 'Number of Cases'})
+            # Pre-aggregated once per dataset/column choice; time unit, group
+            # and zoom changes are served from the cube without touching df
+            cube = get_time_cube(
+                df, date_col,
+                case_col if case_col != "None" else None,
+                [group_by_col] if group_by_col != "None" else []
+            )
+            if cube.rows == 0:
+                raise ValueError(f"No valid dates in '{date_col}'")
+            
+            split = group_by_col != "None" and st.checkbox(f"Split by {group_by_col}", value=True)
+            
+            first, last = cube.date_range
+            zoom = (first.date(), last.date())
+            if first < last:
+                zoom = st.slider("📆 Date range:", min_value=first.date(), max_value=last.date(), value=zoom)
+            
+            epi_data = cube.series(
+                time_unit, by=group_by_col if split else None, start=zoom[0], end=zoom[1]
+            ).rename(columns={'period': 'time_period'})
+            st.caption(f"Time cube: {cube.rows:,} dated rows pre-aggregated into {cube.nbytes / 1024:,.1f} KB")
+            
+            if split:
+                fig = px.bar(epi_data, x='time_period', y='cases', color=group_by_col,
+                            hover_data={'label': True},
+                            title=f"Epidemic Curve by {time_unit} (Grouped by {group_by_col})",
+                            labels={'time_period': f'{time_unit}', 'cases': 'Number of Cases'})
+                # Summary statistics use the overall curve
+                epi_data = epi_data.groupby(['time_period', 'label'], as_index=False)['cases'].sum()
             else:
-                # Count rows as cases
-                if group_by_col != "None":
-                    epi_data = df_epi.groupby(['time_period', group_by_col]).size().reset_index(name='cases')
-                    
-                    fig = px.bar(epi_data, x='time_period', y='cases', color=group_by_col,
-                                title=f"Epidemic Curve by {time_unit} (Grouped by {group_by_col})",
-                                labels={'time_period': f'{time_unit}', 'cases': 'Number of Cases'})
-                else:
-                    epi_data = df_epi.groupby('time_period').size().reset_index(name='cases')
-                    
-                    fig = px.bar(epi_data, x='time_period', y='cases',
-                                title=f"Epidemic Curve by {time_unit}",
-                                labels={'time_period': f'{time_unit}', 'cases': 'Number of Cases'})
+                fig = px.bar(epi_data, x='time_period', y='cases',
+                            hover_data={'label': True},
+                            title=f"Epidemic Curve by {time_unit}",
+                            labels={'time_period': f'{time_unit}', 'cases': 'Number of Cases'})
             
             fig.update_layout(
                 xaxis_title=f"Date ({time_unit})",
@@ -897,21 +988,21 @@ elif model_type == "Epidemic Curve Analysis":
                 hovermode='x unified'
             )
             
-            st.plotly_chart(fig, use_container_width=True)
+            render_chart(fig, rows=len(df))
             
             # Summary statistics
             st.markdown("#### 📊 Outbreak Summary")
             
-            total_cases = epi_data['cases'].sum() if 'cases' in epi_data.columns else epi_data[case_col].sum()
-            peak_date = epi_data.loc[epi_data[['cases', case_col][0 if 'cases' in epi_data.columns else 1]].idxmax(), 'time_period']
-            peak_cases = epi_data[['cases', case_col][0 if 'cases' in epi_data.columns else 1]].max()
+            total_cases = epi_data['cases'].sum()
+            peak_date = epi_data.loc[epi_data['cases'].idxmax(), 'label']
+            peak_cases = epi_data['cases'].max()
             
             col1, col2, col3 = st.columns(3)
             
             with col1:
                 st.metric("Total Cases", f"{total_cases:.0f}")
             with col2:
-                st.metric("Peak Date", str(peak_date)[:10])
+                st.metric("Peak Period", peak_date)
             with col3:
                 st.metric("Peak Cases", f"{peak_cases:.0f}")
             
@@ -920,7 +1011,7 @@ elif model_type == "Epidemic Curve Analysis":
             
             # Calculate growth rate
             if len(epi_data) > 1:
-                case_series = epi_data['cases'] if 'cases' in epi_data.columns else epi_data[case_col]
+                case_series = epi_data['cases']
                 
                 # Simple classification
                 first_half = case_series[:len(case_series)//2].mean()
@@ -947,4 +1038,8 @@ elif model_type == "Epidemic Curve Analysis":
         except Exception as e:
             st.error(f"❌ Error: {str(e)}")
 
+jobs_panel()
+
+performance_panel()
+
 chatbot_sidebar()
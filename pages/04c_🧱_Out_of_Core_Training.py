@@ -0,0 +1,146 @@
+import streamlit as st
+import pandas as pd
+from pathlib import Path
+import plotly.express as px
+
+from chatbot import chatbot_sidebar
+from render_metrics import render_chart, perf_mark, performance_panel
+from scoring import input_columns, SCORING_CHUNK_ROWS
+from artifacts import export_bundle, EXPORT_DIR
+from incremental import train_incremental, INCREMENTAL_MODELS, CHECKPOINT_EVERY
+from jobs import start_job, job_status, job_active, job_result, jobs_panel
+
+st.session_state["page_name"] = "Out-of-Core Training"
+
+st.title("🧱 Out-of-Core Training (files larger than memory)")
+
+st.markdown("""
+Train directly on a CSV or Parquet file on the server, one chunk at a time.
+The file is never loaded as a whole: a first pass fits the preprocessing and
+sets aside a holdout sample, then models learn incrementally from each chunk.
+""")
+perf_mark()
+
+# -------------------------
+# Source file
+# -------------------------
+source = st.text_input("Path to a CSV or Parquet file on the server:").strip()
+if not source:
+    st.info("Enter the path of a training file to continue.")
+    st.stop()
+if not Path(source).is_file():
+    st.error(f"❌ File not found: {source}")
+    st.stop()
+
+try:
+    columns = input_columns(source)
+except Exception as e:
+    st.error(f"❌ Cannot read file: {str(e)}")
+    st.stop()
+
+size_mb = Path(source).stat().st_size / 1024 ** 2
+st.caption(f"{len(columns)} columns · {size_mb:,.1f} MB on disk")
+
+# -------------------------
+# Target and features
+# -------------------------
+col1, col2 = st.columns(2)
+with col1:
+    target = st.selectbox("Target Variable:", columns)
+with col2:
+    problem_type = st.radio("Problem Type:", ["classification", "regression"], horizontal=True,
+                            format_func=str.title)
+
+features = st.multiselect("Features:", [col for col in columns if col != target],
+                          default=[col for col in columns if col != target])
+if not features:
+    st.warning("⚠️ Select at least one feature.")
+    st.stop()
+
+# -------------------------
+# Training settings
+# -------------------------
+model_name = st.selectbox("Model:", list(INCREMENTAL_MODELS[problem_type]))
+
+col1, col2, col3 = st.columns(3)
+with col1:
+    chunk_rows = st.number_input("Rows per chunk:", 1_000, 5_000_000, SCORING_CHUNK_ROWS, step=10_000)
+with col2:
+    holdout_pct = st.slider("Holdout (%):", 1, 50, 10)
+with col3:
+    epochs = st.number_input("Passes over the file (epochs):", 1, 50, 1)
+
+col1, col2 = st.columns(2)
+with col1:
+    min_level_count = st.number_input(
+        "Pool categorical levels with fewer rows than:", 1, 100_000, 1,
+        help="Rare levels are combined into one 'Other' column"
+    )
+with col2:
+    resume = st.checkbox("Resume an interrupted run", value=True,
+                         help=f"Progress is checkpointed every {CHECKPOINT_EVERY} chunks")
+
+# -------------------------
+# Train
+# -------------------------
+def run_incremental_job(job, name, *args, **kwargs):
+    """Background job: train_incremental with its progress reported to the job."""
+    def show_progress(stage, done, total, elapsed):
+        unit = "rounds" if stage == "Boosting" else "rows"
+        # A cancelled job stops here; its last checkpoint can be resumed
+        job.update(done / total if total else None,
+                   f"{stage}: {done:,} {unit} ({done / max(elapsed, 1e-9):,.0f} {unit}/s)")
+
+    model, feature_dtypes, classes, curve, summary = train_incremental(*args, on_progress=show_progress, **kwargs)
+    return {"model": model, "feature_dtypes": feature_dtypes, "classes": classes, "curve": curve,
+            "summary": summary, "name": name}
+
+
+if st.button("🚀 Train", type="primary", disabled=job_active('incremental_job')):
+    start_job('incremental_job', 'incremental training', run_incremental_job, f"{model_name} → {target}",
+              source, features, target, model_name, problem_type, chunk_rows=int(chunk_rows),
+              holdout_fraction=holdout_pct / 100, epochs=int(epochs), min_frequency=int(min_level_count),
+              resume=resume, label=f"Out-of-core {model_name} → {target}")
+
+# -------------------------
+# Results
+# -------------------------
+training_status = job_status('incremental_job')
+if training_status is not None and training_status['state'] == 'done':
+    run = job_result(training_status['id'])
+    summary = run['summary']
+    st.markdown("---")
+    st.subheader(f"📊 Results: {run['name']}")
+    st.success(f"✅ Trained on {summary['rows_trained']:,} rows in {summary['seconds']:.1f}s "
+               f"({summary['rows_per_second']:,.0f} rows/s); "
+               f"{summary['holdout_rows']:,} holdout rows")
+
+    metrics = {k: v for k, v in summary.items()
+               if k not in ("rows", "rows_trained", "holdout_rows", "seconds", "rows_per_second")}
+    if metrics:
+        st.dataframe(pd.DataFrame([metrics]).round(4), use_container_width=True)
+
+    curve = run['curve']
+    if not curve.empty and curve['holdout_score'].notna().any():
+        x = 'round' if 'round' in curve else 'rows_trained'
+        score_name = "Accuracy" if run['classes'] is not None else "R²"
+        fig = px.line(curve, x=x, y='holdout_score', markers=True,
+                      color='epoch' if 'epoch' in curve and curve['epoch'].nunique() > 1 else None,
+                      labels={'holdout_score': f"Holdout {score_name}",
+                              'rows_trained': "Rows trained", 'round': "Boosting round"},
+                      title="Learning Curve")
+        render_chart(fig, "incremental_learning_curve", rows=len(curve), use_container_width=True)
+
+    with st.expander("🌐 Serve this model over HTTP (real-time scoring)"):
+        bundle_path = EXPORT_DIR / "incremental_model.joblib"
+        if st.button("📦 Export for the inference server"):
+            export_bundle(bundle_path, run['model'], run['feature_dtypes'], run['classes'], run['name'])
+            st.success(f"✅ Exported to {bundle_path}")
+        st.code(f"python inference_server.py serve --bundle {bundle_path}\n"
+                f"python inference_server.py loadtest --data new_records.csv --concurrency 16", language="bash")
+
+jobs_panel()
+
+performance_panel()
+
+chatbot_sidebar()
@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import seaborn as sns
 import plotly.express as px
 import plotly.graph_objects as go
@@ -14,6 +15,9 @@ from reportlab.lib import colors
 from reportlab.lib.units import inch
 
 from chatbot import chatbot_sidebar
+from render_metrics import render_chart, perf_mark, performance_panel
+from correlation import cached_correlation, top_k_pairs
+from jobs import start_job, job_status, job_active, job_result, jobs_panel
 
 st.session_state["page_name"] = "Report"
 
@@ -28,6 +32,7 @@ if "dataset" not in st.session_state or "uploaded_filename" not in st.session_st
 
 df = st.session_state["dataset"]
 dataset_name = st.session_state["uploaded_filename"].split(".")[0]
+perf_mark()
 
 # -------------------------
 # Report Options
@@ -71,11 +76,12 @@ if include_correlations:
     num_cols = df.select_dtypes(include=[np.number]).columns
     if len(num_cols) > 1:
         with st.expander("🌡️ Correlation Matrix"):
-            corr = df[num_cols].corr()
-            fig = px.imshow(corr, text_auto='.2f', aspect="auto",
+            perf_mark()
+            corr = cached_correlation(df, num_cols)
+            fig = px.imshow(corr, text_auto='.2f' if len(num_cols) <= 30 else False, aspect="auto",
                           color_continuous_scale='RdBu_r',
                           title="Correlation Heatmap")
-            st.plotly_chart(fig, use_container_width=True)
+            render_chart(fig, "report_correlation_heatmap", rows=len(df))
 
 if include_model_results and "model_results" in st.session_state:
     with st.expander("🤖 Model Results"):
@@ -90,7 +96,11 @@ if include_model_results and "model_results" in st.session_state:
 # -------------------------
 # Generate PDF Function
 # -------------------------
-def generate_pdf_report():
+# Runs as a background job (see jobs.py): no st.* calls or page globals.
+# The data, report options, model results (`model_state`) and the
+# correlation matrix (`corr`, None without that section) are passed in.
+def generate_pdf_report(job, df, model_state, corr, report_title, author_name, dataset_name,
+                        include_stats, include_correlations, include_distributions, include_model_results):
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter,
                           rightMargin=72, leftMargin=72,
@@ -142,7 +152,7 @@ def generate_pdf_report():
         toc_items.append("3. Correlation Analysis")
     if include_distributions:
         toc_items.append("4. Distribution Analysis")
-    if include_model_results and "model_results" in st.session_state:
+    if include_model_results and model_state.get("model_results"):
         toc_items.append("5. Model Results")
     
     for item in toc_items:
@@ -153,6 +163,7 @@ def generate_pdf_report():
     # -------------------------
     # Dataset Overview
     # -------------------------
+    job.update(0.1, "Dataset Overview")
     elements.append(Paragraph("1. Dataset Overview", heading_style))
     
     overview_data = [
@@ -208,6 +219,7 @@ def generate_pdf_report():
     # -------------------------
     # Descriptive Statistics
     # -------------------------
+    job.update(0.3, "Descriptive Statistics")
     if include_stats:
         elements.append(Paragraph("2. Descriptive Statistics", heading_style))
         
@@ -250,21 +262,22 @@ def generate_pdf_report():
     # -------------------------
     # Correlation Analysis
     # -------------------------
+    job.update(0.5, "Correlation Analysis")
     if include_correlations:
-        num_cols = df.select_dtypes(include=[np.number]).columns
-        if len(num_cols) > 1:
+        if corr is not None:
             elements.append(Paragraph("3. Correlation Analysis", heading_style))
             
             # Create correlation heatmap
-            corr = df[num_cols].corr()
-            fig, ax = plt.subplots(figsize=(8, 6))
-            sns.heatmap(corr, annot=True, cmap="coolwarm", center=0, 
+            # A standalone figure: pyplot's global state is not thread-safe
+            fig = Figure(figsize=(8, 6))
+            FigureCanvasAgg(fig)
+            ax = fig.subplots()
+            sns.heatmap(corr, annot=len(corr) <= 20, cmap="coolwarm", center=0, 
                        fmt='.2f', ax=ax, cbar_kws={'shrink': 0.8})
             ax.set_title("Correlation Heatmap")
             
             img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', bbox_inches='tight', dpi=150)
-            plt.close(fig)
+            fig.savefig(img_buffer, format='png', bbox_inches='tight', dpi=150)
             img_buffer.seek(0)
             
             elements.append(Image(img_buffer, width=5*inch, height=4*inch))
@@ -272,11 +285,7 @@ def generate_pdf_report():
             
             # Top correlations
             elements.append(Paragraph("Top Correlations", styles['Heading3']))
-            mask = np.triu(np.ones_like(corr, dtype=bool), k=1)
-            corr_pairs = corr.where(mask).stack().reset_index()
-            corr_pairs.columns = ['Variable 1', 'Variable 2', 'Correlation']
-            corr_pairs['Abs'] = corr_pairs['Correlation'].abs()
-            top_corr = corr_pairs.nlargest(10, 'Abs')[['Variable 1', 'Variable 2', 'Correlation']]
+            top_corr = top_k_pairs(corr, k=10)
             
             corr_data = [['Variable 1', 'Variable 2', 'Correlation']]
             for _, row in top_corr.iterrows():
@@ -301,12 +310,13 @@ def generate_pdf_report():
     # -------------------------
     # Model Results
     # -------------------------
-    if include_model_results and "model_results" in st.session_state:
+    job.update(0.8, "Model Results")
+    if include_model_results and model_state.get("model_results"):
         section_num = 4 if include_correlations else 3
         elements.append(Paragraph(f"{section_num}. Model Results", heading_style))
         
-        results = st.session_state["model_results"]
-        problem_type = st.session_state.get("problem_type", "classification")
+        results = model_state["model_results"]
+        problem_type = model_state.get("problem_type") or "classification"
         
         if problem_type == "classification":
             model_data = [["Model", "Accuracy", "Precision", "Recall", "F1-Score"]]
@@ -341,17 +351,17 @@ def generate_pdf_report():
         elements.append(Spacer(1, 20))
         
         # Best model highlight
-        best_model = st.session_state.get("best_model_name", "N/A")
-        best_score = st.session_state.get("best_score", 0)
+        best_model = model_state.get("best_model_name") or "N/A"
+        best_score = model_state.get("best_score") or 0
         
         metric = "Accuracy" if problem_type == "classification" else "R² Score"
         best_text = f"<b>Best Model:</b> {best_model} with {metric} = {best_score:.4f}"
         elements.append(Paragraph(best_text, styles['Normal']))
     
     # Build PDF
+    job.update(0.9, "Build PDF")
     doc.build(elements)
-    buffer.seek(0)
-    return buffer
+    return buffer.getvalue()
 
 # -------------------------
 # Generate HTML Report
@@ -480,16 +490,28 @@ st.subheader("📥 Download Report")
 col1, col2 = st.columns(2)
 
 with col1:
-    if st.button("📄 Generate PDF Report", use_container_width=True, type="primary"):
-        with st.spinner("🎨 Creating PDF report..."):
-            pdf_buffer = generate_pdf_report()
-            st.download_button(
-                label="📥 Download PDF",
-                data=pdf_buffer,
-                file_name=f"{dataset_name}_report.pdf",
-                mime="application/pdf",
-                use_container_width=True
-            )
+    if st.button("📄 Generate PDF Report", use_container_width=True, type="primary",
+                 disabled=job_active('report_job')):
+        model_state = {key: st.session_state.get(key)
+                       for key in ("model_results", "problem_type", "best_model_name", "best_score")}
+        # Same cached matrix as the preview above
+        num_cols = df.select_dtypes(include=[np.number]).columns
+        corr = cached_correlation(df, num_cols) if include_correlations and len(num_cols) > 1 else None
+        start_job('report_job', 'report', generate_pdf_report, df, model_state, corr,
+                  report_title=report_title, author_name=author_name, dataset_name=dataset_name,
+                  include_stats=include_stats, include_correlations=include_correlations,
+                  include_distributions=include_distributions, include_model_results=include_model_results,
+                  label="PDF report")
+    
+    report_status = job_status('report_job')
+    if report_status is not None and report_status['state'] == 'done':
+        st.download_button(
+            label="📥 Download PDF",
+            data=job_result(report_status['id']),
+            file_name=f"{dataset_name}_report.pdf",
+            mime="application/pdf",
+            use_container_width=True
+        )
         st.success("✅ PDF ready for download!")
 
 with col2:
@@ -515,4 +537,8 @@ st.info("""
 - Make sure to complete all analysis steps before generating reports
 """)
 
+jobs_panel()
+
+performance_panel()
+
 chatbot_sidebar()
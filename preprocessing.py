@@ -0,0 +1,102 @@
+
+import numpy as np
+import pandas as pd
+from joblib import Memory
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, OrdinalEncoder, StandardScaler
+
+from artifacts import private_dir
+from encoding import CategoricalEncoder
+
+# Fitted preprocessing steps and the matrices they produce are cached here,
+# keyed by a hash of the input data and the step parameters
+PREPROCESSING_CACHE_DIR = private_dir("preprocessing_cache")
+PREPROCESSING_CACHE_BYTES = 1024 ** 3
+
+# Histogram boosting bins categorical codes with the numeric values, so a
+# column may hold at most 255 levels (rarer ones share the last code)
+MAX_NATIVE_LEVELS = 255
+
+
+def split_columns(X):
+    """(numeric, categorical) feature names; categoricals are object/category columns."""
+    categorical = X.select_dtypes(include=["object", "category"]).columns.tolist()
+    numeric = [col for col in X.columns if col not in categorical]
+    return numeric, categorical
+
+
+def build_preprocessor(numeric_cols, categorical_cols, scale=True, encoding="onehot", min_frequency=1):
+    """Unfitted imputation + encoding (+ scaling) transformer for the page's features.
+
+    Numeric columns are mean-imputed and optionally standardized; categorical
+    columns are mode-imputed and encoded by encoding.CategoricalEncoder
+    (`encoding` strategy, levels rarer than `min_frequency` pooled). The
+    result stays a scipy sparse matrix unless it is mostly non-zero anyway.
+    Because it is fitted inside each training fold, no statistic is ever
+    learned from held-out rows.
+    """
+    numeric_steps = [("impute", SimpleImputer(strategy="mean"))]
+    if scale:
+        numeric_steps.append(("scale", StandardScaler()))
+    categorical_steps = [
+        ("impute", SimpleImputer(strategy="most_frequent")),
+        ("encode", CategoricalEncoder(strategy=encoding, min_frequency=min_frequency)),
+    ]
+    transformers = []
+    if numeric_cols:
+        transformers.append(("numeric", Pipeline(numeric_steps), list(numeric_cols)))
+    if categorical_cols:
+        transformers.append(("categorical", Pipeline(categorical_steps), list(categorical_cols)))
+    return ColumnTransformer(transformers, sparse_threshold=0.3)
+
+
+def _as_text(X):
+    # Mixed str/number columns cannot be ordinal-encoded; missing stays missing
+    X = pd.DataFrame(X)
+    return X.where(X.isna(), X.astype(str))
+
+
+def _as_float32(X):
+    return np.ascontiguousarray(X, dtype=np.float32)
+
+
+def build_native_preprocessor(numeric_cols, categorical_cols, min_frequency=1):
+    """Unfitted transformer for models that handle categoricals and missing values natively.
+
+    No imputation, dummies or scaling: numeric columns pass through with
+    their NaNs, and each categorical column becomes one column of integer
+    codes (missing and unseen levels as NaN, levels rarer than
+    `min_frequency` or beyond MAX_NATIVE_LEVELS pooled into one code). The
+    output is a C-contiguous float32 matrix, numeric columns first; see
+    boosting.py for the models it feeds.
+    """
+    encoder = OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=np.nan,
+                             encoded_missing_value=np.nan, min_frequency=min_frequency,
+                             max_categories=MAX_NATIVE_LEVELS)
+    transformers = []
+    if numeric_cols:
+        transformers.append(("numeric", "passthrough", list(numeric_cols)))
+    if categorical_cols:
+        transformers.append(("categorical", Pipeline([("text", FunctionTransformer(_as_text)),
+                                                      ("encode", encoder)]), list(categorical_cols)))
+    return Pipeline([("columns", ColumnTransformer(transformers, sparse_threshold=0)),
+                     ("float32", FunctionTransformer(_as_float32))])
+
+
+def preprocessing_memory():
+    """Disk cache for fitted preprocessors, trimmed to PREPROCESSING_CACHE_BYTES."""
+    memory = Memory(PREPROCESSING_CACHE_DIR, verbose=0)
+    memory.reduce_size(bytes_limit=PREPROCESSING_CACHE_BYTES)
+    return memory
+
+
+def model_pipeline(preprocessor, estimator, memory=None):
+    """Preprocessor + estimator as one Pipeline.
+
+    With `memory`, the preprocessor's fit_transform is cached on disk, so a
+    fold (or the full training split) seen before reuses its fitted
+    transform and transformed matrix instead of recomputing them.
+    """
+    return Pipeline([("preprocess", preprocessor), ("model", estimator)], memory=memory)
@@ -0,0 +1,122 @@
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+import streamlit as st
+
+# Budgets a single chart should stay under; exceeding either is flagged
+RENDER_BUDGET_MS = 1000
+PAYLOAD_BUDGET_BYTES = 5 * 1024 ** 2
+
+# Renders kept per session (oldest dropped first)
+MAX_LOG_ENTRIES = 1000
+
+# Trace attributes holding one value per plotted point
+_POINT_ATTRS = ("x", "y", "z", "values", "lat", "lon", "locations", "r", "theta")
+
+
+def perf_mark():
+    """Start timing the next chart from now (call at the top of a page or fragment)."""
+    st.session_state["render_mark"] = time.perf_counter()
+
+
+def point_count(fig):
+    """Number of data points across all traces of a plotly figure."""
+    total = 0
+    for trace in fig.data:
+        dimensions = getattr(trace, "dimensions", None)
+        if dimensions:
+            # splom / parcoords: one point per row of each dimension
+            total += len(dimensions) * len(dimensions[0].values or ())
+            continue
+        sizes = [np.size(getattr(trace, attr, None)) for attr in _POINT_ATTRS
+                 if getattr(trace, attr, None) is not None]
+        total += max(sizes, default=0)
+    return int(total)
+
+
+def render_chart(fig, name=None, rows=None, started=None, **kwargs):
+    """st.plotly_chart that records what the chart cost.
+
+    Compute time runs from `started` (a time.perf_counter() value) or from
+    the last perf_mark()/render_chart() call. The entry also stores the
+    point count and `rows` scanned to build it, and is appended to this
+    session's render log.
+
+    Streamlit serializes the figure internally without exposing the result,
+    so the payload size (and serialization time) is only measured, by
+    serializing a second time, while enabled in the performance panel.
+    """
+    now = time.perf_counter()
+    if started is None:
+        started = st.session_state.get("render_mark", now)
+    compute_ms = (now - started) * 1000
+
+    payload_bytes = serialize_ms = None
+    if st.session_state.get("measure_payload"):
+        t0 = time.perf_counter()
+        payload_bytes = len(pio.to_json(fig, validate=False))
+        serialize_ms = (time.perf_counter() - t0) * 1000
+
+    kwargs.setdefault("use_container_width", True)
+    st.plotly_chart(fig, **kwargs)
+
+    title = fig.layout.title.text if fig.layout.title else None
+    entry = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "page": st.session_state.get("page_name", ""),
+        "chart": name or title or (fig.data[0].type if fig.data else "figure"),
+        "compute_ms": round(compute_ms, 1),
+        "serialize_ms": None if serialize_ms is None else round(serialize_ms, 1),
+        "payload_kb": None if payload_bytes is None else round(payload_bytes / 1024, 1),
+        "points": point_count(fig),
+        "rows": rows,
+        "over_budget": (compute_ms + (serialize_ms or 0) > RENDER_BUDGET_MS
+                        or (payload_bytes or 0) > PAYLOAD_BUDGET_BYTES),
+    }
+    st.session_state.setdefault("render_log", deque(maxlen=MAX_LOG_ENTRIES)).append(entry)
+    perf_mark()
+
+
+def render_log():
+    """This session's render log as a DataFrame (one row per chart render)."""
+    return pd.DataFrame(list(st.session_state.get("render_log", [])))
+
+
+def performance_panel():
+    """Expander with per-chart render costs, budget flags and an exportable log."""
+    log = render_log()
+    with st.expander("⏱️ Render Performance"):
+        st.checkbox("Measure payload size (serializes every chart a second time)", key="measure_payload")
+        if log.empty:
+            st.caption("No charts rendered yet in this session")
+            return
+
+        st.caption(f"Budgets: {RENDER_BUDGET_MS:,} ms per chart, {PAYLOAD_BUDGET_BYTES / 1024 ** 2:.0f} MB payload")
+
+        summary = (log.groupby(["page", "chart"])
+                      .agg(renders=("chart", "size"),
+                           median_ms=("compute_ms", "median"),
+                           max_ms=("compute_ms", "max"),
+                           max_serialize_ms=("serialize_ms", "max"),
+                           max_payload_kb=("payload_kb", "max"),
+                           points=("points", "max"),
+                           rows=("rows", "max"),
+                           over_budget=("over_budget", "sum"))
+                      .sort_values("max_ms", ascending=False))
+        st.dataframe(summary, use_container_width=True)
+
+        over = int(log["over_budget"].sum())
+        if over:
+            st.warning(f"⚠️ {over} renders exceeded the budget")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("📥 Export render log (CSV)", log.to_csv(index=False),
+                               file_name=f"render_log_{datetime.now():%Y%m%d_%H%M%S}.csv", mime="text/csv")
+        with col2:
+            if st.button("🗑️ Clear log"):
+                st.session_state.pop("render_log", None)
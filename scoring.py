@@ -0,0 +1,132 @@
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Rows scored per chunk; bounds memory regardless of the input size
+SCORING_CHUNK_ROWS = 100_000
+
+STREAMABLE_FORMATS = ("csv", "parquet")
+
+# Default location of scored files, and the largest one offered as a download
+SCORING_OUTPUT_DIR = Path(tempfile.gettempdir()) / "scoring"
+MAX_DOWNLOAD_BYTES = 200 * 1024 ** 2
+
+
+def _format(source):
+    name = source if isinstance(source, (str, Path)) else getattr(source, "name", "")
+    extension = str(name).rsplit(".", 1)[-1].lower()
+    if extension not in STREAMABLE_FORMATS:
+        raise ValueError(f"Unsupported file type for scoring: {extension} (use CSV or Parquet)")
+    return extension
+
+
+def input_columns(source):
+    """Column names of a CSV/Parquet file without reading its rows."""
+    if _format(source) == "parquet":
+        return pq.ParquetFile(source).schema_arrow.names
+    columns = pd.read_csv(source, nrows=0).columns.tolist()
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return columns
+
+
+def read_chunks(source, columns, categorical=(), chunk_rows=SCORING_CHUNK_ROWS):
+    """Yield DataFrames of at most `chunk_rows` rows holding `columns` of a CSV/Parquet file.
+
+    `categorical` columns are read as text so codes such as "01" keep the
+    form the model saw during training.
+    """
+    if _format(source) == "parquet":
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_rows, columns=list(columns)):
+            yield batch.to_pandas()
+        return
+    dtypes = {col: str for col in categorical}
+    yield from pd.read_csv(source, usecols=list(columns), dtype=dtypes, chunksize=chunk_rows)
+
+
+def align_features(chunk, feature_dtypes):
+    # Match the training dtypes: numeric features coerced, categoricals as text
+    X = chunk[list(feature_dtypes)].copy()
+    for col, dtype in feature_dtypes.items():
+        if dtype in ("object", "category"):
+            X[col] = X[col].where(X[col].isna(), X[col].astype(str))
+        else:
+            X[col] = pd.to_numeric(X[col], errors="coerce")
+    return X
+
+
+def score_chunk(model, chunk, feature_dtypes, classes=None, keep_columns=()):
+    """Predictions (and class probabilities) for one chunk as a DataFrame.
+
+    `model` is the fitted pipeline from the modeling page, which applies the
+    fitted preprocessing itself. `classes` (the label encoder's classes)
+    decodes predictions and names the probability columns.
+    """
+    X = align_features(chunk, feature_dtypes)
+    out = pd.DataFrame({col: chunk[col].astype("string") for col in keep_columns})
+    predictions = model.predict(X)
+    if classes is not None:
+        labels = np.asarray(classes, dtype=object)
+        out["prediction"] = labels[np.asarray(predictions, dtype=np.int64)].astype(str)
+        if hasattr(model, "predict_proba"):
+            probabilities = model.predict_proba(X)
+            for i, code in enumerate(model.classes_):
+                out[f"prob_{labels[code]}"] = probabilities[:, i]
+    else:
+        out["prediction"] = np.asarray(predictions, dtype=np.float64)
+    return out.reset_index(drop=True)
+
+
+def score_to_parquet(model, source, output_path, feature_dtypes, classes=None, keep_columns=(),
+                     chunk_rows=SCORING_CHUNK_ROWS, on_progress=None):
+    """Stream `source` through `model` in chunks, appending predictions to a Parquet file.
+
+    Only the feature and `keep_columns` columns are read, one chunk at a
+    time, and each scored chunk is written as a row group, so memory stays
+    bounded by `chunk_rows`. `on_progress` is called with (rows_done,
+    elapsed_seconds) after every chunk. Returns a summary dict with rows,
+    seconds, rows_per_second and the output path.
+    """
+    missing = [col for col in feature_dtypes if col not in input_columns(source)]
+    if missing:
+        raise ValueError(f"Input is missing feature columns: {', '.join(missing)}")
+
+    columns = list(dict.fromkeys(list(feature_dtypes) + list(keep_columns)))
+    categorical = [col for col, dtype in feature_dtypes.items() if dtype in ("object", "category")]
+    categorical += [col for col in keep_columns if col not in feature_dtypes]
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    writer = None
+    rows = 0
+    started = time.perf_counter()
+    try:
+        for chunk in read_chunks(source, columns, categorical, chunk_rows):
+            table = pa.Table.from_pandas(score_chunk(model, chunk, feature_dtypes, classes, keep_columns),
+                                         preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema, compression="snappy")
+            writer.write_table(table.cast(writer.schema))
+            rows += len(chunk)
+            if on_progress is not None:
+                on_progress(rows, time.perf_counter() - started)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    seconds = time.perf_counter() - started
+    return {"rows": rows, "seconds": seconds, "rows_per_second": rows / seconds if seconds else 0.0,
+            "output": str(output_path)}
+
+
+def preview_parquet(path, rows=100):
+    """First `rows` rows of a Parquet file, read from its first row group only."""
+    parquet = pq.ParquetFile(path)
+    if parquet.num_row_groups == 0:
+        return pd.DataFrame(columns=parquet.schema_arrow.names)
+    return parquet.read_row_group(0).slice(0, rows).to_pandas()
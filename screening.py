@@ -0,0 +1,193 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+
+from dataset_version import dataset_fingerprint
+
+# Exposures coded per bincount pass; bounds the (rows x block) key matrix
+EXPOSURE_BLOCK = 32
+
+# Fisher's exact test replaces chi-square when an expected count is below this
+MIN_EXPECTED = 5
+
+CORRECTIONS = {
+    "Benjamini-Hochberg (FDR)": "fdr_bh",
+    "Holm": "holm",
+    "Bonferroni": "bonferroni",
+    "None": None,
+}
+
+
+def binary_codes(values):
+    """0/1 codes for a two-level column, -1 for missing; None if not binary.
+
+    Levels are sorted as in pd.crosstab, so the second level (1, True,
+    "yes", "Y") is the exposed / ill one.
+    """
+    codes, uniques = pd.factorize(pd.Series(values), sort=True)
+    if len(uniques) != 2:
+        return None
+    return codes.astype(np.int8)
+
+
+def two_by_two_counts(outcome, exposures):
+    """(k, 2, 2) cell counts [exposure, outcome] for k exposure code columns.
+
+    `outcome` is a 0/1/-1 vector and `exposures` an (n, k) matrix of the same
+    codes. Each exposure's cells are offset into one key space, so a block of
+    exposures is tabulated with a single bincount. Rows missing either value
+    are dropped pairwise.
+    """
+    exposures = np.asarray(exposures, dtype=np.int8)
+    outcome = np.asarray(outcome, dtype=np.int8)
+    k = exposures.shape[1]
+    counts = np.empty((k, 2, 2), dtype=np.int64)
+
+    for start in range(0, k, EXPOSURE_BLOCK):
+        block = exposures[:, start:start + EXPOSURE_BLOCK]
+        width = block.shape[1]
+        valid = (block >= 0) & (outcome >= 0)[:, None]
+        keys = np.arange(width, dtype=np.int64) * 4 + block * 2 + outcome[:, None]
+        counts[start:start + width] = np.bincount(keys[valid], minlength=width * 4).reshape(width, 2, 2)
+
+    return counts
+
+
+def _fisher_pvalues(a, b, c, d, which):
+    from scipy import stats
+
+    p = np.full(len(a), np.nan)
+    for i in np.flatnonzero(which):
+        p[i] = stats.fisher_exact([[a[i], b[i]], [c[i], d[i]]])[1]
+    return p
+
+
+def table_measures(counts, alpha=0.05):
+    """Attack rates, RR, OR, CIs and p-values for (k, 2, 2) tables.
+
+    RR and OR intervals use the log (Katz / Woolf) method; tables with a zero
+    cell get the Haldane-Anscombe 0.5 correction. The p-value is a
+    Yates-corrected chi-square, or Fisher's exact test when any expected
+    count is below MIN_EXPECTED.
+    """
+    from scipy import stats
+
+    counts = np.asarray(counts, dtype=np.float64)
+    d, c = counts[:, 0, 0], counts[:, 0, 1]   # unexposed: well, ill
+    b, a = counts[:, 1, 0], counts[:, 1, 1]   # exposed: well, ill
+    n = a + b + c + d
+    z = stats.norm.ppf(1 - alpha / 2)
+
+    zero = (counts == 0).any(axis=(1, 2))
+    ca, cb, cc, cd = (np.where(zero, x + 0.5, x) for x in (a, b, c, d))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ar_exposed = a / (a + b)
+        ar_unexposed = c / (c + d)
+
+        rr = (ca / (ca + cb)) / (cc / (cc + cd))
+        se_rr = np.sqrt(1 / ca - 1 / (ca + cb) + 1 / cc - 1 / (cc + cd))
+        odds = (ca * cd) / (cb * cc)
+        se_or = np.sqrt(1 / ca + 1 / cb + 1 / cc + 1 / cd)
+
+        row1, row0 = a + b, c + d
+        col1, col0 = a + c, b + d
+        expected_min = np.minimum(row1, row0) * np.minimum(col1, col0) / n
+        # Yates: |ad - bc| reduced by n/2, as scipy.stats.chi2_contingency does
+        diff = np.maximum(np.abs(a * d - b * c) - n / 2, 0)
+        chi2 = n * diff ** 2 / (row1 * row0 * col1 * col0)
+
+    degenerate = (row1 == 0) | (row0 == 0) | (col1 == 0) | (col0 == 0)
+    chi2 = np.where(degenerate, np.nan, chi2)
+    p_chi2 = stats.chi2.sf(chi2, 1)
+
+    use_fisher = ~degenerate & (expected_min < MIN_EXPECTED)
+    p_values = np.where(use_fisher, _fisher_pvalues(a, b, c, d, use_fisher), p_chi2)
+
+    return pd.DataFrame({
+        "Exposed Ill": a.astype(np.int64),
+        "Exposed Well": b.astype(np.int64),
+        "Unexposed Ill": c.astype(np.int64),
+        "Unexposed Well": d.astype(np.int64),
+        "Attack Rate Exposed": ar_exposed,
+        "Attack Rate Unexposed": ar_unexposed,
+        "RR": rr,
+        "RR CI Lower": np.exp(np.log(rr) - z * se_rr),
+        "RR CI Upper": np.exp(np.log(rr) + z * se_rr),
+        "OR": odds,
+        "OR CI Lower": np.exp(np.log(odds) - z * se_or),
+        "OR CI Upper": np.exp(np.log(odds) + z * se_or),
+        "Chi-square": chi2,
+        "Test": np.where(use_fisher, "Fisher exact", np.where(degenerate, "-", "Chi-square")),
+        "p-value": p_values,
+    })
+
+
+def screen_exposures(df, outcome_col, exposure_cols, correction="fdr_bh", alpha=0.05):
+    """All exposure x outcome 2x2 tables in one vectorized pass.
+
+    Every exposure is integer-coded once, then tabulated against the outcome
+    with blockwise bincounts. `correction` is a statsmodels multipletests
+    method ("fdr_bh", "holm", "bonferroni") or None. Returns the table
+    ranked by p-value and the list of exposures skipped for not being binary.
+    """
+    outcome = binary_codes(df[outcome_col])
+    if outcome is None:
+        raise ValueError(f"Outcome '{outcome_col}' must have exactly 2 categories")
+
+    kept, skipped, codes = [], [], []
+    for col in exposure_cols:
+        if col == outcome_col:
+            continue
+        col_codes = binary_codes(df[col])
+        if col_codes is None:
+            skipped.append(col)
+        else:
+            kept.append(col)
+            codes.append(col_codes)
+
+    if not kept:
+        return pd.DataFrame(), skipped
+
+    table = table_measures(two_by_two_counts(outcome, np.column_stack(codes)), alpha)
+    table.index = pd.Index(kept, name="Exposure")
+
+    tested = table["p-value"].notna().to_numpy()
+    adjusted = table["p-value"].to_numpy(copy=True)
+    if correction and tested.any():
+        from statsmodels.stats.multitest import multipletests
+        adjusted[tested] = multipletests(adjusted[tested], alpha=alpha, method=correction)[1]
+    table["Adjusted p-value"] = adjusted
+    table["Significant"] = table["Adjusted p-value"] < alpha
+
+    return table.sort_values(["Adjusted p-value", "RR"], ascending=[True, False]), skipped
+
+
+def forest_figure(table, measure="RR", max_rows=30, title=None):
+    """Log-scale forest plot of the top `max_rows` exposures (table order)."""
+    top = table.head(max_rows).iloc[::-1]
+    colors = np.where(top["Significant"], "crimson", "gray")
+    fig = go.Figure(go.Scatter(
+        x=top[measure], y=top.index.astype(str), mode="markers",
+        marker=dict(color=colors, size=9),
+        error_x=dict(type="data", symmetric=False,
+                     array=top[f"{measure} CI Upper"] - top[measure],
+                     arrayminus=top[measure] - top[f"{measure} CI Lower"]),
+        customdata=top[["Adjusted p-value"]],
+        hovertemplate=f"%{{y}}: {measure} %{{x:.2f}} (adj. p %{{customdata[0]:.2g}})<extra></extra>",
+    ))
+    fig.add_vline(x=1, line_dash="dash", line_color="black")
+    fig.update_xaxes(type="log", title=measure)
+    fig.update_layout(title=title or f"{measure} with 95% CI", height=max(300, 25 * len(top) + 120))
+    return fig
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _cached_screen(fingerprint, outcome_col, exposure_cols, correction, alpha, _df):
+    return screen_exposures(_df, outcome_col, list(exposure_cols), correction, alpha)
+
+
+def cached_screen(df, outcome_col, exposure_cols, correction="fdr_bh", alpha=0.05):
+    """screen_exposures computed once per (dataset version, columns, options)."""
+    return _cached_screen(dataset_fingerprint(df), outcome_col, tuple(exposure_cols), correction, alpha, df)
@@ -0,0 +1,167 @@
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from scipy.stats import loguniform, randint, uniform
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid, ParameterSampler, cross_val_score
+from sklearn.pipeline import Pipeline
+
+from artifacts import private_dir
+
+# Successive halving: candidates sampled per model, the fraction kept per
+# rung is 1/HALVING_FACTOR while each survivor's budget grows by that factor
+SEARCH_CANDIDATES = 27
+HALVING_FACTOR = 3
+SEARCH_CV = 3
+
+# Budgets: training rows for most models, trees for the ensembles without
+# early stopping (the boosting models of boosting.py pick their own rounds)
+MIN_ROWS = 60
+MIN_ESTIMATORS = 10
+MAX_ESTIMATORS = 200
+ESTIMATOR_BUDGET_MODELS = ("Random Forest", "Gradient Boosting")
+
+# Every trial of every search is appended here (one JSON object per line)
+SEARCH_HISTORY_FILE = private_dir("search") / "search_history.jsonl"
+
+_DEPTHS = [2, 3, 5, 8, 12, 20, None]
+
+# Per-model search spaces (same names as the modeling page; classifier and
+# regressor variants share a space). Lists are sampled uniformly.
+SEARCH_SPACES = {
+    "Logistic Regression": {"C": loguniform(1e-3, 1e2)},
+    "Linear Regression": {"fit_intercept": [True, False]},
+    "Ridge Regression": {"alpha": loguniform(1e-3, 1e3)},
+    "Lasso Regression": {"alpha": loguniform(1e-4, 1e1)},
+    "Random Forest": {"max_depth": _DEPTHS, "min_samples_leaf": [1, 2, 5, 10],
+                      "max_features": ["sqrt", "log2", None]},
+    "Decision Tree": {"max_depth": _DEPTHS, "min_samples_leaf": [1, 2, 5, 10, 20],
+                      "max_features": ["sqrt", None]},
+    "K-Nearest Neighbors": {"n_neighbors": randint(1, 31), "weights": ["uniform", "distance"],
+                            "p": [1, 2]},
+    "Support Vector Machine": {"C": loguniform(1e-2, 1e2), "gamma": ["scale", "auto"],
+                               "kernel": ["rbf", "linear"]},
+    "Gradient Boosting": {"learning_rate": loguniform(1e-2, 0.3), "max_depth": [2, 3, 5, 8],
+                          "subsample": [0.6, 0.8, 1.0]},
+    "Histogram Boosting": {"learning_rate": loguniform(1e-2, 0.3), "max_leaf_nodes": [15, 31, 63, 127],
+                           "min_samples_leaf": [5, 20, 50, 100], "l2_regularization": loguniform(1e-4, 1e1)},
+    "XGBoost": {"learning_rate": loguniform(1e-2, 0.3), "max_depth": randint(2, 11),
+                "subsample": uniform(0.6, 0.4), "colsample_bytree": uniform(0.5, 0.5)},
+}
+
+
+def set_model_params(estimator, params):
+    """set_params on a bare estimator or on the 'model' step of a pipeline."""
+    prefix = "model__" if isinstance(estimator, Pipeline) else ""
+    return estimator.set_params(**{prefix + name: value for name, value in params.items()})
+
+
+def _candidates(space, n, random_state):
+    if all(isinstance(values, list) for values in space.values()):
+        grid = ParameterGrid(space)
+        if len(grid) <= n:
+            return list(grid)
+    return list(ParameterSampler(space, n, random_state=random_state))
+
+
+def _plain(value):
+    # numpy scalars from the samplers -> JSON-friendly python values
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def halving_search(model_name, estimator, X, y, deadline, random_state=0):
+    """Successive-halving random search for `estimator` under a wall-clock deadline.
+
+    SEARCH_CANDIDATES configurations are drawn from SEARCH_SPACES[model_name]
+    and scored with SEARCH_CV-fold CV on a small budget (a subsample of rows,
+    or few trees for ESTIMATOR_BUDGET_MODELS). Each rung keeps the best
+    1/HALVING_FACTOR and multiplies their budget by HALVING_FACTOR, until one
+    candidate is left or the full budget is reached. Rows are nested across
+    rungs, so cached preprocessing of a rung is shared by all its candidates.
+
+    No new trial starts after `deadline` (a time.time() value); the best
+    candidate of the deepest rung reached wins. Returns (best_params, trials)
+    where `trials` is a list of dicts, one per CV evaluation.
+    """
+    n_rows = len(y)
+    by_estimators = model_name in ESTIMATOR_BUDGET_MODELS
+    candidates = _candidates(SEARCH_SPACES[model_name], SEARCH_CANDIDATES, random_state)
+    n_rungs = max(1, int(np.ceil(np.log(len(candidates)) / np.log(HALVING_FACTOR))) + 1)
+    order = np.random.RandomState(random_state).permutation(n_rows)
+
+    trials = []
+    best = None
+    for rung in range(n_rungs):
+        scale = HALVING_FACTOR ** (rung - n_rungs + 1)
+        if by_estimators:
+            budget = max(MIN_ESTIMATORS, int(MAX_ESTIMATORS * scale))
+            rows = order
+        else:
+            budget = min(n_rows, max(MIN_ROWS, int(n_rows * scale)))
+            rows = np.sort(order[:budget])
+        X_rung = X.iloc[rows] if hasattr(X, "iloc") else X[rows]
+        y_rung = y[rows]
+
+        scored = []
+        out_of_time = False
+        for params in candidates:
+            if time.time() >= deadline:
+                out_of_time = True
+                break
+            trial_params = dict(params, n_estimators=budget) if by_estimators else params
+            model = set_model_params(clone(estimator), trial_params)
+            started = time.perf_counter()
+            scores = cross_val_score(model, X_rung, y_rung, cv=SEARCH_CV, error_score=np.nan)
+            score = float(np.mean(scores)) if np.isfinite(scores).all() else float("nan")
+            trials.append({
+                "model": model_name,
+                "rung": rung,
+                "budget": budget,
+                "budget_type": "n_estimators" if by_estimators else "rows",
+                "params": {k: _plain(v) for k, v in params.items()},
+                "score": score,
+                "seconds": round(time.perf_counter() - started, 3),
+            })
+            if np.isfinite(score):
+                scored.append((score, params))
+
+        if not scored:
+            break
+        scored.sort(key=lambda s: s[0], reverse=True)
+        best = scored[0][1]
+        candidates = [params for _, params in scored[:max(1, len(scored) // HALVING_FACTOR)]]
+        if out_of_time or len(candidates) == 1:
+            break
+
+    if best is None:
+        return None, trials
+    best = {k: _plain(v) for k, v in best.items()}
+    if by_estimators:
+        best["n_estimators"] = MAX_ESTIMATORS
+    return best, trials
+
+
+def save_trials(trials, **run_info):
+    """Append trials to SEARCH_HISTORY_FILE, tagged with `run_info` (dataset, target...)."""
+    if not trials:
+        return
+    stamp = datetime.now().isoformat(timespec="seconds")
+    with open(SEARCH_HISTORY_FILE, "a", encoding="utf-8") as f:
+        for trial in trials:
+            f.write(json.dumps({"time": stamp, **run_info, **trial}, default=str) + "\n")
+
+
+def load_trials(**match):
+    """Trial history as a DataFrame, filtered to rows whose fields equal `match`."""
+    if not SEARCH_HISTORY_FILE.exists():
+        return pd.DataFrame()
+    with open(SEARCH_HISTORY_FILE, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    rows = [r for r in rows if all(r.get(k) == v for k, v in match.items())]
+    history = pd.DataFrame(rows)
+    if not history.empty:
+        history["params"] = history["params"].map(lambda p: json.dumps(p, sort_keys=True))
+    return history
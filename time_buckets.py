@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+# "Week" follows ISO 8601 (Monday start, same as pandas' to_period('W')).
+# "Epi Week (MMWR)" follows the CDC calendar (Sunday start; week 1 is the
+# first week with at least four days in the new year).
+TIME_UNITS = ["Day", "Week", "Epi Week (MMWR)", "Month", "Year"]
+
+# 1970-01-01 (day 0) is a Thursday: shift so weeks start on Monday / Sunday
+_WEEK_OFFSET = {"Week": 3, "Epi Week (MMWR)": 4}
+
+
+def to_datetime64(values):
+    """Datetime64[ns] array; unparseable values become NaT."""
+    dates = pd.to_datetime(pd.Series(values), errors="coerce")
+    if getattr(dates.dt, "tz", None) is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates.to_numpy(dtype="datetime64[ns]")
+
+
+def day_to_period_ordinals(days, unit):
+    """Convert day numbers (days since 1970-01-01) to period ordinals."""
+    days = np.asarray(days, dtype=np.int64)
+    if unit == "Day":
+        return days
+    if unit in _WEEK_OFFSET:
+        return (days + _WEEK_OFFSET[unit]) // 7
+    if unit == "Month":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    if unit == "Year":
+        return days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64)
+    raise ValueError(f"Unknown time unit: {unit}")
+
+
+def period_ordinals(values, unit):
+    """Integer period number of each date (consecutive periods differ by 1).
+
+    Returns (ordinals, valid) where `valid` is False for missing dates.
+    """
+    dates = to_datetime64(values)
+    valid = ~np.isnat(dates)
+
+    if unit == "Month":
+        ordinals = dates.astype("datetime64[M]").astype(np.int64)
+    elif unit == "Year":
+        ordinals = dates.astype("datetime64[Y]").astype(np.int64)
+    else:
+        ordinals = day_to_period_ordinals(dates.astype("datetime64[D]").astype(np.int64), unit)
+
+    return np.where(valid, ordinals, 0), valid
+
+
+def period_starts(ordinals, unit):
+    """Start timestamp of each period ordinal (inverse of period_ordinals)."""
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    if unit == "Month":
+        starts = ordinals.astype("datetime64[M]")
+    elif unit == "Year":
+        starts = ordinals.astype("datetime64[Y]")
+    elif unit == "Day":
+        starts = ordinals.astype("datetime64[D]")
+    else:
+        starts = (ordinals * 7 - _WEEK_OFFSET[unit]).astype("datetime64[D]")
+    return pd.DatetimeIndex(starts.astype("datetime64[ns]"))
+
+
+def floor_dates(values, unit):
+    """Vectorized replacement for dt.to_period(...).apply(lambda r: r.start_time)."""
+    ordinals, valid = period_ordinals(values, unit)
+    starts = period_starts(ordinals, unit).to_numpy()
+    starts[~valid] = np.datetime64("NaT")
+    return pd.Series(starts, index=getattr(values, "index", None))
+
+
+def epi_week(values, system="mmwr"):
+    """Epidemiological (year, week) for each date.
+
+    `system` is "mmwr" (Sunday start) or "iso" (Monday start). In both, a
+    week belongs to the year holding its 4th day, so early-January dates can
+    fall in week 52/53 of the previous year.
+    """
+    unit = "Epi Week (MMWR)" if system == "mmwr" else "Week"
+    ordinals, valid = period_ordinals(values, unit)
+    fourth_day = period_starts(ordinals, unit) + pd.Timedelta(days=3)
+
+    year = np.where(valid, fourth_day.year, -1)
+    week = np.where(valid, (fourth_day.dayofyear - 1) // 7 + 1, -1)
+    return pd.DataFrame({"year": year, "week": week}, index=getattr(values, "index", None))
+
+
+def period_labels(starts, unit):
+    """Display labels: "2024-W05" for weeks, dates otherwise."""
+    starts = pd.DatetimeIndex(starts)
+    if unit in _WEEK_OFFSET:
+        weeks = epi_week(starts, "mmwr" if unit == "Epi Week (MMWR)" else "iso")
+        return [f"{y}-W{w:02d}" for y, w in zip(weeks["year"], weeks["week"])]
+    if unit == "Month":
+        return list(starts.strftime("%Y-%m"))
+    if unit == "Year":
+        return list(starts.strftime("%Y"))
+    return list(starts.strftime("%Y-%m-%d"))
+
+
+def zero_filled_counts(ordinals, unit, weights=None, group_codes=None, group_levels=None,
+                       group_name="group", value_name="cases", first=None, last=None):
+    """Sum `weights` (or count) per period ordinal x group on a continuous index.
+
+    Inputs must already be valid (no missing dates or group codes). The
+    period range defaults to the observed one; `first`/`last` clip or extend it.
+    Returns a long DataFrame with 'period', the group column (if any),
+    `value_name` and 'label'.
+    """
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    n_groups = 1 if group_codes is None else len(group_levels)
+
+    if first is None:
+        first = ordinals.min() if len(ordinals) else 0
+    if last is None:
+        last = ordinals.max() if len(ordinals) else -1
+    n_periods = int(max(last - first + 1, 0))
+
+    keep = (ordinals >= first) & (ordinals <= last)
+    key = (ordinals[keep] - first) * n_groups
+    if group_codes is not None:
+        key += np.asarray(group_codes, dtype=np.int64)[keep]
+    counts = np.bincount(key, weights=None if weights is None else np.asarray(weights)[keep],
+                         minlength=n_periods * n_groups)
+
+    starts = period_starts(np.arange(first, first + n_periods), unit)
+    result = pd.DataFrame({
+        "period": np.repeat(starts, n_groups),
+        value_name: counts if weights is not None else counts.astype(np.int64),
+    })
+    if group_codes is not None:
+        result.insert(1, group_name, np.tile(np.asarray(group_levels), n_periods))
+    result["label"] = np.repeat(period_labels(starts, unit), n_groups)
+
+    return result
+
+
+def bucket_counts(dates, unit, weights=None, groups=None, value_name="cases"):
+    """Case counts per period on a continuous, zero-filled period index.
+
+    Counts rows (or sums `weights`) with a bincount over period ordinals, so
+    there is no per-row Python work. With `groups`, every period x group
+    combination is present. Returns a long DataFrame with 'period', the group
+    column (if any), `value_name` and 'label'.
+    """
+    ordinals, valid = period_ordinals(dates, unit)
+
+    if weights is not None:
+        weights = pd.to_numeric(pd.Series(weights), errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+
+    group_codes = group_levels = None
+    group_name = None
+    if groups is not None:
+        group_codes, group_levels = pd.factorize(pd.Series(groups), sort=True)
+        group_name = getattr(groups, "name", None) or "group"
+        valid &= group_codes >= 0
+        group_codes = group_codes[valid]
+
+    return zero_filled_counts(
+        ordinals[valid], unit,
+        weights=None if weights is None else weights[valid],
+        group_codes=group_codes, group_levels=group_levels, group_name=group_name,
+        value_name=value_name,
+    )
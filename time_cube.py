@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from dataset_version import dataset_fingerprint
+from time_buckets import TIME_UNITS, day_to_period_ordinals, period_ordinals, zero_filled_counts
+
+# Cross-tabulating more grouping variables multiplies the number of cells
+MAX_CUBE_GROUPS = 3
+
+
+def _smallest_int(n_levels):
+    return np.int16 if n_levels < np.iinfo(np.int16).max else np.int32
+
+
+class TimeCube:
+    """Case counts pre-aggregated at every time resolution.
+
+    Built once from the line list: rows are collapsed to non-empty
+    (day x group levels) cells, then each coarser resolution is rolled up from
+    the daily cells. Cells are stored as small integer arrays (int32 period
+    ordinals, int16/int32 group codes) plus one float64 value array, so the
+    cube is usually a tiny fraction of the line list. Queries never touch the
+    original DataFrame.
+    """
+
+    def __init__(self, df, date_col, value_col=None, group_cols=()):
+        group_cols = list(dict.fromkeys(c for c in group_cols if c))
+        if len(group_cols) > MAX_CUBE_GROUPS:
+            raise ValueError(f"A time cube supports at most {MAX_CUBE_GROUPS} grouping variables")
+
+        self.date_col = date_col
+        self.value_col = value_col
+        self.group_cols = group_cols
+        self.levels = {}
+
+        days, valid = period_ordinals(df[date_col], "Day")
+        codes = []
+        for col in group_cols:
+            col_codes, uniques = pd.factorize(df[col], sort=True)
+            valid &= col_codes >= 0
+            codes.append(col_codes)
+            self.levels[col] = pd.Index(uniques)
+
+        if value_col is not None:
+            values = pd.to_numeric(df[value_col], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+        else:
+            values = np.ones(len(df), dtype=np.float64)
+
+        daily = pd.DataFrame({"ordinal": days[valid]})
+        for col, col_codes in zip(group_cols, codes):
+            daily[col] = col_codes[valid]
+        daily["value"] = values[valid]
+
+        self.rows = int(valid.sum())
+        self.first_day = int(daily["ordinal"].min()) if self.rows else 0
+        self.last_day = int(daily["ordinal"].max()) if self.rows else -1
+
+        self._cells = {}
+        daily = self._collapse(daily)
+        self._cells["Day"] = daily
+        for unit in TIME_UNITS[1:]:
+            rolled = daily.assign(ordinal=day_to_period_ordinals(daily["ordinal"], unit))
+            self._cells[unit] = self._collapse(rolled)
+
+    def _collapse(self, cells):
+        keys = ["ordinal"] + self.group_cols
+        collapsed = cells.groupby(keys, sort=False, as_index=False)["value"].sum()
+        collapsed["ordinal"] = collapsed["ordinal"].astype(np.int32)
+        for col in self.group_cols:
+            collapsed[col] = collapsed[col].astype(_smallest_int(len(self.levels[col])))
+        return collapsed
+
+    @property
+    def nbytes(self):
+        return int(sum(cells.memory_usage(index=False).sum() for cells in self._cells.values()))
+
+    @property
+    def date_range(self):
+        """(first, last) dates covered, as Timestamps."""
+        days = np.array([self.first_day, self.last_day]).astype("datetime64[D]")
+        return pd.Timestamp(days[0]), pd.Timestamp(days[1])
+
+    def series(self, unit, by=None, start=None, end=None, value_name="cases"):
+        """Zero-filled counts at `unit`, optionally split by one cube dimension.
+
+        `start`/`end` (dates) restrict the period range for zooming. Returns
+        the same long format as time_buckets.bucket_counts.
+        """
+        if by is not None and by not in self.group_cols:
+            raise KeyError(f"'{by}' is not a dimension of this cube")
+
+        cells = self._cells[unit]
+        first = last = None
+        if start is not None:
+            first = int(day_to_period_ordinals([period_ordinals([start], "Day")[0][0]], unit)[0])
+        if end is not None:
+            last = int(day_to_period_ordinals([period_ordinals([end], "Day")[0][0]], unit)[0])
+
+        result = zero_filled_counts(
+            cells["ordinal"].to_numpy(), unit,
+            weights=cells["value"].to_numpy(),
+            group_codes=None if by is None else cells[by].to_numpy(),
+            group_levels=None if by is None else self.levels[by],
+            group_name=by,
+            value_name=value_name,
+            first=first, last=last,
+        )
+        if self.value_col is None:
+            result[value_name] = result[value_name].round().astype(np.int64)
+        return result
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _cached_cube(fingerprint, date_col, value_col, group_cols, _df):
+    return TimeCube(_df, date_col, value_col, group_cols)
+
+
+def get_time_cube(df, date_col, value_col=None, group_cols=()):
+    """TimeCube built once per (dataset version, date, value, groups).
+
+    The cube is immutable, so it is shared as a resource instead of being
+    copied on every access.
+    """
+    return _cached_cube(dataset_fingerprint(df), date_col, value_col, tuple(group_cols), df)
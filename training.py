@@ -0,0 +1,293 @@
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import cpu_count
+from joblib.externals.loky import get_reusable_executor
+from sklearn.base import clone, is_classifier
+
+from benchmarks import FIT_TIME, MODEL_SIZE, PEAK_MEMORY, inference_latency, model_size, timed_fit
+from evaluation import model_outputs
+from preprocessing import model_pipeline, preprocessing_memory
+from search import SEARCH_SPACES, halving_search, set_model_params
+
+# Seconds between progress refreshes while waiting on workers; each refresh
+# is also the point where a Streamlit rerun interrupts the scheduler
+POLL_INTERVAL = 0.5
+
+# Pre-flight: each model is fitted on nested subsamples of these sizes and
+# scored on PREFLIGHT_VALIDATION_ROWS other training rows; a size is skipped
+# once its fit is projected (linearly) to take over PREFLIGHT_MAX_SECONDS
+PREFLIGHT_SIZES = (1_000, 4_000, 16_000)
+PREFLIGHT_VALIDATION_ROWS = 2_000
+PREFLIGHT_MAX_SECONDS = 60
+
+
+def available_cores():
+    """CPUs this container may use (cgroup quota and affinity aware)."""
+    return cpu_count()
+
+
+def get_training_pool():
+    """Process pool shared by all sessions, sized to the available cores.
+
+    loky workers are reused across training runs, replaced if one crashes,
+    and (unlike multiprocessing's spawn) never re-execute the Streamlit page
+    that is running as __main__.
+    """
+    return get_reusable_executor(max_workers=available_cores(), reuse=True)
+
+
+def _single_threaded(estimator):
+    # Parallelism comes from the pool; nested threads would oversubscribe it
+    # (scikit-learn already reads n_jobs=None as one job)
+    params = estimator.get_params()
+    native_default = type(estimator).__module__.startswith("sklearn")
+    for name in ("n_jobs", "nthread"):
+        if name in params and params[name] != 1 and not (params[name] is None and native_default):
+            estimator.set_params(**{name: 1})
+    return estimator
+
+
+def _load(data_dir, name):
+    return joblib.load(Path(data_dir) / f"{name}.pkl", mmap_mode="r")
+
+
+def _pipeline(estimator, preprocessor, memory):
+    estimator = _single_threaded(clone(estimator))
+    if preprocessor is None:
+        return estimator
+    return model_pipeline(clone(preprocessor), estimator, memory)
+
+
+def _fit_holdout(data_dir, model_name, estimator, preprocessor, memory, search_budget, classes):
+    """Worker task: (search and) fit on the training split, predict the test split and measure costs."""
+    X_train, y_train = _load(data_dir, "X_train"), _load(data_dir, "y_train")
+    estimator = _pipeline(estimator, preprocessor, memory)
+    best_params, trials = None, []
+
+    if search_budget and model_name in SEARCH_SPACES:
+        # The budget starts with this search, not when the model was queued
+        best_params, trials = halving_search(model_name, estimator, X_train, y_train,
+                                             time.time() + search_budget)
+        if best_params:
+            set_model_params(estimator, best_params)
+    costs = timed_fit(estimator, X_train, y_train)
+
+    X_test = _load(data_dir, "X_test")
+    predictions, scores = model_outputs(estimator, X_test, classes)
+    costs[MODEL_SIZE] = model_size(estimator)
+    costs.update(inference_latency(estimator, X_test))
+    return estimator, predictions, scores, best_params, trials, costs
+
+
+def _fit_fold(data_dir, estimator, preprocessor, memory, train_idx, test_idx, classes):
+    """Worker task: fit one CV fold (preprocessing included) and predict its held-out rows."""
+    X, y = _load(data_dir, "X_train"), _load(data_dir, "y_train")
+    estimator = _pipeline(estimator, preprocessor, memory).fit(_rows(X, train_idx), y[train_idx])
+    return (test_idx,) + model_outputs(estimator, _rows(X, test_idx), classes)
+
+
+def _rows(X, idx):
+    return X.iloc[idx] if hasattr(X, "iloc") else X[idx]
+
+
+def _preflight_model(name, estimator, preprocessor, X, y, X_val, y_val, sizes):
+    """Worker task: fit one model on growing subsamples; cost and validation score per size.
+
+    Fits are timed untraced and peak_mb is the worker's resident memory
+    growth during each fit (see benchmarks.timed_fit), so native buffers of
+    libsvm, OpenMP or XGBoost count toward the memory projection.
+    """
+    samples = []
+    for size in sizes:
+        if samples and samples[-1]["fit_seconds"] * size / samples[-1]["rows"] > PREFLIGHT_MAX_SECONDS:
+            break
+        model = _pipeline(estimator, preprocessor, None)
+        costs = timed_fit(model, _rows(X, slice(0, size)), y[:size])
+        samples.append({"model": name, "rows": size, "fit_seconds": costs[FIT_TIME],
+                        "peak_mb": costs[PEAK_MEMORY], "score": model.score(X_val, y_val)})
+    return samples
+
+
+def preflight(models, X_train, y_train, preprocessor=None, preprocessors=None, sizes=PREFLIGHT_SIZES,
+              random_state=0, on_tick=None):
+    """Fit each of `models` on geometric subsamples of the training split to size up full training.
+
+    Subsamples are nested (the first `size` rows of one shuffle) and capped
+    by the rows available; every model is scored on the same
+    PREFLIGHT_VALIDATION_ROWS held-out rows, giving a learning curve. Models
+    run concurrently on the training pool; `preprocessor`/`preprocessors`
+    are applied as in train_models.
+
+    Returns (curve, errors): a DataFrame with model, rows, fit_seconds,
+    peak_mb (resident memory growth in MB) and score per fitted subsample (see benchmarks.project_costs
+    for extrapolating it), and a dict of model name -> error message.
+    `on_tick` is called with (done_models, total_models, elapsed_seconds).
+    """
+    pool = get_training_pool()
+    y_train = np.asarray(y_train)
+    if preprocessor is None:
+        X_train = np.asarray(X_train, dtype=np.float64)
+    order = np.random.RandomState(random_state).permutation(len(y_train))
+    n_validation = min(PREFLIGHT_VALIDATION_ROWS, len(order) // 5)
+    validation, available = order[:n_validation], order[n_validation:]
+    sizes = [size for size in sizes if size < len(available)] or [len(available)]
+    sample = available[:max(sizes)]
+    X, y = _rows(X_train, sample), y_train[sample]
+    X_val, y_val = _rows(X_train, validation), y_train[validation]
+
+    futures = {
+        pool.submit(_preflight_model, name, estimator, (preprocessors or {}).get(name, preprocessor),
+                    X, y, X_val, y_val, sizes): name
+        for name, estimator in models.items()
+    }
+    samples, errors = [], {}
+    started = time.perf_counter()
+    try:
+        while futures:
+            done, _ = wait(list(futures), timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures.pop(future)
+                try:
+                    samples.extend(future.result())
+                except Exception as e:
+                    errors[name] = str(e)
+            if on_tick is not None:
+                on_tick(len(models) - len(futures), len(models), time.perf_counter() - started)
+    finally:
+        for future in futures:
+            future.cancel()
+
+    curve = pd.DataFrame(samples, columns=["model", "rows", "fit_seconds", "peak_mb", "score"])
+    return curve, errors
+
+
+def train_models(models, X_train, y_train, X_test, folds=None, preprocessor=None,
+                 search_budget=None, on_tick=None, preprocessors=None):
+    """Fit `models` (name -> unfitted estimator) and their CV folds concurrently.
+
+    `folds` is a list of (train_idx, test_idx) shared by every model (see
+    evaluation.make_folds). With a `preprocessor` (see
+    preprocessing.build_preprocessor), X is the raw feature frame and every
+    fit, fold included, refits it on its own training rows; the fitted
+    transforms are cached on disk, so models sharing a fold and repeated
+    trainings reuse them. Returned models are then full pipelines.
+    `preprocessors` (name -> transformer) overrides `preprocessor` for some
+    models, e.g. boosting on preprocessing.build_native_preprocessor.
+
+    With `search_budget` (seconds), each model first runs a successive-halving
+    search (search.halving_search); no trial starts once the budget, counted
+    from when that model's search starts in a worker, is spent.
+
+    Holdout fits and CV folds are independent tasks on the shared process
+    pool; folds of a tuned model are scheduled once its search finishes, so
+    they use the chosen parameters. Training data is written once to
+    memory-mapped files instead of being pickled into every task.
+
+    Yields one dict per model as soon as all of its tasks are done: name,
+    model, predictions / test_scores on the test split, oof_predictions /
+    oof_scores (out-of-fold, None without folds or if any fold failed),
+    best_params, trials (the search history), costs (fit time, peak memory,
+    size and prediction latency; see benchmarks.py), error (the holdout fit
+    failed) and cv_error (a fold failed; the model itself is still usable).
+    Scores are class probabilities (or decision values) for classifiers.
+    `on_tick` is called with (done_tasks, total_tasks, elapsed_seconds)
+    while waiting. Closing the generator (e.g. on a Streamlit rerun)
+    cancels tasks not yet started.
+    """
+    pool = get_training_pool()
+    memory = preprocessing_memory() if preprocessor is not None else None
+    if preprocessor is None:
+        X_train, X_test = np.asarray(X_train, dtype=np.float64), np.asarray(X_test, dtype=np.float64)
+    y_train = np.asarray(y_train)
+    classes = np.unique(y_train) if is_classifier(next(iter(models.values()))) else None
+    splits = folds or []
+
+    state = {name: {"name": name, "model": None, "predictions": None, "test_scores": None,
+                    "oof_predictions": None, "oof_scores": None, "best_params": None,
+                    "trials": [], "costs": None, "error": None, "cv_error": None, "pending": 0}
+             for name in models}
+    # Bookkeeping fields not yielded to the caller
+    private = ("pending", "oof_dtype")
+    futures = {}
+
+    with tempfile.TemporaryDirectory(prefix="training_") as data_dir:
+        for name, data in (("X_train", X_train), ("y_train", y_train), ("X_test", X_test)):
+            joblib.dump(data, Path(data_dir) / f"{name}.pkl")
+
+        def submit_folds(name, estimator, preprocessor):
+            for train_idx, test_idx in splits:
+                future = pool.submit(_fit_fold, data_dir, estimator, preprocessor, memory,
+                                     train_idx, test_idx, classes)
+                futures[future] = (name, "fold")
+                state[name]["pending"] += 1
+
+        try:
+            for name, estimator in models.items():
+                model_preprocessor = (preprocessors or {}).get(name, preprocessor)
+                future = pool.submit(_fit_holdout, data_dir, name, estimator, model_preprocessor, memory,
+                                     search_budget, classes)
+                futures[future] = (name, "holdout")
+                state[name]["pending"] += 1
+                tuned = bool(search_budget) and name in SEARCH_SPACES
+                if not tuned:
+                    submit_folds(name, estimator, model_preprocessor)
+
+            total = sum(s["pending"] for s in state.values())
+            if search_budget:
+                total += len(splits) * sum(1 for name in models if name in SEARCH_SPACES)
+            done_tasks = 0
+            started = time.perf_counter()
+
+            while futures:
+                done, _ = wait(list(futures), timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, kind = futures.pop(future)
+                    entry = state[name]
+                    entry["pending"] -= 1
+                    done_tasks += 1
+                    tuned = bool(search_budget) and name in SEARCH_SPACES
+                    try:
+                        if kind == "holdout":
+                            (entry["model"], entry["predictions"], entry["test_scores"],
+                             entry["best_params"], entry["trials"], entry["costs"]) = future.result()
+                            if tuned:
+                                # The tuned pipeline is cloned (unfitted) per fold
+                                submit_folds(name, entry["model"], None)
+                        else:
+                            test_idx, predictions, scores = future.result()
+                            if entry["oof_predictions"] is None:
+                                # NaN until filled, so a missing fold can never pass for predictions
+                                entry["oof_predictions"] = np.full(len(y_train), np.nan)
+                                entry["oof_dtype"] = predictions.dtype
+                                if scores is not None:
+                                    entry["oof_scores"] = np.full((len(y_train), scores.shape[1]), np.nan)
+                            entry["oof_predictions"][test_idx] = predictions
+                            if scores is not None:
+                                entry["oof_scores"][test_idx] = scores
+                    except Exception as e:
+                        if kind == "holdout":
+                            entry["error"] = str(e)
+                            if tuned:
+                                # Its folds will never be scheduled
+                                total -= len(splits)
+                        else:
+                            entry["cv_error"] = entry["cv_error"] or str(e)
+
+                    if entry["pending"] == 0:
+                        if entry["cv_error"]:
+                            entry["oof_predictions"] = entry["oof_scores"] = None
+                        elif entry["oof_predictions"] is not None:
+                            entry["oof_predictions"] = entry["oof_predictions"].astype(entry["oof_dtype"])
+                        yield {k: v for k, v in entry.items() if k not in private}
+
+                if on_tick is not None:
+                    on_tick(done_tasks, total, time.perf_counter() - started)
+        finally:
+            for future in futures:
+                future.cancel()